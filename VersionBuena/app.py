@@ -1,10 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import os
+import time
+
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, abort, Response
+from flask import before_render_template, template_rendered
 
 # Importación de Blueprints personalizados para organizar rutas por roles
 from controllers.admin_routes import admin_bp
 from controllers.tecnico_routes import tecnico_bp
 from controllers.usuario_routes import usuario_bp
-from db import get_connection
+from services.autenticacion import autenticador, DemasiadosIntentos, ServicioOcupado
+from services.sesiones import SesionesServidor
+from services.metricas import instrumentacion, metricas_config
+from services.tareas import cola_tareas
+from services.cache_http import politica_cache
+import db
 
 
 # CLASE PRINCIPAL DE LA APLICACIÓN
@@ -17,12 +26,16 @@ class MyApp:
     def __init__(self):
         """
         Constructor de la clase. Aquí se inicializa la aplicación Flask y se configura la clave secreta para sesiones, 
-        las rutas principales, los Blueprints (rutas organizadas por roles) y los encabezados de control de caché.
+        las rutas principales, los Blueprints (rutas organizadas por roles) y la política de caché HTTP.
         """
         self.app = Flask(__name__)
         self.app.secret_key = 'tu_clave_secreta' 
+        self.app.session_interface = SesionesServidor() # Los datos de sesión quedan en el servidor (ver services/sesiones.py)
+        self.instrument() # Primero, para que las mediciones incluyan los demás hooks
         self.register_routes()
         self.register_blueprints()
+        self.check_sessions()
+        self.track_writes()
         self.set_headers()
 
 
@@ -36,7 +49,7 @@ class MyApp:
         def login_post():
             """
             Recibe los datos de inicio de sesión enviados por JavaScript (JSON).
-            Verifica en la base de datos si el usuario y la contraseña son válidos.
+            Verifica el usuario y la contraseña encriptada (ver services/autenticacion.py).
             Si son válidos, se redirige según el tipo de usuario
             """
             data = request.get_json() # Recibe los datos en formato JSON desde el frontend
@@ -47,17 +60,18 @@ class MyApp:
             username = data.get('username')
             password = data.get('password')
 
-            # Conexión a base de datos y validación del usuario
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM users WHERE id_identity = %s AND password = %s", (username, password))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            # Validación del usuario, con límite de intentos fallidos
+            try:
+                user = autenticador.autenticar(username, password, ip=request.remote_addr)
+            except (DemasiadosIntentos, ServicioOcupado) as e:
+                respuesta = jsonify({'message': str(e)})
+                respuesta.headers['Retry-After'] = str(e.reintentar_en)
+                return respuesta, 429 if isinstance(e, DemasiadosIntentos) else 503
 
             if user:
                 tipo = user['tipo_usuario']
-                session['user'] = user # Se guardan los datos del usuario en la sesión
+                session.rotar() # Id de sesión nuevo al autenticarse
+                session['user'] = user # Se guarda solo el Principal (id, identificación, rol)
 
                 # Redirección según el tipo de usuario
                 if tipo == 'administrador':
@@ -74,20 +88,96 @@ class MyApp:
         @self.app.route('/logout')
         def logout():
             #Cierra la sesión del usuario y lo redirige al login.
-            session.clear() # Elimina todos los datos de la sesión.
+            session.clear() # Elimina la sesión, también en el servidor.
             return redirect(url_for('login'))
 
+        @self.app.route('/metrics')
+        def metrics():
+            # Métricas en formato Prometheus; solo desde las IPs configuradas o con sesión de administrador
+            es_admin = 'user' in session and session['user']['tipo_usuario'] == 'administrador'
+            if not es_admin and request.remote_addr not in metricas_config['ips_permitidas']:
+                abort(403)
+            respuesta = Response(instrumentacion.exponer(), mimetype='text/plain')
+            respuesta.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+            return respuesta
+
+    def instrument(self):
+        """
+        Mide cada petición (latencia por endpoint, cantidad y tiempo de consultas SQL) y el
+        renderizado de las plantillas. Los datos se publican en /metrics y las peticiones
+        lentas se registran con sus consultas (ver services/metricas.py).
+        """
+        @self.app.before_request
+        def start_measurement():
+            instrumentacion.iniciar(request.endpoint or 'desconocido')
+
+        @self.app.after_request
+        def finish_measurement(response):
+            instrumentacion.terminar(request.method, response.status_code)
+            return response
+
+        def template_started(sender, template, context, **extra):
+            g.setdefault('inicio_plantillas', []).append(time.perf_counter())
+
+        def template_finished(sender, template, context, **extra):
+            inicios = g.get('inicio_plantillas')
+            if inicios:
+                instrumentacion.medir_plantilla(template.name, time.perf_counter() - inicios.pop())
+
+        # weak=False: las funciones son locales y las señales solo guardarían una referencia débil
+        before_render_template.connect(template_started, self.app, weak=False)
+        template_rendered.connect(template_finished, self.app, weak=False)
+
+    def check_sessions(self):
+        """
+        Antes de cada petición se comprueba que el usuario de la sesión siga existiendo
+        con el mismo rol (por ejemplo, si el administrador lo eliminó). La comprobación
+        usa la caché de usuarios del autenticador, así que casi nunca consulta la base de datos.
+        """
+        @self.app.before_request
+        def verify_user():
+            if request.endpoint == 'static' or 'user' not in session:
+                return
+            if not autenticador.sesion_vigente(session['user']):
+                session.clear()
+
+    def track_writes(self):
+        """
+        Lectura propia con réplicas: después de que un usuario confirma una escritura, sus
+        lecturas van al primario durante unos segundos (db.enrutamiento_config['lectura_propia']).
+        El instante límite se guarda en la sesión para que valga también en la petición
+        siguiente (por ejemplo, la redirección después de un POST).
+        """
+        @self.app.before_request
+        def load_read_your_writes():
+            db.fijar_lectura_propia(session.get('primario_hasta'))
+
+        @self.app.after_request
+        def save_read_your_writes(response):
+            hasta = db.lectura_propia_hasta()
+            if 'user' in session and hasta > session.get('primario_hasta', 0):
+                session['primario_hasta'] = hasta
+            return response
+
     def set_headers(self):
         """
-        Este método configura los encabezados HTTP de las respuestas para deshabilitar la caché del navegador.
-        Esto es para que el navegador no muestre páginas antiguas cuando se navega con el botón "Atrás".
+        Encabezados de caché según la política de cada endpoint (ver services/cache_http.py):
+        - Las URLs de los archivos estáticos llevan la huella de su contenido (?v=...), así que
+          el navegador los guarda un año y los vuelve a pedir solo cuando cambian.
+        - Las páginas con sesión quedan en 'private, no-cache': el navegador las revalida antes
+          de mostrarlas, también con el botón "Atrás", y tras cerrar sesión se redirige al login.
+        Las respuestas que ya definen su propio Cache-Control (por ejemplo, las gráficas) se respetan.
         """
+        @self.app.url_defaults
+        def add_static_fingerprint(endpoint, values):
+            if endpoint == 'static' and 'filename' in values and 'v' not in values:
+                huella = politica_cache.huella(values['filename'])
+                if huella:
+                    values['v'] = huella
+
         @self.app.after_request
         def add_header(response):
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            return response
+            return politica_cache.aplicar(response)
 
     def register_blueprints(self):
         """
@@ -104,7 +194,11 @@ class MyApp:
         Ejecuta la aplicación en modo debug.
         Este modo muestra errores detallados en el navegador y reinicia el servidor
         automáticamente si detecta cambios en el código.
+        Los trabajadores de la cola de tareas (services/tareas.py) se inician aquí y no al crear
+        la app; con el recargador, solo en el proceso hijo, que es el que atiende las peticiones.
         """
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            cola_tareas.iniciar_trabajadores() # Tareas en segundo plano y periódicas
         self.app.run(debug=True)
 
 if __name__ == '__main__':
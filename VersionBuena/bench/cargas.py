@@ -0,0 +1,236 @@
+import http.cookiejar
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from bench.generador import CLAVE_BENCH, PREFIJO
+
+PRIORIDADES = ('baja', 'media', 'alta')
+_VERSION = re.compile(r'name="version" value="(\d+)"')
+
+
+class ClienteFlask:
+    """
+    Peticiones dentro del proceso con el cliente de pruebas de Flask (sin red).
+    Cada petición sale de una dirección distinta (10.x.y.z): si todas vinieran de 127.0.0.1,
+    las contraseñas incorrectas del escenario de login bloquearían esa IP en el limitador
+    del autenticador y se mediría el rechazo (429) en lugar del costo del hash.
+    """
+    _direcciones = itertools.count(1)  # Compartido por todos los clientes; next() es atómico
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def pedir(self, metodo, ruta, datos=None, json_=None):
+        numero = next(self._direcciones) % (1 << 24)
+        direccion = f'10.{numero >> 16}.{(numero >> 8) & 255}.{numero & 255}'
+        respuesta = self._cliente.open(ruta, method=metodo, data=datos, json=json_,
+                                       environ_overrides={'REMOTE_ADDR': direccion})
+        return respuesta.status_code, respuesta.get_data(as_text=True)
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    # Se mide cada petición por separado: las redirecciones se devuelven tal cual
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHttp:
+    """
+    Peticiones a un servidor WSGI local (p. ej. waitress o flask run) con su propia cookie de sesión.
+    Todas llegan desde la misma IP: para el escenario de login, el servidor debe correr con un
+    máximo alto en autenticador.limitador_ip (services/autenticacion.py); si no, los 429 cuentan
+    como errores en el informe.
+    """
+    def __init__(self, url_base):
+        self.url_base = url_base.rstrip('/')
+        self._abrir = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedirecciones()).open
+
+    def pedir(self, metodo, ruta, datos=None, json_=None):
+        cuerpo, cabeceras = None, {}
+        if json_ is not None:
+            cuerpo, cabeceras = json.dumps(json_).encode('utf-8'), {'Content-Type': 'application/json'}
+        elif datos is not None:
+            cuerpo = urllib.parse.urlencode(datos).encode('utf-8')
+        peticion = urllib.request.Request(self.url_base + ruta, data=cuerpo, headers=cabeceras, method=metodo)
+        try:
+            with self._abrir(peticion, timeout=60) as respuesta:
+                return respuesta.status, respuesta.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+
+class Muestras:
+    """Duración y código de estado de cada petición, por etiqueta (compartido entre hilos)."""
+    def __init__(self):
+        self.datos = {}  # etiqueta -> [(segundos, estado)]
+        self._lock = threading.Lock()
+
+    def agregar(self, etiqueta, segundos, estado):
+        with self._lock:
+            self.datos.setdefault(etiqueta, []).append((segundos, estado))
+
+
+class Usuario:
+    """Un usuario simulado: su cliente, su sesión y dónde anota cada petición."""
+    def __init__(self, cliente, muestras, rnd, contexto):
+        self.cliente = cliente
+        self.muestras = muestras
+        self.rnd = rnd
+        self.contexto = contexto
+
+    def pedir(self, etiqueta, metodo, ruta, datos=None, json_=None):
+        inicio = time.perf_counter()
+        estado, cuerpo = self.cliente.pedir(metodo, ruta, datos, json_)
+        self.muestras.agregar(etiqueta, time.perf_counter() - inicio, estado)
+        return estado, cuerpo
+
+    def iniciar_sesion(self, tipo):
+        # Los primeros `tecnicos` usuarios generados son técnicos; el resto, solicitantes
+        tecnicos = self.contexto['tecnicos']
+        numero = self.rnd.randint(1, tecnicos) if tipo == 'tecnico' else self.rnd.randint(tecnicos + 1, self.contexto['usuarios'])
+        estado, _ = self.cliente.pedir('POST', '/login', json_={'username': f'{PREFIJO}{numero}', 'password': CLAVE_BENCH})
+        if estado != 200:
+            raise RuntimeError(f'No se pudo iniciar sesión como {PREFIJO}{numero} (HTTP {estado})')
+
+
+# ---- Escenarios: cada uno prepara la sesión y devuelve la acción que se repite ----
+
+def escenario_login(usuario):
+    # Tormenta de inicios de sesión; uno de cada diez con contraseña incorrecta
+    def accion():
+        numero = usuario.rnd.randint(1, usuario.contexto['usuarios'])
+        clave = CLAVE_BENCH if usuario.rnd.random() > 0.1 else 'incorrecta'
+        usuario.pedir('login_post', 'POST', '/login', json_={'username': f'{PREFIJO}{numero}', 'password': clave})
+    return accion
+
+
+def escenario_cola(usuario):
+    usuario.iniciar_sesion('tecnico')
+
+    def accion():
+        prioridad = usuario.rnd.choice(PRIORIDADES)
+        usuario.pedir('tecnico.pendientes', 'GET', f'/tecnico/pendientes?prioridad={prioridad}')
+    return accion
+
+
+def escenario_mis_casos(usuario):
+    # Cola personal del técnico (casos asignados por el generador o al crearlos)
+    usuario.iniciar_sesion('tecnico')
+
+    def accion():
+        estado = usuario.rnd.choice(('pendiente', 'proceso'))
+        usuario.pedir('tecnico.mis_casos', 'GET', f'/tecnico/mis_casos?estado={estado}&prioridad=alta&prioridad=media')
+    return accion
+
+
+def escenario_dashboard(usuario):
+    usuario.iniciar_sesion('tecnico')
+
+    def accion():
+        usuario.pedir('tecnico.dashboard', 'GET', '/tecnico/dashboard')
+    return accion
+
+
+def escenario_crear_caso(usuario):
+    usuario.iniciar_sesion('usuario')
+
+    def accion():
+        usuario.pedir('usuario.crear_caso', 'POST', '/usuario/crear_caso', datos={
+            'tipo_caso': usuario.rnd.choice(('incidencia', 'solicitud')),
+            'asunto': 'Caso de prueba de carga',
+            'descripcion': 'Creado por el banco de pruebas',
+            'prioridad': usuario.rnd.choice(PRIORIDADES),
+        })
+    return accion
+
+
+def escenario_transicion(usuario):
+    # Abre un caso y lo pasa al siguiente estado con su versión: pendiente -> proceso -> resuelto,
+    # y un resuelto se reabre en proceso (con el comentario que exige la reapertura)
+    usuario.iniciar_sesion('tecnico')
+
+    def accion():
+        codigo = usuario.rnd.choice(usuario.contexto['codigos'])
+        estado, cuerpo = usuario.pedir('tecnico.ver_caso GET', 'GET', f'/tecnico/caso/{codigo}')
+        version = _VERSION.search(cuerpo) if estado == 200 else None
+        if version is None:
+            return
+        # Los botones de la página son las transiciones permitidas
+        datos = {'accion': 'resuelto' if 'value="resuelto"' in cuerpo else 'proceso', 'version': version.group(1)}
+        if 'value="pendiente"' in cuerpo:
+            datos['comentario'] = 'Reapertura (bench)'
+        usuario.pedir('tecnico.ver_caso POST', 'POST', f'/tecnico/caso/{codigo}', datos=datos)
+    return accion
+
+
+ESCENARIOS = {
+    'login': escenario_login,
+    'cola': escenario_cola,
+    'mis_casos': escenario_mis_casos,
+    'dashboard': escenario_dashboard,
+    'crear_caso': escenario_crear_caso,
+    'transicion': escenario_transicion,
+}
+
+# Mezcla por defecto: proporción de usuarios simulados en cada escenario
+MEZCLA = (('cola', 40), ('dashboard', 25), ('transicion', 15), ('crear_caso', 15), ('login', 5))
+
+
+def codigos_abiertos(limite=2000):
+    # Casos pendientes o en proceso para el escenario de transiciones
+    from db import get_cursor
+
+    with get_cursor() as (conn, cursor):
+        cursor.execute("""
+            (SELECT codigo_caso FROM casos WHERE estado = 'pendiente' ORDER BY fecha_creacion DESC LIMIT %s)
+            UNION ALL
+            (SELECT codigo_caso FROM casos WHERE estado = 'proceso' ORDER BY fecha_creacion DESC LIMIT %s)
+        """, (limite // 2, limite // 2))
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def correr(escenario, crear_cliente, contexto, duracion=30, hilos=8, semilla=1):
+    """
+    Ejecuta `hilos` usuarios simulados durante `duracion` segundos. `escenario` es un
+    nombre de ESCENARIOS o 'mixta' (cada hilo toma un escenario según MEZCLA).
+    Devuelve (Muestras, segundos medidos).
+    """
+    muestras = Muestras()
+    listos = threading.Barrier(hilos + 1)
+    errores = []
+
+    def trabajar(numero):
+        rnd = random.Random(semilla * 1000 + numero)
+        nombre = escenario
+        if escenario == 'mixta':
+            nombres, pesos = zip(*MEZCLA)
+            nombre = rnd.choices(nombres, pesos)[0]
+        try:
+            accion = ESCENARIOS[nombre](Usuario(crear_cliente(), muestras, rnd, contexto))
+        except Exception as e:
+            errores.append(e)
+            accion = None
+        # Todos empiezan a medir a la vez, después de iniciar sesión
+        listos.wait()
+        fin = time.monotonic() + duracion
+        while accion and time.monotonic() < fin:
+            accion()
+
+    trabajadores = [threading.Thread(target=trabajar, args=(i,), daemon=True) for i in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    listos.wait()
+    inicio = time.monotonic()
+    for trabajador in trabajadores:
+        trabajador.join()
+    if errores and len(errores) == hilos:
+        raise errores[0]
+    return muestras, time.monotonic() - inicio
@@ -0,0 +1,170 @@
+import random
+from datetime import datetime, timedelta
+
+from db import get_cursor
+from services.autenticacion import autenticador
+from services.codigos import asignador_codigos
+from services.estadisticas import estadisticas
+from services.importacion import importador
+from services.sla import motor_sla
+
+# Todos los usuarios generados comparten esta contraseña (un solo hash: calcularlo es caro)
+CLAVE_BENCH = 'bench-1234'
+PREFIJO = 'bench'
+
+NOMBRES = ('Ana', 'Luis', 'María', 'Carlos', 'Laura', 'Jorge', 'Sofía', 'Andrés', 'Paula', 'Diego',
+           'Camila', 'Juan', 'Valentina', 'Felipe', 'Daniela', 'Santiago', 'Natalia', 'Miguel')
+APELLIDOS = ('García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez', 'Sánchez', 'Ramírez',
+             'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Reyes', 'Morales', 'Castro')
+EQUIPOS = (('HP', 'ProBook 450'), ('Dell', 'Latitude 5420'), ('Lenovo', 'ThinkPad T14'),
+           ('Apple', 'MacBook Air'), ('Asus', 'ExpertBook B1'))
+ASUNTOS = ('No enciende el equipo', 'Impresora sin conexión', 'Solicitud de software', 'Correo no sincroniza',
+           'Pantalla azul al iniciar', 'Acceso a carpeta compartida', 'Cambio de contraseña', 'VPN no conecta',
+           'Teclado dañado', 'Instalación de antivirus', 'Internet lento', 'Solicitud de monitor adicional')
+
+# Proporciones parecidas a las de producción: casi todo lo antiguo está resuelto
+PRIORIDADES = (('baja', 50), ('media', 35), ('alta', 15))
+TIPOS = (('incidencia', 70), ('solicitud', 30))
+ESTADOS_ANTIGUOS = (('resuelto', 95), ('proceso', 3), ('pendiente', 2))
+ESTADOS_RECIENTES = (('resuelto', 40), ('proceso', 25), ('pendiente', 35))
+
+
+def _elegir(rnd, opciones):
+    valores, pesos = zip(*opciones)
+    return rnd.choices(valores, pesos)[0]
+
+
+class GeneradorDatos:
+    """
+    Llena equipos, datos_personales, users, casos y comentarios con datos sintéticos
+    para las pruebas de rendimiento. Es determinista para una misma semilla.
+    Los usuarios se llaman bench1, bench2... (los técnicos primero) y todos tienen la
+    contraseña CLAVE_BENCH. Al terminar se reconstruyen los contadores de los dashboards.
+    Debe ejecutarse contra una base de datos de pruebas.
+    """
+    def __init__(self, usuarios=10000, tecnicos=50, casos=1000000, comentarios=5000000,
+                 dias=730, semilla=1, tamano_lote=5000):
+        self.usuarios = usuarios
+        self.tecnicos = tecnicos
+        self.casos = casos
+        self.comentarios = comentarios
+        self.dias = dias
+        self.tamano_lote = tamano_lote
+        self.rnd = random.Random(semilla)
+
+    def _usuario(self, numero, password_hash):
+        rnd = self.rnd
+        nombre = f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}'
+        datos = {
+            'id_identity': f'{PREFIJO}{numero}',
+            'nombre_completo': nombre,
+            'telefono': f'3{rnd.randrange(10**9):09d}',
+            'correo': f'{PREFIJO}{numero}@empresa.test',
+            'tipo_usuario': 'tecnico' if numero <= self.tecnicos else 'usuario',
+            'password_hash': password_hash,
+            'serial': None,
+        }
+        if rnd.random() < 0.8:
+            marca, modelo = rnd.choice(EQUIPOS)
+            datos.update(nombre_equipo=f'PC-{numero:06d}', marca=marca, modelo=modelo, serial=f'SN{numero:08d}')
+        return datos
+
+    def generar_usuarios(self, progreso=None):
+        # Reutiliza la inserción por bloques de la importación masiva
+        password_hash = autenticador.encriptar(CLAVE_BENCH)
+        with get_cursor() as (conn, cursor):
+            for inicio in range(1, self.usuarios + 1, self.tamano_lote):
+                fin = min(inicio + self.tamano_lote, self.usuarios + 1)
+                importador.insertar_bloque(cursor, [self._usuario(n, password_hash) for n in range(inicio, fin)])
+                conn.commit()
+                if progreso:
+                    progreso('usuarios', fin - 1)
+
+    def _participantes(self, cursor):
+        # (ids de solicitantes, id_datos de técnicos) de los usuarios generados
+        cursor.execute("SELECT id_user, id_datos, tipo_usuario FROM users WHERE id_identity LIKE %s",
+                       (PREFIJO + '%',))
+        solicitantes, tecnicos = [], []
+        for id_user, id_datos, tipo in cursor.fetchall():
+            if tipo == 'tecnico':
+                tecnicos.append(id_datos)
+            else:
+                solicitantes.append(id_user)
+        return solicitantes, tecnicos
+
+    def _lote_casos(self, cantidad, solicitantes, tecnicos, ahora):
+        rnd = self.rnd
+        casos = []
+        for _ in range(cantidad):
+            fecha = ahora - timedelta(seconds=rnd.randrange(self.dias * 86400))
+            reciente = (ahora - fecha).days < 30
+            casos.append({
+                'id_usuario': rnd.choice(solicitantes),
+                'tipo_caso': _elegir(rnd, TIPOS),
+                'estado': _elegir(rnd, ESTADOS_RECIENTES if reciente else ESTADOS_ANTIGUOS),
+                'asunto': rnd.choice(ASUNTOS),
+                'prioridad': _elegir(rnd, PRIORIDADES),
+                'fecha_creacion': fecha,
+                'id_asignado': rnd.choice(tecnicos),
+            })
+        casos.sort(key=lambda c: c['fecha_creacion'])
+        return casos
+
+    def generar_casos(self, progreso=None):
+        """
+        Inserta los casos por lotes, cada lote con sus comentarios. Los comentarios se
+        reparten al azar con la media comentarios/casos. Cada caso se asigna a un técnico al
+        azar; id_tecnico e id_asignado llevan el id_datos del técnico, como en services/flujo.py.
+        """
+        ahora = datetime.now().replace(microsecond=0)
+        media = self.comentarios / self.casos if self.casos else 0
+        with get_cursor() as (conn, cursor):
+            solicitantes, tecnicos = self._participantes(cursor)
+            if not solicitantes or not tecnicos:
+                raise ValueError('Primero hay que generar usuarios y técnicos')
+
+            creados = 0
+            while creados < self.casos:
+                casos = self._lote_casos(min(self.tamano_lote, self.casos - creados), solicitantes, tecnicos, ahora)
+                por_anio = {}
+                for caso in casos:
+                    por_anio.setdefault(caso['fecha_creacion'].year, []).append(caso)
+                for anio, del_anio in por_anio.items():
+                    inicio = asignador_codigos.reservar(cursor, anio, len(del_anio))
+                    for i, caso in enumerate(del_anio):
+                        caso['codigo_caso'] = asignador_codigos.formatear(anio, inicio + i)
+
+                cursor.executemany("""
+                    INSERT INTO casos (codigo_caso, id_usuario, tipo_caso, estado, asunto, descripcion, prioridad, fecha_creacion,
+                                       estado_desde, vence_sla, id_asignado)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, [(c['codigo_caso'], c['id_usuario'], c['tipo_caso'], c['estado'], c['asunto'],
+                       f"{c['asunto']}. Caso generado para pruebas de rendimiento.", c['prioridad'],
+                       c['fecha_creacion'], c['fecha_creacion'],
+                       None if c['estado'] == 'resuelto' else motor_sla.vencimiento(c['prioridad'], c['fecha_creacion']),
+                       c['id_asignado'])
+                      for c in casos])
+                # Los ids de un INSERT de varias filas son consecutivos en una base de pruebas sin otras escrituras
+                primero = cursor.lastrowid
+
+                comentarios = []
+                for desplazamiento, caso in enumerate(casos):
+                    for _ in range(int(self.rnd.expovariate(1 / media) + 0.5) if media else 0):
+                        fecha = caso['fecha_creacion'] + timedelta(minutes=self.rnd.randrange(1, 14 * 1440))
+                        comentarios.append((primero + desplazamiento, self.rnd.choice(tecnicos),
+                                            'Seguimiento del caso', min(fecha, ahora)))
+                if comentarios:
+                    cursor.executemany("""
+                        INSERT INTO comentarios (id_caso, id_tecnico, texto, fecha_comentario)
+                        VALUES (%s, %s, %s, %s)
+                    """, comentarios)
+                conn.commit()
+
+                creados += len(casos)
+                if progreso:
+                    progreso('casos', creados)
+
+    def generar(self, progreso=None):
+        self.generar_usuarios(progreso)
+        self.generar_casos(progreso)
+        estadisticas.reconstruir()
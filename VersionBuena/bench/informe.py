@@ -0,0 +1,77 @@
+import json
+import math
+import os
+
+CARPETA_BASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lineas_base')
+
+# Respuestas que forman parte del escenario y no cuentan como error
+ESTADOS_ESPERADOS = {
+    'login_post': {401},           # Contraseñas incorrectas a propósito (un 429 del limitador es un error)
+    'tecnico.ver_caso POST': {409},  # Otro hilo cambió la versión del caso antes
+}
+
+
+def percentil(ordenados, p):
+    # Percentil por rango más cercano sobre una lista ya ordenada
+    if not ordenados:
+        return 0.0
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumen(muestras, segundos):
+    """Por etiqueta: peticiones, errores, peticiones por segundo y p50/p95/p99 en milisegundos."""
+    filas = {}
+    for etiqueta, datos in sorted(muestras.datos.items()):
+        duraciones = sorted(d for d, _ in datos)
+        esperados = ESTADOS_ESPERADOS.get(etiqueta, set())
+        filas[etiqueta] = {
+            'peticiones': len(datos),
+            'errores': sum(1 for _, estado in datos if estado >= 400 and estado not in esperados),
+            'rps': round(len(datos) / segundos, 2) if segundos else 0.0,
+            'p50': round(percentil(duraciones, 50) * 1000, 2),
+            'p95': round(percentil(duraciones, 95) * 1000, 2),
+            'p99': round(percentil(duraciones, 99) * 1000, 2),
+        }
+    return filas
+
+
+def imprimir(filas, salida=None):
+    print(f"{'endpoint':28} {'peticiones':>10} {'errores':>8} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}", file=salida)
+    for etiqueta, f in filas.items():
+        print(f"{etiqueta:28} {f['peticiones']:>10} {f['errores']:>8} {f['rps']:>9.2f} "
+              f"{f['p50']:>9.2f} {f['p95']:>9.2f} {f['p99']:>9.2f}", file=salida)
+
+
+def _ruta(nombre, carpeta):
+    return os.path.join(carpeta, f'{nombre}.json')
+
+
+def guardar_base(nombre, filas, carpeta=CARPETA_BASES):
+    os.makedirs(carpeta, exist_ok=True)
+    with open(_ruta(nombre, carpeta), 'w', encoding='utf-8') as archivo:
+        json.dump(filas, archivo, indent=2, ensure_ascii=False)
+
+
+def cargar_base(nombre, carpeta=CARPETA_BASES):
+    with open(_ruta(nombre, carpeta), encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def comparar(filas, base, tolerancia=0.2):
+    """
+    Regresiones frente a una línea base: p95 más de `tolerancia` por encima, rendimiento
+    más de `tolerancia` por debajo o errores donde antes no había. Devuelve una lista de textos.
+    """
+    regresiones = []
+    for etiqueta, anterior in base.items():
+        actual = filas.get(etiqueta)
+        if actual is None:
+            regresiones.append(f'{etiqueta}: sin peticiones en esta ejecución')
+            continue
+        if anterior['p95'] and actual['p95'] > anterior['p95'] * (1 + tolerancia):
+            regresiones.append(f"{etiqueta}: p95 {anterior['p95']:.2f} -> {actual['p95']:.2f} ms")
+        if anterior['rps'] and actual['rps'] < anterior['rps'] * (1 - tolerancia):
+            regresiones.append(f"{etiqueta}: {anterior['rps']:.2f} -> {actual['rps']:.2f} peticiones/s")
+        if actual['errores'] and not anterior['errores']:
+            regresiones.append(f"{etiqueta}: {actual['errores']} errores")
+    return regresiones
@@ -1,9 +1,38 @@
-from flask import Blueprint, render_template, session, request, redirect, url_for
-from db import get_connection
-from werkzeug.security import generate_password_hash  # Librería para encriptar contraseñas antes de guardarlas en la BD
+from flask import Blueprint, render_template, session, request, redirect, url_for, jsonify, Response, stream_with_context, make_response
+from db import get_cursor, pool_stats, enrutamiento_stats
+from services.estadisticas import estadisticas # Contadores precalculados de casos y usuarios
+from services.busqueda import buscador # Búsqueda con índices FULLTEXT y de prefijo
+from services.directorio import directorio, eliminar_usuario # Directorio de usuarios paginado
+from services.paginacion import decodificar_token
+from services.importacion import importador, leer_registros, ErrorImportacion # Alta masiva de usuarios
+from services.exportacion import exportador, leer_fecha, ErrorExportacion, FORMATOS # Exportación masiva de casos
+from services.autenticacion import autenticador # Encriptación de contraseñas y caché de usuarios
+from services.concurrencia import ejecutor_consultas # Consultas del dashboard en paralelo
+from services.archivo import buscar_caso # Casos resueltos antiguos en las tablas de archivo
+from services.tareas import cola_tareas # Trabajo pesado en segundo plano
+from services.cache_http import politica_cache # ETag de las páginas de detalle (GET condicional)
 
 # Controlador para el rol de administrador
 class AdminController:
+    PRESUPUESTO_DASHBOARD = 2.0  # Segundos máximos de consultas del dashboard antes de mostrarlo incompleto
+
+    # Casos de las personas encontradas por la búsqueda
+    CONSULTA_CASOS_USUARIOS = """
+        SELECT codigo_caso, estado, asunto, id_usuario
+        FROM casos
+        WHERE id_usuario IN ({marcadores})
+    """
+    # Detalle de un caso; {casos} se completa con buscar_caso()
+    CONSULTA_CASO = """
+        SELECT c.*, d.nombre_completo, d.telefono, d.correo,
+               e.nombre_equipo, e.marca, e.modelo, e.serial
+        FROM {casos} c
+        JOIN users u ON c.id_usuario = u.id_user
+        JOIN datos_personales d ON u.id_datos = d.id_datos
+        LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
+        WHERE c.codigo_caso = %s
+    """
+
     def __init__(self):
         """
         Constructor del controlador del administrador.
@@ -21,62 +50,37 @@ class AdminController:
         self.bp.route('/caso/<codigo_caso>')(self.ver_caso)
         self.bp.route('/crear_usuario', methods=['POST'])(self.crear_usuario)
         self.bp.route('/eliminar_usuario', methods=['POST'])(self.eliminar_usuario)
+        self.bp.route('/pool', methods=['GET'])(self.estado_pool)
+        self.bp.route('/api/sugerir', methods=['GET'])(self.sugerir)
+        self.bp.route('/usuarios', methods=['GET'])(self.usuarios)
+        self.bp.route('/exportar', methods=['GET'])(self.exportar)
+        self.bp.route('/importar_usuarios', methods=['POST'])(self.importar_usuarios)
 
     # Ruta principal del administrador.
     def dashboard(self):
         if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
             return redirect(url_for('login'))
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Contadores principales
-        cursor.execute("SELECT COUNT(*) AS total_usuarios FROM users")
-        total_usuarios = cursor.fetchone()['total_usuarios']
-
-        cursor.execute("SELECT COUNT(*) AS total_tecnicos FROM users WHERE tipo_usuario = 'tecnico'")
-        total_tecnicos = cursor.fetchone()['total_tecnicos']
-
-        cursor.execute("SELECT COUNT(*) AS total_casos FROM casos")
-        total_casos = cursor.fetchone()['total_casos']
-
-        # Búsqueda por nombre o cédula
+        # Los contadores y la búsqueda son independientes: se ejecutan a la vez,
+        # cada uno con su conexión (los casos dependen de las personas encontradas)
         query = request.args.get('q')
-        usuarios = []
-        casos = []
-
+        tareas = {
+            'usuarios_por_tipo': (estadisticas.usuarios_por_tipo, None),
+            'casos_por_estado': (estadisticas.casos_por_estado, None),
+        }
         if query:
-            cursor.execute("""
-                SELECT u.id_user, u.id_identity, u.tipo_usuario,
-                       d.nombre_completo, d.telefono, d.correo,
-                       e.nombre_equipo, e.marca, e.modelo, e.serial
-                FROM users u
-                JOIN datos_personales d ON u.id_datos = d.id_datos
-                LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
-                WHERE u.id_identity LIKE %s OR d.nombre_completo LIKE %s
-            """, (f"%{query}%", f"%{query}%"))
-            usuarios = cursor.fetchall()
-
-            if usuarios:
-                user_ids = tuple([u['id_user'] for u in usuarios])
-                placeholders = ','.join(['%s'] * len(user_ids))
-                cursor.execute(f"""
-                    SELECT codigo_caso, estado, asunto, id_usuario
-                    FROM casos
-                    WHERE id_usuario IN ({placeholders})
-                """, user_ids)
-                casos = cursor.fetchall()
-
-        cursor.execute("""
-            SELECT u.id_user, u.id_identity, u.tipo_usuario, 
-                   d.nombre_completo, d.correo
-            FROM users u
-            JOIN datos_personales d ON u.id_datos = d.id_datos
-        """)
-        todos_usuarios = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+            tareas['busqueda'] = (lambda cursor: self._buscar(cursor, query), ([], []))
+        resultados, incompletos = ejecutor_consultas.ejecutar(tareas, self.PRESUPUESTO_DASHBOARD, solo_lectura=True)
+
+        # Contadores principales ('—' si no llegaron a tiempo)
+        usuarios_por_tipo = resultados['usuarios_por_tipo']
+        total_usuarios = sum(usuarios_por_tipo.values()) if usuarios_por_tipo else '—'
+        total_tecnicos = usuarios_por_tipo['tecnico'] if usuarios_por_tipo else '—'
+        casos_por_estado = resultados['casos_por_estado']
+        total_casos = sum(casos_por_estado.values()) if casos_por_estado else '—'
+
+        # Búsqueda por nombre, cédula o equipo
+        usuarios, casos = resultados.get('busqueda', ([], []))
 
         return render_template('admin/dashboard.html',
                                total_usuarios=total_usuarios,
@@ -85,105 +89,136 @@ class AdminController:
                                query=query,
                                usuarios=usuarios,
                                casos=casos,
-                               todos_usuarios=todos_usuarios)
+                               incompletos=incompletos)
+
+    def _buscar(self, cursor, query):
+        # Personas que coinciden con la búsqueda y sus casos
+        usuarios = buscador.buscar_personas(cursor, query)
+        casos = []
+        if usuarios:
+            user_ids = tuple([u['id_user'] for u in usuarios])
+            placeholders = ','.join(['%s'] * len(user_ids))
+            cursor.execute(self.CONSULTA_CASOS_USUARIOS.format(marcadores=placeholders), user_ids)
+            casos = cursor.fetchall()
+        return usuarios, casos
+
+    def usuarios(self):
+        # Directorio de usuarios bajo demanda: JSON paginado, ordenable y filtrable por rol
+        if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
+            return jsonify({'message': 'No autorizado'}), 401
+
+        partes = directorio.transmitir(orden=request.args.get('orden', 'id_identity'),
+                                       descendente=request.args.get('sentido') == 'desc',
+                                       tipo=request.args.get('tipo') or None,
+                                       despues=decodificar_token(request.args.get('despues')),
+                                       limite=request.args.get('limite', type=int))
+        return Response(stream_with_context(partes), mimetype='application/json')
+
+    def exportar(self):
+        # Descarga de casos con solicitante y comentarios (csv, ndjson o parquet), por partes
+        if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
+            return jsonify({'message': 'No autorizado'}), 401
+
+        formato = request.args.get('formato', 'csv')
+        try:
+            partes = exportador.transmitir(formato,
+                                           desde=leer_fecha(request.args.get('desde')),
+                                           hasta=leer_fecha(request.args.get('hasta')),
+                                           estados=request.args.getlist('estado'),
+                                           prioridades=request.args.getlist('prioridad'))
+        except ErrorExportacion as e:
+            return jsonify({'message': str(e)}), 400
+
+        tipo_contenido, extension = FORMATOS[formato]
+        return Response(stream_with_context(partes), content_type=tipo_contenido,
+                        headers={'Content-Disposition': f'attachment; filename=casos.{extension}'})
 
     def ver_caso(self, codigo_caso):
         # Muestra el detalle de un caso específico para que el administrador lo revise.
         if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
             return redirect(url_for('login'))
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            # Si el navegador ya tiene esta versión del caso se responde 304 sin leerlo
+            validador = politica_cache.validador_caso(cursor, codigo_caso, 'admin.ver_caso')
+            if validador:
+                no_modificado = politica_cache.no_modificado(*validador)
+                if no_modificado is not None:
+                    return no_modificado
 
-        cursor.execute("""
-            SELECT c.*, d.nombre_completo, d.telefono, d.correo,
-                   e.nombre_equipo, e.marca, e.modelo, e.serial
-            FROM casos c
-            JOIN users u ON c.id_usuario = u.id_user
-            JOIN datos_personales d ON u.id_datos = d.id_datos
-            LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
-            WHERE c.codigo_caso = %s
-        """, (codigo_caso,))
-        caso = cursor.fetchone()
-
-        cursor.close()
-        conn.close()
+            # Si ya no está en casos, se busca entre los archivados
+            caso, archivado = buscar_caso(cursor, self.CONSULTA_CASO, (codigo_caso,))
 
         if not caso:
             return "Caso no encontrado", 404
 
-        return render_template('admin/ver_caso.html', caso=caso)
+        response = make_response(render_template('admin/ver_caso.html', caso=caso, archivado=archivado))
+        return politica_cache.marcar(response, *validador) if validador else response
 
     def crear_usuario(self):
         # Crea un nuevo usuario desde el formulario del administrador.
-        data = request.form
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Insertar equipo
-        cursor.execute("""
-            INSERT INTO equipos (nombre_equipo, marca, modelo, serial)
-            VALUES (%s, %s, %s, %s)
-        """, (data['nombre_equipo'], data['marca'], data['modelo'], data['serial']))
-        id_equipo = cursor.lastrowid
-
-        # Insertar datos personales
-        cursor.execute("""
-            INSERT INTO datos_personales (cedula, nombre_completo, telefono, correo, id_equipo)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (data['id_identity'], data['nombre_completo'], data['telefono'], data['correo'], id_equipo))
-        id_datos = cursor.lastrowid
-
-        # Encriptar contraseña antes de guardar
-        hashed_password = generate_password_hash(data['password'])
-
-        # Insertar usuario con contraseña encriptada
-        cursor.execute("""
-            INSERT INTO users (id_identity, password, tipo_usuario, id_datos)
-            VALUES (%s, %s, %s, %s)
-        """, (data['id_identity'], hashed_password, data['tipo_usuario'], id_datos))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # La contraseña se encripta aquí (un solo hash) y la tarea recibe solo el hash,
+        # así que cualquier trabajador puede hacer el alta y la contraseña no llega a la cola.
+        data = request.form.to_dict()
+        password_hash = autenticador.encriptar(data.pop('password'))
+        cola_tareas.encolar('crear_usuario', {'datos': data, 'password_hash': password_hash},
+                            clave=f"crear_usuario:{data['id_identity']}")
         return redirect(url_for('admin.dashboard'))
 
+    def importar_usuarios(self):
+        """
+        Alta masiva de usuarios desde un archivo CSV o JSON (campo 'archivo') o un cuerpo JSON.
+        Parámetros: parcial=1 importa las filas válidas aunque otras tengan errores;
+        simular=1 solo valida. Responde con el resumen de creados, omitidos y errores por fila.
+        """
+        if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
+            return jsonify({'message': 'No autorizado'}), 401
+
+        try:
+            archivo = request.files.get('archivo')
+            if archivo:
+                formato = 'json' if archivo.filename.lower().endswith('.json') else 'csv'
+                registros = leer_registros(archivo.read(), formato)
+            else:
+                registros = leer_registros(request.get_data(), 'json')
+        except ErrorImportacion as e:
+            return jsonify({'message': str(e)}), 400
+
+        parcial = request.args.get('parcial') == '1'
+        resultado = importador.importar(registros, parcial=parcial, simular=request.args.get('simular') == '1')
+
+        # Con errores de validación y sin 'parcial' no se escribió nada
+        codigo = 400 if resultado['errores'] and not parcial else 200
+        return jsonify(resultado), codigo
+
     def eliminar_usuario(self):
-        # Elimina un usuario con su información personal y su equipo.
+        # Elimina un usuario con su información personal; si falla (p. ej. porque tiene casos),
+        # el administrador ve el error. El equipo se revisa y borra después, en segundo plano.
         id_identity = request.form['id_identity']
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Obtener IDs relacionados
-        cursor.execute("""
-            SELECT u.id_user, u.id_datos, d.id_equipo 
-            FROM users u
-            JOIN datos_personales d ON u.id_datos = d.id_datos
-            WHERE u.id_identity = %s
-        """, (id_identity,))
-        result = cursor.fetchone()
-
-        if result:
-            id_user = result['id_user']
-            id_datos = result['id_datos']
-            id_equipo = result['id_equipo']
-
-            # Eliminar usuario y datos personales.
-            cursor.execute("DELETE FROM users WHERE id_user = %s", (id_user,))
-            cursor.execute("DELETE FROM datos_personales WHERE id_datos = %s", (id_datos,))
-
-            # Verificar si el equipo está asociado a más personas.
-            if id_equipo:
-                cursor.execute("SELECT COUNT(*) AS cantidad FROM datos_personales WHERE id_equipo = %s", (id_equipo,))
-                if cursor.fetchone()['cantidad'] == 0:
-                    cursor.execute("DELETE FROM equipos WHERE id_equipo = %s", (id_equipo,))
-
+        with get_cursor(dictionary=True) as (conn, cursor):
+            encontrado, id_equipo = eliminar_usuario(cursor, id_identity)
             conn.commit()
-
-        cursor.close()
-        conn.close()
+        if encontrado:
+            autenticador.invalidar(id_identity)
+        if id_equipo:
+            cola_tareas.encolar('eliminar_equipo', {'id_equipo': id_equipo}, clave=f'eliminar_equipo:{id_equipo}')
         return redirect(url_for('admin.dashboard'))
 
+    def sugerir(self):
+        # Sugerencias para el buscador mientras se escribe
+        if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
+            return jsonify({'message': 'No autorizado'}), 401
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            sugerencias = buscador.sugerir(cursor, request.args.get('q'))
+        return jsonify(sugerencias)
+
+    def estado_pool(self):
+        # Estadísticas del pool de conexiones, para dimensionarlo según la carga real,
+        # del reparto de lecturas entre el primario y las réplicas, y de la cola de tareas.
+        if 'user' not in session or session['user']['tipo_usuario'] != 'administrador':
+            return redirect(url_for('login'))
+        return jsonify(dict(pool_stats(), enrutamiento=enrutamiento_stats(), tareas=cola_tareas.contar()))
+
 
 # Instancia de controlador
 admin_controller = AdminController()
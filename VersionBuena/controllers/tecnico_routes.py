@@ -1,11 +1,49 @@
-from flask import Blueprint, render_template, session, request, redirect, url_for
-from db import get_connection
-import io # Para manipular imágenes en memoria y codificarlas
-import base64 # Para manipular imágenes en memoria y codificarlas
-import pandas as pd # Análisis de datos
-import matplotlib.pyplot as plt  # Generar gráficos visuales
+import json
+import time
+
+from flask import Blueprint, render_template, session, request, redirect, url_for, abort, make_response, jsonify, flash, Response, stream_with_context
+from db import get_cursor
+from services.graficas import cache_graficas # Gráficas del dashboard generadas en segundo plano
+from services.estadisticas import estadisticas # Contadores precalculados de casos
+from services.cargadores import cargador_comentarios # Carga de comentarios por lotes
+from services.colas import motor_colas # Colas paginadas de casos
+from services.dominio import ESTADOS, PRIORIDADES
+from services.paginacion import decodificar_cursor
+from services.busqueda import buscador # Búsqueda con índices FULLTEXT y de prefijo
+from services.flujo import flujo_casos, ErrorTransicion # Transiciones de estado con control de versión
+from services.eventos import bus_eventos, publicar_casos # Cambios de casos en tiempo real
+from services.concurrencia import ejecutor_consultas # Consultas del dashboard en paralelo
+from services.archivo import buscar_caso # Casos resueltos antiguos en las tablas de archivo
+from services.sla import motor_sla, COLAS_SLA # Plazos de resolución, colas de vencimiento y antigüedad
+from services.cache_http import politica_cache # ETag de las páginas de detalle (GET condicional)
 
 class TecnicoController:
+    MAXIMO_LOTE = 1000  # Casos por operación masiva
+    LATIDO_SSE = 15      # Segundos entre comentarios de mantenimiento en el flujo de eventos
+    DURACION_SSE = 300   # Segundos que se mantiene abierta una conexión; el navegador se reconecta solo
+    PRESUPUESTO_DASHBOARD = 2.0  # Segundos máximos de consultas del dashboard antes de mostrarlo incompleto
+
+    # Consultas del detalle de un caso; {casos} se completa con buscar_caso()
+    CONSULTA_CASO = """
+        SELECT id_caso, codigo_caso, id_usuario, estado, asunto, descripcion, prioridad, fecha_creacion, tipo_caso, version
+        FROM {casos}
+        WHERE codigo_caso = %s
+    """
+    CONSULTA_SOLICITANTE = """
+        SELECT d.*, u.tipo_usuario, u.id_identity, e.nombre_equipo, e.marca, e.modelo, e.serial
+        FROM users u
+        JOIN datos_personales d ON u.id_datos = d.id_datos
+        LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
+        WHERE u.id_user = %s
+    """
+
+    # Plantilla y vista de detalle de cada cola
+    COLAS = {
+        'pendiente': ('tecnico/pendientes.html', 'tecnico.ver_caso'),
+        'proceso': ('tecnico/proceso.html', 'tecnico.ver_caso_proceso'),
+        'resuelto': ('tecnico/resueltos.html', 'tecnico.ver_caso_resuelto'),
+    }
+
     def __init__(self):
         self.bp = Blueprint('tecnico', __name__, url_prefix='/tecnico') # Define el blueprint para este módulo
         self.register_routes() # Asocia rutas del técnico a funciones
@@ -14,88 +52,46 @@ class TecnicoController:
 
         # Mapea las rutas a las funciones correspondientes del técnico.
         self.bp.route('/dashboard', methods=['GET'])(self.dashboard)
+        self.bp.route('/grafica/<nombre>.<extension>', methods=['GET'])(self.grafica)
+        self.bp.route('/api/graficas', methods=['GET'])(self.datos_graficas)
         self.bp.route('/logout')(self.logout)
         self.bp.route('/pendientes')(self.pendientes)
         self.bp.route('/proceso')(self.proceso)
         self.bp.route('/resueltos')(self.resueltos)
+        self.bp.route('/mis_casos')(self.mis_casos)
+        self.bp.route('/api/cola/<estado>', methods=['GET'])(self.api_cola)
+        self.bp.route('/sla', methods=['GET'])(self.sla)
+        self.bp.route('/api/sla/<tipo>', methods=['GET'])(self.api_sla)
+        self.bp.route('/api/sugerir', methods=['GET'])(self.sugerir)
+        self.bp.route('/eventos/<estado>', methods=['GET'])(self.eventos)
+        self.bp.route('/casos/lote', methods=['POST'])(self.lote)
         self.bp.route('/caso/<string:codigo_caso>', methods=['GET', 'POST'])(self.ver_caso)
         self.bp.route('/caso/proceso/<string:codigo_caso>', methods=['GET', 'POST'])(self.ver_caso_proceso)
         self.bp.route('/caso/resuelto/<string:codigo_caso>', methods=['GET', 'POST'])(self.ver_caso_resuelto)
 
-    def create_base64_plot(self, fig):
-        img = io.BytesIO()
-        fig.savefig(img, format='png', bbox_inches='tight') # Guardar la figura en memoria
-        img.seek(0)
-        return base64.b64encode(img.getvalue()).decode() # Convertir a base64 para enviar al navegador
-
     def dashboard(self):
         if 'user' not in session:
             return redirect(url_for('login'))
 
-        # Consultar datos para estadísticas
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Casos por estado
-        cursor.execute("SELECT estado, COUNT(*) AS cantidad FROM casos GROUP BY estado")
-        estado_data = cursor.fetchall()
-        df_estado = pd.DataFrame(estado_data)
-
-        # Tendencia de casos por tiempo
-        cursor.execute("SELECT id_caso, fecha_creacion FROM casos ORDER BY fecha_creacion")
-        tendencia_data = cursor.fetchall()
-        df_tendencia = pd.DataFrame(tendencia_data)
-        df_tendencia['conteo'] = range(1, len(df_tendencia) + 1)
-
-        fig1, ax1 = plt.subplots()
-        ax1.pie(df_estado['cantidad'], labels=df_estado['estado'], autopct='%1.1f%%', startangle=140)
-        ax1.set_title("Distribución de Casos")
-        piechart = self.create_base64_plot(fig1)
-        plt.close(fig1)
-
-        fig2, ax2 = plt.subplots()
-        ax2.bar(df_estado['estado'], df_estado['cantidad'], color='skyblue')
-        ax2.set_title("Casos por Estado")
-        barchart = self.create_base64_plot(fig2)
-        plt.close(fig2)
-
-        fig3, ax3 = plt.subplots()
-        ax3.plot(df_tendencia['id_caso'], df_tendencia['conteo'], marker='o', linestyle='-', color='green')
-        ax3.set_title("Tendencia de Casos")
-        ax3.set_xlabel("ID del Caso")
-        ax3.set_ylabel("Cantidad Acumulada")
-        linechart = self.create_base64_plot(fig3)
-        plt.close(fig3)
-
-        # Obtener cantidades individuales por estado
-        pendientes = df_estado[df_estado['estado'] == 'pendiente']['cantidad'].values[0] if 'pendiente' in df_estado['estado'].values else 0
-        proceso = df_estado[df_estado['estado'] == 'proceso']['cantidad'].values[0] if 'proceso' in df_estado['estado'].values else 0
-        resueltos = df_estado[df_estado['estado'] == 'resuelto']['cantidad'].values[0] if 'resuelto' in df_estado['estado'].values else 0
+        # Las gráficas se sirven desde /grafica/<nombre>.<extension>; aquí solo se pide que estén al día
+        cache_graficas.solicitar()
 
+        # Las consultas son independientes: se ejecutan a la vez, cada una con su conexión
         query = request.args.get('q')
-        usuarios, casos = [], []
-
+        tareas = {'conteo_estado': (estadisticas.casos_por_estado, None)}
         if query:
-            cursor.execute("""
-                SELECT u.id_identity, u.tipo_usuario, 
-                       d.nombre_completo, d.telefono, d.correo,
-                       e.nombre_equipo, e.marca, e.modelo, e.serial
-                FROM users u
-                JOIN datos_personales d ON u.id_datos = d.id_datos
-                LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
-                WHERE d.nombre_completo LIKE %s
-            """, (f"%{query}%",))
-            usuarios = cursor.fetchall()
-
-            cursor.execute("""
-                SELECT codigo_caso, estado, asunto
-                FROM casos
-                WHERE codigo_caso LIKE %s
-            """, (f"%{query}%",))
-            casos = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+            tareas['usuarios'] = (lambda cursor: buscador.buscar_personas(cursor, query), [])
+            tareas['casos'] = (lambda cursor: buscador.buscar_casos(cursor, query), [])
+        resultados, incompletos = ejecutor_consultas.ejecutar(tareas, self.PRESUPUESTO_DASHBOARD, solo_lectura=True)
+
+        conteo_estado = resultados['conteo_estado'] or {estado: '—' for estado in ESTADOS}
+        usuarios = resultados.get('usuarios', [])
+        casos = resultados.get('casos', [])
+
+        # Obtener cantidades individuales por estado
+        pendientes = conteo_estado['pendiente']
+        proceso = conteo_estado['proceso']
+        resueltos = conteo_estado['resuelto']
 
         return render_template('tecnico/dashboard.html',
                                pendientes=pendientes,
@@ -104,73 +100,268 @@ class TecnicoController:
                                query=query,
                                usuarios=usuarios,
                                casos=casos,
-                               piechart=piechart,
-                               barchart=barchart,
-                               linechart=linechart)
+                               incompletos=incompletos,
+                               extension_graficas=cache_graficas.extension)
+
+    def grafica(self, nombre, extension):
+        # Sirve una gráfica ya generada; el navegador la revalida con ETag/Last-Modified
+        if 'user' not in session:
+            return redirect(url_for('login'))
+
+        if nombre not in cache_graficas.NOMBRES or extension != cache_graficas.extension:
+            abort(404)
+        return self._servir_grafica(nombre)
+
+    def datos_graficas(self):
+        # Datos de las gráficas en JSON, para dibujarlas en el navegador
+        if 'user' not in session:
+            return jsonify({'message': 'No autorizado'}), 401
+        return self._servir_grafica('datos')
+
+    def _servir_grafica(self, nombre):
+        resultado = cache_graficas.obtener(nombre)
+        if resultado is None:
+            abort(503)
+        contenido, tipo, etag, ultima_modificacion = resultado
+
+        response = make_response(contenido)
+        response.mimetype = tipo
+        response.set_etag(etag)
+        response.last_modified = ultima_modificacion
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def sugerir(self):
+        # Sugerencias para el buscador mientras se escribe
+        if 'user' not in session:
+            return jsonify({'message': 'No autorizado'}), 401
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            sugerencias = buscador.sugerir(cursor, request.args.get('q'))
+        return jsonify(sugerencias)
 
     def logout(self):
         session.clear()
         return redirect(url_for('login'))
 
     def pendientes(self):
-        if 'user' not in session:
-            return redirect(url_for('login'))
+        return self._cola('pendiente')
 
-        prioridad = request.args.get('prioridad', 'alta')
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+    def proceso(self):
+        return self._cola('proceso')
 
-        cursor.execute("""
-            SELECT codigo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, tipo_caso
-            FROM casos
-            WHERE estado = 'pendiente' AND prioridad = %s
-            ORDER BY fecha_creacion DESC
-        """, (prioridad,))
-        casos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+    def resueltos(self):
+        return self._cola('resuelto')
 
-        return render_template('tecnico/pendientes.html', casos=casos, prioridad=prioridad)
+    def _mios(self):
+        # Con ?mios=1 las colas se limitan a los casos asignados al técnico de la sesión
+        return session['user']['id_datos'] if request.args.get('mios') == '1' else None
 
-    def proceso(self):
-        if 'user' not in session:
-            return redirect(url_for('login'))
+    def _consultar_cola(self, estado, resumen=False, asignado=None):
+        # Lee los filtros de la petición y devuelve (casos, siguiente, prioridades)
+        prioridades = motor_colas.normalizar_prioridades(request.args.getlist('prioridad'))
+        despues = decodificar_cursor(request.args.get('despues'))
+        limite = request.args.get('limite', type=int)
 
-        prioridad = request.args.get('prioridad', 'alta')
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            casos, siguiente = motor_colas.listar(cursor, estado, prioridades, despues=despues,
+                                                  limite=limite, resumen=resumen, asignado=asignado)
+        return casos, siguiente, prioridades
 
-        cursor.execute("""
-            SELECT codigo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, tipo_caso
-            FROM casos
-            WHERE estado = 'proceso' AND prioridad = %s
-            ORDER BY fecha_creacion DESC
-        """, (prioridad,))
-        casos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+    def _cola(self, estado):
+        if 'user' not in session:
+            return redirect(url_for('login'))
 
-        return render_template('tecnico/proceso.html', casos=casos, prioridad=prioridad)
+        casos, siguiente, prioridades = self._consultar_cola(estado)
+        plantilla, _ = self.COLAS[estado]
+        return render_template(plantilla,
+                               casos=casos,
+                               estado=estado,
+                               transiciones=flujo_casos.transiciones(estado),
+                               prioridad=prioridades[0],
+                               prioridades=prioridades,
+                               siguiente=siguiente,
+                               despues=request.args.get('despues'))
+
+    def mis_casos(self):
+        # Cola personal: los casos asignados al técnico de la sesión, por estado y prioridad
+        if 'user' not in session:
+            return redirect(url_for('login'))
 
-    def resueltos(self):
+        estado = request.args.get('estado', 'pendiente')
+        if estado not in ESTADOS:
+            abort(404)
+        casos, siguiente, prioridades = self._consultar_cola(estado, asignado=session['user']['id_datos'])
+        _, vista_detalle = self.COLAS[estado]
+        return render_template('tecnico/mis_casos.html',
+                               casos=casos,
+                               estado=estado,
+                               estados=ESTADOS,
+                               vista_detalle=vista_detalle,
+                               transiciones=flujo_casos.transiciones(estado),
+                               prioridades=prioridades,
+                               siguiente=siguiente,
+                               despues=request.args.get('despues'))
+
+    def api_cola(self, estado):
+        # Variante JSON de las colas, para el desplazamiento infinito
+        if 'user' not in session:
+            return jsonify({'message': 'No autorizado'}), 401
+        if estado not in ESTADOS:
+            abort(404)
+
+        casos, siguiente, prioridades = self._consultar_cola(estado, resumen=request.args.get('resumen') == '1',
+                                                             asignado=self._mios())
+        _, vista_detalle = self.COLAS[estado]
+        for caso in casos:
+            caso['fecha_creacion'] = caso['fecha_creacion'].isoformat(sep=' ')
+            caso['url'] = url_for(vista_detalle, codigo_caso=caso['codigo_caso'])
+        return jsonify({'casos': casos, 'siguiente': siguiente, 'prioridades': prioridades})
+
+    def sla(self):
+        # Casos vencidos y por vencer, antigüedad de los abiertos y resolución por técnico
         if 'user' not in session:
             return redirect(url_for('login'))
 
-        prioridad = request.args.get('prioridad', 'alta')
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        prioridades = motor_colas.normalizar_prioridades(request.args.getlist('prioridad') or PRIORIDADES)
+        tareas = {
+            'vencidos': (lambda cursor: motor_sla.cola(cursor, 'vencidos', prioridades), []),
+            'por_vencer': (lambda cursor: motor_sla.cola(cursor, 'por_vencer', prioridades), []),
+            'antiguedad': (motor_sla.antiguedad, ({}, None)),
+            'tecnicos': (motor_sla.por_tecnico, []),
+        }
+        resultados, incompletos = ejecutor_consultas.ejecutar(tareas, self.PRESUPUESTO_DASHBOARD, solo_lectura=True)
+        antiguedad, calculado_en = resultados['antiguedad']
+        return render_template('tecnico/sla.html',
+                               prioridades=prioridades,
+                               vencidos=resultados['vencidos'],
+                               por_vencer=resultados['por_vencer'],
+                               antiguedad=antiguedad,
+                               calculado_en=calculado_en,
+                               tecnicos=resultados['tecnicos'],
+                               incompletos=incompletos)
+
+    def api_sla(self, tipo):
+        # Colas de vencimiento en JSON: 'vencidos' o 'por_vencer', en orden de vencimiento
+        if 'user' not in session:
+            return jsonify({'message': 'No autorizado'}), 401
+        if tipo not in COLAS_SLA:
+            abort(404)
+
+        prioridades = motor_colas.normalizar_prioridades(request.args.getlist('prioridad') or PRIORIDADES)
+        limite = max(1, min(request.args.get('limite', 50, type=int), motor_colas.maximo_pagina))
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            casos = motor_sla.cola(cursor, tipo, prioridades, limite)
+        for caso in casos:
+            for campo in ('fecha_creacion', 'estado_desde', 'vence_sla'):
+                caso[campo] = caso[campo].isoformat(sep=' ') if caso[campo] else None
+            caso['url'] = url_for('tecnico.ver_caso', codigo_caso=caso['codigo_caso'])
+        return jsonify({'casos': casos, 'prioridades': prioridades})
+
+    def eventos(self, estado):
+        """
+        Server-Sent Events de una cola: envía los casos que entran en ella o salen de ella
+        (por creación, cambio de estado o de prioridad) a medida que ocurren.
+        No usa la base de datos; cada conexión ocupa un hilo mientras está abierta.
+        """
+        if 'user' not in session:
+            return jsonify({'message': 'No autorizado'}), 401
+        if estado not in ESTADOS:
+            abort(404)
+
+        prioridades = set(motor_colas.normalizar_prioridades(request.args.getlist('prioridad')))
+        mios = self._mios()
+        _, vista_detalle = self.COLAS[estado]
+        ultimo = request.headers.get('Last-Event-ID', type=int)
+
+        def en_cola(estado_caso, prioridad_caso, asignado):
+            return estado_caso == estado and prioridad_caso in prioridades and (mios is None or asignado == mios)
+
+        def transmitir():
+            fin = time.monotonic() + self.DURACION_SSE
+            with bus_eventos.suscribir(desde=ultimo) as suscripcion:
+                yield 'retry: 3000\n\n'
+                while time.monotonic() < fin:
+                    if suscripcion.desbordada:
+                        # Se perdieron eventos: el cliente debe recargar la cola completa
+                        yield 'event: recargar\ndata: {}\n\n'
+                        return
+                    evento = suscripcion.esperar(self.LATIDO_SSE)
+                    if evento is None:
+                        yield ': latido\n\n'
+                        continue
+                    id_evento, tipo, caso = evento
+                    entra = en_cola(caso['estado'], caso['prioridad'], caso.get('id_asignado'))
+                    estaba = en_cola(caso.get('estado_anterior'), caso.get('prioridad_anterior'),
+                                     caso.get('asignado_anterior', caso.get('id_asignado')))
+                    if tipo != 'caso' or not (entra or estaba):
+                        continue
+                    datos = {'accion': 'agregar' if entra else 'quitar',
+                             'caso': {'id_caso': caso['id_caso'], 'codigo_caso': caso['codigo_caso'],
+                                      'asunto': caso['asunto'], 'prioridad': caso['prioridad'],
+                                      'estado': caso['estado'], 'version': caso['version'],
+                                      'fecha_creacion': caso['fecha_creacion'].strftime('%Y-%m-%d %H:%M:%S'),
+                                      'url': url_for(vista_detalle, codigo_caso=caso['codigo_caso'])}}
+                    yield f'id: {id_evento}\nevent: caso\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n'
+
+        response = Response(stream_with_context(transmitir()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # Sin búfer en un proxy nginx
+        return response
+
+    def lote(self):
+        """
+        Cambio de estado o de prioridad de varios casos en una sola transacción, o su
+        asignación al técnico de la sesión (accion 'asignar').
+        Acepta el formulario de las colas (casos como "id:version") o JSON
+        {"casos": [{"id_caso", "version"}], "accion", "prioridad", "comentario"}.
+        La versión de cada caso es obligatoria (concurrencia optimista, ver services/flujo.py).
+        """
+        if 'user' not in session:
+            return redirect(url_for('login'))
 
-        cursor.execute("""
-            SELECT codigo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, tipo_caso
-            FROM casos
-            WHERE estado = 'resuelto' AND prioridad = %s
-            ORDER BY fecha_creacion DESC
-        """, (prioridad,))
-        casos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        datos = request.get_json(silent=True)
+        if datos is None:
+            datos = {'casos': request.form.getlist('caso'), 'accion': request.form.get('accion'),
+                     'prioridad': request.form.get('prioridad'), 'comentario': request.form.get('comentario')}
+
+        pedidos = {}
+        try:
+            for caso in datos.get('casos') or []:
+                if isinstance(caso, dict):
+                    id_caso, version = caso['id_caso'], caso['version']
+                else:
+                    id_caso, _, version = str(caso).partition(':')
+                pedidos[int(id_caso)] = int(version)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'message': 'Lista de casos inválida: cada caso necesita su id y su versión'}), 400
+        if not pedidos or len(pedidos) > self.MAXIMO_LOTE:
+            return jsonify({'message': f'Seleccione entre 1 y {self.MAXIMO_LOTE} casos'}), 400
+
+        accion = datos.get('accion')
+        comentario = (datos.get('comentario') or '').strip() or None
+        id_tecnico = session['user']['id_datos']
+        with get_cursor(dictionary=True) as (conn, cursor):
+            try:
+                if accion == 'prioridad':
+                    resultado = flujo_casos.cambiar_prioridad(cursor, pedidos, datos.get('prioridad'), id_tecnico, comentario)
+                elif accion == 'asignar':
+                    resultado = flujo_casos.asignar(cursor, pedidos, id_tecnico, id_tecnico, comentario)
+                else:
+                    resultado = flujo_casos.cambiar_estado(cursor, pedidos, accion, id_tecnico, comentario)
+            except ErrorTransicion as e:
+                return jsonify({'message': str(e)}), 400
+            conn.commit()
+        publicar_casos(resultado['cambios'])
 
-        return render_template('tecnico/resueltos.html', casos=casos, prioridad=prioridad)
+        if request.is_json:
+            return jsonify(resultado)
+        flash(f"{len(resultado['actualizados'])} casos actualizados", 'success')
+        if resultado['conflictos']:
+            flash('Modificados por otro técnico (vuelva a cargar la cola): ' + ', '.join(resultado['conflictos']), 'error')
+        for invalido in resultado['invalidos']:
+            flash(f"{invalido['codigo_caso']}: {invalido['motivo']}", 'error')
+        return redirect(request.referrer or url_for('tecnico.dashboard'))
 
     def ver_caso(self, codigo_caso):
         return self._ver_caso_generico(codigo_caso, 'tecnico.ver_caso')
@@ -185,76 +376,72 @@ class TecnicoController:
         if 'user' not in session:
             return redirect(url_for('login'))
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("""
-            SELECT id_caso, codigo_caso, id_usuario, estado, asunto, descripcion, prioridad, fecha_creacion, tipo_caso
-            FROM casos
-            WHERE codigo_caso = %s
-        """, (codigo_caso,))
-        caso = cursor.fetchone()
-
-        if not caso:
-            cursor.close()
-            conn.close()
-            return "Caso no encontrado", 404
-
-        if request.method == 'POST':
-            accion = request.form.get('accion')
-            comentario = request.form.get('comentario')
-            id_tecnico = session['user']['id_datos']
-
-            if accion == 'comentar' and comentario:
-                cursor.execute("""
-                    INSERT INTO comentarios (id_caso, id_tecnico, texto, fecha_comentario)
-                    VALUES (%s, %s, %s, NOW())
-                """, (caso['id_caso'], id_tecnico, comentario))
-
-            elif accion in ['pendiente', 'proceso', 'resuelto']:
-                cursor.execute("""
-                    UPDATE casos SET estado = %s WHERE id_caso = %s
-                """, (accion, caso['id_caso']))
-
-                if comentario:
-                    cursor.execute("""
-                        INSERT INTO comentarios (id_caso, id_tecnico, texto, fecha_comentario)
-                        VALUES (%s, %s, %s, NOW())
-                    """, (caso['id_caso'], id_tecnico, comentario))
-
-            conn.commit()
-            return redirect(url_for(redirect_endpoint, codigo_caso=caso['codigo_caso']))
-
-        cursor.execute("""
-            SELECT d.*, u.tipo_usuario, u.id_identity, e.nombre_equipo, e.marca, e.modelo, e.serial
-            FROM users u
-            JOIN datos_personales d ON u.id_datos = d.id_datos
-            LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
-            WHERE u.id_user = %s
-        """, (caso['id_usuario'],))
-        usuario = cursor.fetchone()
-
-        if not usuario:
-            cursor.close()
-            conn.close()
-            return "Usuario no encontrado", 404
-
-        cursor.execute("""
-            SELECT c.texto, c.fecha_comentario, dp.nombre_completo AS tecnico
-            FROM comentarios c
-            JOIN datos_personales dp ON c.id_tecnico = dp.id_datos
-            WHERE c.id_caso = %s
-            ORDER BY c.fecha_comentario DESC
-        """, (caso['id_caso'],))
-        comentarios = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
-
-        return render_template('tecnico/ver_caso.html',
-                               caso=caso,
-                               usuario=usuario,
-                               comentarios=comentarios)
+        # La consulta puede ir a una réplica; tras un POST la sesión lee del primario
+        # durante unos segundos (db.marcar_escritura), así el técnico ve su propio cambio
+        solo_lectura = request.method == 'GET'
+        validador = None
+        with get_cursor(dictionary=True, solo_lectura=solo_lectura) as (conn, cursor):
+            # Si el navegador ya tiene esta versión del caso se responde 304 sin leerlo
+            if request.method == 'GET':
+                validador = politica_cache.validador_caso(cursor, codigo_caso, redirect_endpoint)
+                if validador:
+                    no_modificado = politica_cache.no_modificado(*validador)
+                    if no_modificado is not None:
+                        return no_modificado
+
+            # Los casos resueltos antiguos pueden estar en el archivo, donde son de solo lectura
+            caso, archivado = buscar_caso(cursor, self.CONSULTA_CASO, (codigo_caso,))
+
+            if not caso:
+                return "Caso no encontrado", 404
+
+            if request.method == 'POST' and archivado:
+                return "El caso está archivado y no admite cambios.", 409
+
+            if request.method == 'POST':
+                accion = request.form.get('accion')
+                comentario = request.form.get('comentario')
+                id_tecnico = session['user']['id_datos']
+                cambios = []
+
+                if accion == 'comentar' and comentario:
+                    flujo_casos.comentar(cursor, caso['id_caso'], id_tecnico, comentario)
+
+                elif accion in ['pendiente', 'proceso', 'resuelto']:
+                    # Se compara con la versión que vio el técnico al abrir el caso
+                    version = request.form.get('version', type=int)
+                    if version is None:
+                        return "Falta la versión del caso. Vuelva a abrirlo.", 400
+                    try:
+                        resultado = flujo_casos.cambiar_estado(cursor, {caso['id_caso']: version}, accion,
+                                                               id_tecnico, comentario)
+                    except ErrorTransicion as e:
+                        return str(e), 400
+                    if resultado['conflictos']:
+                        return "Otro técnico modificó este caso. Vuelva a abrirlo para ver los cambios.", 409
+                    if resultado['invalidos']:
+                        return resultado['invalidos'][0]['motivo'], 400
+                    cambios = resultado['cambios']
+
+                conn.commit()
+                publicar_casos(cambios) # Avisa a las colas abiertas y a las gráficas
+                return redirect(url_for(redirect_endpoint, codigo_caso=caso['codigo_caso']))
+
+            cursor.execute(self.CONSULTA_SOLICITANTE, (caso['id_usuario'],))
+            usuario = cursor.fetchone()
+
+            if not usuario:
+                return "Usuario no encontrado", 404
+
+            comentarios = cargador_comentarios.cargar_uno(cursor, caso['id_caso'], archivados=archivado)
+
+        response = make_response(render_template('tecnico/ver_caso.html',
+                                                 caso=caso,
+                                                 archivado=archivado,
+                                                 transiciones=() if archivado else flujo_casos.transiciones(caso['estado']),
+                                                 usuario=usuario,
+                                                 comentarios=comentarios))
+        return politica_cache.marcar(response, *validador) if validador else response
 
 # Exportar el blueprint
 tecnico_controller = TecnicoController()
@@ -1,8 +1,18 @@
 from flask import Blueprint, render_template, session, redirect, url_for, request, flash
-from db import get_connection
+from db import get_cursor
+from services.eventos import publicar_casos # Avisos en tiempo real a las colas del técnico
+from services.estadisticas import estadisticas
+from services.cargadores import cargador_comentarios # Carga de comentarios por lotes
+from services.paginacion import codificar_cursor, decodificar_cursor, condicion_keyset
+from services.codigos import asignador_codigos # Códigos de caso correlativos por año
+from services.dominio import PRIORIDADES, TIPOS_CASO
+from services.sla import motor_sla # Plazo de resolución de cada caso
+from services.asignacion import asignador_casos # Reparto de los casos nuevos entre los técnicos
 from datetime import datetime # Para registrar la fecha actual
 
 class UsuarioController:
+    CASOS_POR_PAGINA = 20
+
     def __init__(self):
         self.bp = Blueprint('usuario', __name__, url_prefix='/usuario')
         self.register_routes()
@@ -12,40 +22,53 @@ class UsuarioController:
         self.bp.route('/crear_caso', methods=['POST'])(self.crear_caso)
         self.bp.route('/logout')(self.logout)
 
+    def consulta_casos(self, user_id, antes=None):
+        """
+        (sql, parámetros) de una página de casos del usuario, uno más de CASOS_POR_PAGINA para
+        saber si hay otra página. `antes` es el (fecha, id) decodificado del cursor. Se unen
+        los casos vigentes y los archivados; cada parte usa su índice (id_usuario, fecha_creacion, id_caso).
+        """
+        filtro, parametros = condicion_keyset('fecha_creacion', 'id_caso', antes)
+        limite = self.CASOS_POR_PAGINA + 1
+        return f"""
+            (SELECT id_caso, codigo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, 0 AS archivado
+             FROM casos
+             WHERE id_usuario = %s{filtro}
+             ORDER BY fecha_creacion DESC, id_caso DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT id_caso, codigo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, 1 AS archivado
+             FROM casos_archivo
+             WHERE id_usuario = %s{filtro}
+             ORDER BY fecha_creacion DESC, id_caso DESC
+             LIMIT %s)
+            ORDER BY fecha_creacion DESC, id_caso DESC
+            LIMIT %s
+        """, (user_id, *parametros, limite, user_id, *parametros, limite, limite)
+
     def formulario(self):
         if 'user' not in session:
             return redirect(url_for('login')) # Redirige si no está logueado
 
         user_id = session['user']['id_user'] # Obtiene ID del usuario autenticado
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Consulta todos los casos del usuario
-        cursor.execute("""
-            SELECT id_caso, codigo_caso, estado, asunto, descripcion, prioridad, fecha_creacion
-            FROM casos
-            WHERE id_usuario = %s
-            ORDER BY fecha_creacion DESC
-        """, (user_id,))
-        casos = cursor.fetchall()
-
-        # Para cada caso, traer los comentarios
-        for caso in casos:
-            cursor.execute("""
-                SELECT c.texto, c.fecha_comentario, dp.nombre_completo AS tecnico
-                FROM comentarios c
-                JOIN datos_personales dp ON c.id_tecnico = dp.id_datos
-                WHERE c.id_caso = %s
-                ORDER BY c.fecha_comentario DESC
-            """, (caso['id_caso'],))
-            comentarios = cursor.fetchall()
-            caso['comentarios'] = comentarios  # Añadir la lista de comentarios a cada caso
-
-        cursor.close()
-        conn.close()
-
-        return render_template('usuario/formulario.html', casos=casos)
+        # Paginación por cursor: 'antes' apunta al último caso de la página anterior
+        antes = request.args.get('antes')
+
+        with get_cursor(dictionary=True) as (conn, cursor):
+            cursor.execute(*self.consulta_casos(user_id, decodificar_cursor(antes)))
+            casos = cursor.fetchall()
+
+            siguiente = None
+            if len(casos) > self.CASOS_POR_PAGINA:
+                casos = casos[:self.CASOS_POR_PAGINA]
+                siguiente = codificar_cursor(casos[-1]['fecha_creacion'], casos[-1]['id_caso'])
+
+            # Comentarios de todos los casos de la página: una consulta por tabla
+            cargador_comentarios.cargar_en(cursor, [c for c in casos if not c['archivado']])
+            cargador_comentarios.cargar_en(cursor, [c for c in casos if c['archivado']], archivados=True)
+
+        return render_template('usuario/formulario.html', casos=casos, antes=antes, siguiente=siguiente)
 
     def crear_caso(self):
         if 'user' not in session:
@@ -61,19 +84,43 @@ class UsuarioController:
         if not tipo_caso or not asunto or not descripcion or not prioridad:
             flash('Todos los campos son obligatorios', 'error')
             return redirect(url_for('usuario.formulario'))
+        if prioridad not in PRIORIDADES:
+            flash('Prioridad inválida', 'error')
+            return redirect(url_for('usuario.formulario'))
+        if tipo_caso not in TIPOS_CASO:
+            flash('Tipo de caso inválido', 'error')
+            return redirect(url_for('usuario.formulario'))
 
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Insertar nuevo caso con estado inicial 'pendiente' y fecha actual
-        cursor.execute("""
-            INSERT INTO casos (id_usuario, tipo_caso, estado, asunto, descripcion, prioridad, fecha_creacion)
-            VALUES (%s, %s, 'pendiente', %s, %s, %s, %s)
-        """, (user_id, tipo_caso, asunto, descripcion, prioridad, datetime.now()))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        fecha_creacion = datetime.now().replace(microsecond=0) # DATETIME guarda segundos enteros
+        # Código definitivo (HD-año-número), tomado del bloque reservado por este proceso
+        codigo_caso = asignador_codigos.siguiente(fecha_creacion)
+
+        with get_cursor(dictionary=True) as (conn, cursor):
+            # Técnico según la prioridad, su carga y el equipo del solicitante (None: queda sin asignar)
+            id_asignado = asignador_casos.elegir(cursor, user_id, prioridad)
+
+            try:
+                # Insertar nuevo caso con estado inicial 'pendiente' y fecha actual
+                cursor.execute("""
+                    INSERT INTO casos (codigo_caso, id_usuario, tipo_caso, estado, asunto, descripcion, prioridad, fecha_creacion,
+                                       estado_desde, vence_sla, id_asignado)
+                    VALUES (%s, %s, %s, 'pendiente', %s, %s, %s, %s, %s, %s, %s)
+                """, (codigo_caso, user_id, tipo_caso, asunto, descripcion, prioridad, fecha_creacion,
+                      fecha_creacion, motor_sla.vencimiento(prioridad, fecha_creacion), id_asignado))
+                id_caso = cursor.lastrowid
+
+                # Los contadores se actualizan en la misma transacción que el caso
+                estadisticas.registrar_creacion(cursor, 'pendiente', prioridad, tipo_caso, fecha_creacion)
+
+                conn.commit()
+            except Exception:
+                # El caso no se creó: la carga reservada al técnico no debe quedar contada
+                asignador_casos.liberar(id_asignado, prioridad)
+                raise
+        # Las colas del técnico abiertas reciben el caso nuevo (y las gráficas se invalidan)
+        publicar_casos([{'id_caso': id_caso, 'codigo_caso': codigo_caso, 'estado': 'pendiente',
+                         'prioridad': prioridad, 'asunto': asunto, 'fecha_creacion': fecha_creacion,
+                         'tipo_caso': tipo_caso, 'version': 0, 'id_asignado': id_asignado}])
 
         flash('Caso creado correctamente', 'success')
         return redirect(url_for('usuario.formulario')) # Redirige de nuevo al formulario
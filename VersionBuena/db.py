@@ -1,3 +1,10 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
 import mysql.connector
 
 db_config = {
@@ -7,5 +14,481 @@ db_config = {
     'database': 'helpdesk'
 }
 
-def get_connection():
-    return mysql.connector.connect(**db_config)
+# Configuración del pool de conexiones
+pool_config = {
+    'size': 5,           # Conexiones que se mantienen abiertas de forma permanente
+    'max_overflow': 10,  # Conexiones adicionales permitidas en picos de carga
+    'timeout': 30,       # Segundos máximos de espera por una conexión libre
+    'recycle': 3600,     # Segundos tras los cuales una conexión se cierra y se renueva
+    'pre_ping': True,    # Verificar la conexión antes de entregarla
+    'ping_after': 5,     # Solo se hace ping si la conexión estuvo inactiva más de estos segundos
+}
+
+# Réplicas de solo lectura. Cada entrada sobrescribe las claves de db_config que cambian
+# (normalmente host y port), p. ej. {'host': 'replica1', 'port': 3306}. Sin réplicas,
+# todas las consultas van al primario. Para probar en local basta una segunda instancia
+# de MySQL/MariaDB en otro puerto: {'host': '127.0.0.1', 'port': 3307}.
+replicas_config = []
+
+# Enrutamiento de las consultas de solo lectura
+enrutamiento_config = {
+    'retraso_maximo': 5,   # Segundos de retraso de replicación tolerados; con más se lee del primario
+    'revisar_cada': 10,    # Segundos entre comprobaciones de salud y retraso de cada réplica
+    'lectura_propia': 15,  # Segundos que un cliente lee del primario después de escribir
+}
+
+log = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Se lanza cuando no hay conexiones libres dentro del tiempo de espera configurado."""
+
+
+# Funciones observador(sql, segundos) que se llaman después de cada consulta (ver CursorMedido)
+observadores_consultas = []
+
+
+class CursorMedido:
+    """
+    Envoltorio de un cursor que mide cada execute()/executemany() y avisa a los
+    observadores registrados (por ejemplo, services/metricas.py). El resto de
+    atributos se delegan en el cursor original.
+    """
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _medir(self, metodo, sql, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, *args, **kwargs)
+        finally:
+            segundos = time.perf_counter() - inicio
+            for observador in observadores_consultas:
+                observador(sql, segundos)
+
+    def execute(self, sql, *args, **kwargs):
+        return self._medir(self._cursor.execute, sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._medir(self._cursor.executemany, sql, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PooledConnection:
+    """
+    Envoltorio de una conexión del pool.
+    Se comporta como una conexión de mysql.connector, pero al llamar a close()
+    la conexión se devuelve al pool en lugar de cerrarse.
+    """
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def close(self):
+        if self._raw is not None:
+            self._pool._release(self._raw, self._created_at)
+            self._raw = None
+
+    def descartar(self):
+        # Cierra la conexión en lugar de devolverla, p. ej. si quedó en un estado de sesión desconocido
+        if self._raw is not None:
+            self._pool._discard(self._raw)
+            self._raw = None
+
+    def cursor(self, *args, **kwargs):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError('La conexión ya fue devuelta al pool')
+        return CursorMedido(self._raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError('La conexión ya fue devuelta al pool')
+        self._raw.commit()
+        if self._pool.al_confirmar is not None:
+            self._pool.al_confirmar()
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError('La conexión ya fue devuelta al pool')
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones seguro para hilos.
+    Mantiene hasta `size` conexiones abiertas y permite `max_overflow` conexiones extra,
+    que se cierran al devolverse si el pool ya está lleno.
+    """
+    def __init__(self, factory, size=5, max_overflow=10, timeout=30, recycle=3600,
+                 pre_ping=True, ping_after=5, al_confirmar=None):
+        self._factory = factory
+        self.al_confirmar = al_confirmar  # Se llama tras cada commit() de una conexión del pool
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = []  # Pila de (conexión, creada_en, devuelta_en); LIFO para reutilizar las conexiones "calientes"
+        self._open = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+
+    def acquire(self):
+        deadline = None
+        waited_since = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at, released_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    raw = None
+                    break
+
+                # No hay conexiones libres: esperar a que otra petición devuelva una
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                    waited_since = now
+                    self._stats['waits'] += 1
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._record_wait(waited_since)
+                    raise PoolTimeoutError(
+                        f'No hay conexiones disponibles tras {self.timeout} segundos')
+                self._cond.wait(remaining)
+
+            self._record_wait(waited_since)
+            self._stats['checkouts'] += 1
+
+        # La conexión (o su creación) se gestiona fuera del candado para no bloquear a otros hilos
+        if raw is not None:
+            raw = self._check(raw, created_at, released_at)
+        if raw is None:
+            raw, created_at = self._connect()
+        return PooledConnection(self, raw, created_at)
+
+    def _record_wait(self, waited_since):
+        if waited_since is None:
+            return
+        waited = time.monotonic() - waited_since
+        self._stats['wait_time_total'] += waited
+        self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+    def _connect(self):
+        try:
+            return self._factory(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _check(self, raw, created_at, released_at):
+        # Devuelve la conexión si sigue siendo válida, o None si hay que crear otra
+        now = time.monotonic()
+        if self.recycle is not None and now - created_at > self.recycle:
+            with self._cond:
+                self._stats['recycled'] += 1
+            self._close_quietly(raw)
+            return None
+        if self.pre_ping and now - released_at > self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                with self._cond:
+                    self._stats['discarded'] += 1
+                self._close_quietly(raw)
+                return None
+        return raw
+
+    def _release(self, raw, created_at):
+        # Se descarta la transacción abierta para que el siguiente uso no herede
+        # bloqueos ni una instantánea de lectura antigua.
+        try:
+            raw.rollback()
+        except mysql.connector.Error:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            if len(self._idle) < self.size:
+                self._idle.append((raw, created_at, time.monotonic()))
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._close_quietly(raw)
+
+    def _discard(self, raw):
+        # Cierra una conexión prestada sin devolverla y libera su lugar en el pool
+        with self._cond:
+            self._stats['discarded'] += 1
+            self._open -= 1
+            self._cond.notify()
+        self._close_quietly(raw)
+
+    def _close_quietly(self, raw):
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def dispose(self):
+        # Cierra todas las conexiones inactivas del pool
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return dict(self._stats,
+                        size=self.size,
+                        max_overflow=self.max_overflow,
+                        open=self._open,
+                        idle=idle,
+                        in_use=self._open - idle)
+
+
+# Hasta cuándo (time.time()) las lecturas de esta petición deben ir al primario.
+# La aplicación lo fija al empezar cada petición a partir de la sesión.
+_primario_hasta = contextvars.ContextVar('primario_hasta', default=0.0)
+
+
+def marcar_escritura():
+    # Tras confirmar una escritura, las lecturas del mismo cliente van al primario un tiempo
+    if _enrutador is None or not _enrutador.replicas:
+        return
+    hasta = time.time() + enrutamiento_config['lectura_propia']
+    _primario_hasta.set(max(hasta, _primario_hasta.get()))
+
+
+def fijar_lectura_propia(hasta):
+    # Al empezar una petición: lecturas al primario hasta ese instante (0 para ninguna)
+    _primario_hasta.set(hasta or 0.0)
+
+
+def lectura_propia_hasta():
+    return _primario_hasta.get()
+
+
+class Replica:
+    """Pool de una réplica con el resultado de su última comprobación."""
+    def __init__(self, nombre, pool):
+        self.nombre = nombre
+        self.pool = pool
+        self.sana = True
+        self.retraso = None
+        self.error = None
+        self.revisada_en = None  # time.monotonic() de la última comprobación
+        self.revisando = False
+
+
+def medir_retraso(conn):
+    """
+    Segundos de retraso de replicación del servidor, o None si la replicación está detenida.
+    Un servidor que no es réplica (sin filas en SHOW REPLICA STATUS) se considera al día.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22 y MariaDB < 10.5
+        fila = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not fila:
+        return 0
+    retraso = fila.get('Seconds_Behind_Source', fila.get('Seconds_Behind_Master'))
+    return None if retraso is None else int(retraso)
+
+
+class Enrutador:
+    """
+    Reparte las conexiones entre el primario y las réplicas.
+    - Las escrituras y las lecturas normales van al primario.
+    - Las lecturas marcadas como solo_lectura van a una réplica sana (por turnos), salvo que
+      el cliente haya escrito hace poco (lectura propia) o ninguna réplica esté al día.
+    - Cada réplica se comprueba como mucho una vez cada `revisar_cada` segundos, dentro de la
+      petición que lo detecta; las demás usan el último resultado mientras tanto.
+    - Si una réplica falla al conectar se marca como caída hasta la siguiente comprobación.
+    `medir` recibe una conexión y devuelve el retraso en segundos (None: no sirve), así que
+    en pruebas se pueden usar pools con cualquier fábrica de conexiones.
+    """
+    def __init__(self, primario, replicas=(), retraso_maximo=5, revisar_cada=10, medir=medir_retraso):
+        self.primario = primario
+        self.replicas = list(replicas)
+        self.retraso_maximo = retraso_maximo
+        self.revisar_cada = revisar_cada
+        self.medir = medir
+        self._turno = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {'lecturas_replica': 0, 'lecturas_primario': 0, 'lectura_propia': 0, 'sin_replica': 0}
+
+    def _revisar(self, replica):
+        try:
+            conn = replica.pool.acquire()
+            try:
+                retraso = self.medir(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            retraso, error = None, str(e)
+        else:
+            error = None if retraso is not None else 'replicación detenida'
+        sana = retraso is not None and retraso <= self.retraso_maximo
+        if sana != replica.sana:
+            log.warning('Réplica %s %s (retraso: %s, error: %s)', replica.nombre,
+                        'disponible' if sana else 'fuera de servicio', retraso, error)
+        with self._lock:
+            replica.sana, replica.retraso, replica.error = sana, retraso, error
+            replica.revisada_en = time.monotonic()
+            replica.revisando = False
+
+    def _candidatas(self):
+        # Réplicas sanas, empezando por la que toca; revisa las que llevan tiempo sin comprobarse
+        ahora = time.monotonic()
+        for replica in self.replicas:
+            with self._lock:
+                vencida = replica.revisada_en is None or ahora - replica.revisada_en > self.revisar_cada
+                revisar = vencida and not replica.revisando
+                if revisar:
+                    replica.revisando = True
+            if revisar:
+                self._revisar(replica)
+        sanas = [r for r in self.replicas if r.sana]
+        if not sanas:
+            return []
+        inicio = next(self._turno) % len(sanas)
+        return sanas[inicio:] + sanas[:inicio]
+
+    def _contar(self, clave):
+        with self._lock:
+            self._stats[clave] += 1
+
+    def conexion(self, solo_lectura=False):
+        if not solo_lectura or not self.replicas:
+            return self.primario.acquire()
+        if time.time() < _primario_hasta.get():
+            self._contar('lectura_propia')
+            return self.primario.acquire()
+
+        for replica in self._candidatas():
+            try:
+                conn = replica.pool.acquire()
+            except mysql.connector.Error as e:
+                with self._lock:
+                    replica.sana, replica.error = False, str(e)
+                log.warning('Réplica %s fuera de servicio: %s', replica.nombre, e)
+                continue
+            except PoolTimeoutError:
+                continue
+            self._contar('lecturas_replica')
+            return conn
+        self._contar('sin_replica')
+        return self.primario.acquire()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats,
+                        replicas=[{'nombre': r.nombre, 'sana': r.sana, 'retraso': r.retraso,
+                                   'error': r.error, 'pool': r.pool.stats()} for r in self.replicas])
+
+
+_pool = None
+_enrutador = None
+_pool_lock = threading.Lock()
+
+
+def _create_connection(config=None):
+    # consume_results evita errores de "Unread result found" cuando una consulta
+    # no se lee completa antes de devolver la conexión al pool.
+    return mysql.connector.connect(consume_results=True, **(config or db_config))
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_create_connection, al_confirmar=marcar_escritura, **pool_config)
+    return _pool
+
+
+def get_enrutador():
+    global _enrutador
+    if _enrutador is None:
+        primario = get_pool()
+        with _pool_lock:
+            if _enrutador is None:
+                replicas = []
+                for i, cambios in enumerate(replicas_config, start=1):
+                    config = dict(db_config, **cambios)
+                    fabrica = lambda config=config: _create_connection(config)
+                    nombre = f"{config['host']}:{config.get('port', 3306)}"
+                    replicas.append(Replica(nombre, ConnectionPool(fabrica, **pool_config)))
+                _enrutador = Enrutador(primario, replicas,
+                                       retraso_maximo=enrutamiento_config['retraso_maximo'],
+                                       revisar_cada=enrutamiento_config['revisar_cada'])
+    return _enrutador
+
+
+def get_connection(solo_lectura=False):
+    # Entrega una conexión del pool; al llamar a close() vuelve al pool.
+    return get_enrutador().conexion(solo_lectura)
+
+
+@contextmanager
+def get_cursor(dictionary=False, solo_lectura=False):
+    """
+    Context manager para una petición: entrega (conexión, cursor) y garantiza que
+    ambos se liberen, incluso si la ruta termina antes de tiempo o lanza una excepción.
+    Las escrituras deben confirmarse con conn.commit(); lo no confirmado se descarta.
+    Con solo_lectura=True la consulta puede ir a una réplica (ver Enrutador): solo para
+    lecturas que toleran unos segundos de retraso.
+    """
+    conn = get_connection(solo_lectura)
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        yield conn, cursor
+    finally:
+        try:
+            cursor.close()
+        finally:
+            conn.close()
+
+
+def pool_stats():
+    # Estadísticas del pool para dimensionarlo (conexiones en uso, esperas, tiempo de espera)
+    return get_pool().stats()
+
+
+def enrutamiento_stats():
+    # Lecturas enviadas a réplicas o al primario y estado de cada réplica
+    return get_enrutador().stats()
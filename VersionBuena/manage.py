@@ -0,0 +1,340 @@
+"""
+Comandos de mantenimiento del sistema, para ejecutar desde la terminal junto a app.py.
+
+Uso:
+    python manage.py estadisticas verificar
+    python manage.py estadisticas reconstruir
+    python manage.py migrar estado
+    python manage.py migrar subir [--hasta VERSION]
+    python manage.py migrar bajar [--pasos N]
+    python manage.py migrar explicar
+    python manage.py exportar [--formato csv|ndjson|parquet] [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+                              [--estado E ...] [--prioridad P ...] [--salida ARCHIVO]
+    python manage.py importar ARCHIVO.csv|ARCHIVO.json [--parcial] [--simular] [--procesos N]
+    python manage.py archivar [--dias N] [--lote N] [--pausa SEGUNDOS] [--maximo N] [--simular]
+    python manage.py codigos rellenar [--lote N]
+    python manage.py tareas trabajar [--hilos N] [--procesos N]
+    python manage.py tareas estado|reintentar|limpiar
+    python manage.py sla envejecer
+    python manage.py asignacion carga
+    python manage.py asignacion repartir [--lote N]
+    python manage.py bench generar [--usuarios N] [--tecnicos N] [--casos N] [--comentarios N] [--dias N] [--semilla N]
+    python manage.py bench correr [--escenario mixta|login|cola|mis_casos|dashboard|crear_caso|transicion] [--duracion S]
+                                  [--hilos N] [--url URL] [--guardar NOMBRE] [--comparar NOMBRE] [--tolerancia T]
+"""
+import argparse
+import sys
+import time
+
+
+def cmd_estadisticas(args):
+    from services.estadisticas import estadisticas
+
+    if args.accion == 'reconstruir':
+        estadisticas.reconstruir()
+        print('Contadores reconstruidos.')
+        return 0
+
+    diferencias = estadisticas.verificar()
+    for tabla, clave, guardado, real in diferencias:
+        print(f'{tabla} {clave}: guardado={guardado} real={real}')
+    if diferencias:
+        print(f'{len(diferencias)} diferencias. Ejecute "python manage.py estadisticas reconstruir".')
+        return 1
+    print('Los contadores coinciden con las tablas de origen.')
+    return 0
+
+
+def cmd_migrar(args):
+    from services.migraciones import migrador, verificar_planes
+
+    if args.accion == 'estado':
+        for version, nombre, aplicada_en in migrador.estado():
+            print(f'{version:04d} {nombre:40} {aplicada_en or "pendiente"}')
+        return 0
+
+    if args.accion == 'subir':
+        aplicadas = migrador.subir(hasta=args.hasta)
+        for m in aplicadas:
+            print(f'Aplicada {m.version:04d} {m.nombre}')
+        if not aplicadas:
+            print('No hay migraciones pendientes.')
+        return 0
+
+    if args.accion == 'bajar':
+        for m in migrador.bajar(pasos=args.pasos):
+            print(f'Revertida {m.version:04d} {m.nombre}')
+        return 0
+
+    # explicar: falla si alguna consulta de los controladores recorre una tabla completa
+    fallos = 0
+    for nombre, tabla, permitido in verificar_planes():
+        if permitido:
+            print(f'AVISO  {nombre}: recorrido completo de {tabla} ({permitido})')
+        else:
+            print(f'ERROR  {nombre}: recorrido completo de {tabla}')
+            fallos += 1
+    print('Planes correctos.' if not fallos else f'{fallos} consultas sin índice adecuado.')
+    return 1 if fallos else 0
+
+
+def cmd_exportar(args):
+    from services.exportacion import exportador, leer_fecha, ErrorExportacion
+
+    try:
+        partes = exportador.transmitir(args.formato,
+                                       desde=leer_fecha(args.desde),
+                                       hasta=leer_fecha(args.hasta),
+                                       estados=args.estado,
+                                       prioridades=args.prioridad)
+    except ErrorExportacion as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    salida = open(args.salida, 'wb') if args.salida else sys.stdout.buffer
+    try:
+        for parte in partes:
+            salida.write(parte)
+    finally:
+        if args.salida:
+            salida.close()
+    return 0
+
+
+def cmd_importar(args):
+    from services.importacion import importador, leer_registros, ErrorImportacion
+
+    formato = 'json' if args.archivo.lower().endswith('.json') else 'csv'
+    try:
+        with open(args.archivo, 'rb') as archivo:
+            registros = leer_registros(archivo.read(), formato)
+    except ErrorImportacion as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.procesos:
+        importador.procesos = args.procesos
+    resultado = importador.importar(registros, parcial=args.parcial, simular=args.simular)
+
+    for error in resultado['errores']:
+        print(f"Fila {error['fila']} ({error['id_identity'] or 'sin id'}): {'; '.join(error['errores'])}")
+    if resultado['errores'] and not args.parcial:
+        print(f"{len(resultado['errores'])} filas con errores; no se importó nada. Use --parcial para importar las válidas.")
+        return 1
+    verbo = 'Se crearían' if args.simular else 'Creados'
+    print(f"{verbo} {resultado['creados']} usuarios; {len(resultado['omitidos'])} ya existían.")
+    return 1 if resultado['errores'] else 0
+
+
+def cmd_archivar(args):
+    from db import get_cursor
+    from services.archivo import archivador
+
+    limite = archivador.limite(args.dias)
+    if args.simular:
+        with get_cursor() as (conn, cursor):
+            print(f'Se archivarían {archivador.pendientes(cursor, limite)} casos resueltos creados antes de {limite}.')
+        return 0
+
+    archivador.tamano_lote = args.lote
+    archivador.pausa = args.pausa
+    archivados = archivador.archivar(dias=args.dias, maximo=args.maximo,
+                                     progreso=lambda n: print(f'{n} casos archivados...', end='\r', flush=True))
+    print(f'Archivados {archivados} casos resueltos creados antes de {limite}.')
+    return 0
+
+
+def cmd_codigos(args):
+    from services.codigos import asignador_codigos
+
+    actualizados = asignador_codigos.rellenar(tamano_lote=args.lote,
+                                              progreso=lambda n: print(f'{n} casos actualizados...', end='\r', flush=True))
+    print(f'Se asignó código definitivo a {actualizados} casos.')
+    return 0
+
+
+def cmd_tareas(args):
+    from services.tareas import cola_tareas, TrabajadorTareas
+
+    if args.accion == 'estado':
+        for estado, cantidad in cola_tareas.contar().items():
+            print(f'{estado:12} {cantidad}')
+        for id_tarea, nombre, intentos, error, _ in cola_tareas.fallidas():
+            print(f'Fallida {id_tarea} {nombre} ({intentos} intentos): {error}')
+        return 0
+
+    if args.accion == 'reintentar':
+        print(f'{cola_tareas.reintentar_fallidas()} tareas fallidas vuelven a la cola.')
+        return 0
+
+    if args.accion == 'limpiar':
+        print(f'Borradas {cola_tareas.limpiar()} tareas terminadas.')
+        return 0
+
+    # trabajar: hasta Ctrl+C; las tareas en curso terminan antes de salir
+    trabajador = TrabajadorTareas(cola_tareas, hilos=args.hilos, procesos=args.procesos)
+    trabajador.iniciar()
+    print(f'Trabajando con {args.hilos} hilos y {args.procesos} procesos. Ctrl+C para terminar.')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print('Terminando las tareas en curso...')
+        trabajador.detener.set()
+        trabajador.esperar()
+    return 0
+
+
+def cmd_sla(args):
+    from services.sla import motor_sla
+
+    # envejecer: lo mismo que la tarea periódica sla_envejecer, para ejecutarlo a mano o desde cron
+    print(f'Antigüedad recalculada: {motor_sla.envejecer()} grupos de casos abiertos.')
+    return 0
+
+
+def cmd_asignacion(args):
+    from db import get_cursor
+    from services.asignacion import asignador_casos
+
+    if args.accion == 'repartir':
+        asignados = asignador_casos.repartir(tamano_lote=args.lote,
+                                             progreso=lambda n: print(f'{n} casos asignados...', end='\r', flush=True))
+        print(f'Se asignaron {asignados} casos abiertos sin técnico.')
+        return 0
+
+    # carga: casos abiertos de cada técnico, ponderados por prioridad (services/asignacion.PESOS)
+    with get_cursor(dictionary=True) as (conn, cursor):
+        cargas = asignador_casos.refrescar(cursor)
+    for id_tecnico, carga in sorted(cargas.items(), key=lambda item: -item[1]):
+        print(f'{id_tecnico:>8}  {carga}')
+    print(f'{len(cargas)} técnicos.')
+    return 0
+
+
+def cmd_bench(args):
+    if args.accion == 'generar':
+        from bench.generador import GeneradorDatos
+
+        generador = GeneradorDatos(usuarios=args.usuarios, tecnicos=args.tecnicos, casos=args.casos,
+                                   comentarios=args.comentarios, dias=args.dias, semilla=args.semilla)
+        generador.generar(progreso=lambda tabla, n: print(f'{n} {tabla} generados...', end='\r', flush=True))
+        print(f'Generados {args.usuarios} usuarios ({args.tecnicos} técnicos) y {args.casos} casos.')
+        return 0
+
+    from bench import cargas, informe
+
+    if args.url:
+        crear_cliente = lambda: cargas.ClienteHttp(args.url)
+    else:
+        from app import MyApp
+        aplicacion = MyApp().app
+        crear_cliente = lambda: cargas.ClienteFlask(aplicacion)
+    contexto = {'usuarios': args.usuarios, 'tecnicos': args.tecnicos, 'codigos': cargas.codigos_abiertos()}
+    if not contexto['codigos'] and args.escenario in ('mixta', 'transicion'):
+        print('No hay casos pendientes ni en proceso. Ejecute primero "python manage.py bench generar".', file=sys.stderr)
+        return 2
+
+    muestras, segundos = cargas.correr(args.escenario, crear_cliente, contexto,
+                                       duracion=args.duracion, hilos=args.hilos, semilla=args.semilla)
+    filas = informe.resumen(muestras, segundos)
+    informe.imprimir(filas)
+
+    if args.guardar:
+        informe.guardar_base(args.guardar, filas)
+        print(f'Línea base "{args.guardar}" guardada.')
+    if args.comparar:
+        regresiones = informe.comparar(filas, informe.cargar_base(args.comparar), tolerancia=args.tolerancia)
+        for regresion in regresiones:
+            print(f'REGRESIÓN  {regresion}')
+        print(f'{len(regresiones)} regresiones frente a "{args.comparar}".' if regresiones else
+              f'Sin regresiones frente a "{args.comparar}".')
+        return 1 if regresiones else 0
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Mantenimiento de HelpDesk')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('estadisticas', help='Verificar o reconstruir los contadores de los dashboards')
+    p.add_argument('accion', choices=['verificar', 'reconstruir'])
+    p.set_defaults(func=cmd_estadisticas)
+
+    p = sub.add_parser('migrar', help='Migraciones del esquema y revisión de planes de ejecución')
+    p.add_argument('accion', choices=['estado', 'subir', 'bajar', 'explicar'])
+    p.add_argument('--hasta', type=int, help='Última versión a aplicar (subir)')
+    p.add_argument('--pasos', type=int, default=1, help='Cantidad de migraciones a revertir (bajar)')
+    p.set_defaults(func=cmd_migrar)
+
+    p = sub.add_parser('exportar', help='Exportar casos con solicitante y comentarios')
+    p.add_argument('--formato', choices=['csv', 'ndjson', 'parquet'], default='csv')
+    p.add_argument('--desde', help='Fecha de creación mínima (AAAA-MM-DD)')
+    p.add_argument('--hasta', help='Fecha de creación máxima, inclusive (AAAA-MM-DD)')
+    p.add_argument('--estado', action='append', help='Estado a incluir (se puede repetir)')
+    p.add_argument('--prioridad', action='append', help='Prioridad a incluir (se puede repetir)')
+    p.add_argument('--salida', help='Archivo de destino (por defecto, la salida estándar)')
+    p.set_defaults(func=cmd_exportar)
+
+    p = sub.add_parser('importar', help='Alta masiva de usuarios desde CSV o JSON')
+    p.add_argument('archivo', help='Archivo .csv (con encabezado) o .json (lista de objetos)')
+    p.add_argument('--parcial', action='store_true', help='Importar las filas válidas aunque otras tengan errores')
+    p.add_argument('--simular', action='store_true', help='Solo validar, sin escribir')
+    p.add_argument('--procesos', type=int, help='Procesos para encriptar contraseñas (por defecto, uno por CPU)')
+    p.set_defaults(func=cmd_importar)
+
+    p = sub.add_parser('archivar', help='Trasladar los casos resueltos antiguos a las tablas de archivo')
+    p.add_argument('--dias', type=int, help='Antigüedad mínima en días (por defecto 365)')
+    p.add_argument('--lote', type=int, default=200, help='Casos por transacción')
+    p.add_argument('--pausa', type=float, default=0.5, help='Segundos de espera entre lotes')
+    p.add_argument('--maximo', type=int, help='Máximo de casos a archivar en esta ejecución')
+    p.add_argument('--simular', action='store_true', help='Solo contar los casos que se archivarían')
+    p.set_defaults(func=cmd_archivar)
+
+    p = sub.add_parser('codigos', help='Asignar código definitivo a los casos con código provisional (SIN-...)')
+    p.add_argument('accion', choices=['rellenar'])
+    p.add_argument('--lote', type=int, default=500, help='Casos por transacción')
+    p.set_defaults(func=cmd_codigos)
+
+    p = sub.add_parser('tareas', help='Trabajadores y estado de la cola de tareas en segundo plano')
+    p.add_argument('accion', choices=['trabajar', 'estado', 'reintentar', 'limpiar'])
+    p.add_argument('--hilos', type=int, default=4, help='Hilos trabajadores (trabajar)')
+    p.add_argument('--procesos', type=int, default=0, help='Procesos para las tareas de CPU (trabajar)')
+    p.set_defaults(func=cmd_tareas)
+
+    p = sub.add_parser('sla', help='Plazos de resolución: recalcular la antigüedad de los casos abiertos')
+    p.add_argument('accion', choices=['envejecer'])
+    p.set_defaults(func=cmd_sla)
+
+    p = sub.add_parser('asignacion', help='Carga de los técnicos y reparto de los casos abiertos sin asignar')
+    p.add_argument('accion', choices=['carga', 'repartir'])
+    p.add_argument('--lote', type=int, default=500, help='Casos por transacción (repartir)')
+    p.set_defaults(func=cmd_asignacion)
+
+    p = sub.add_parser('bench', help='Datos sintéticos y pruebas de carga (solo en una base de datos de pruebas)')
+    p.add_argument('accion', choices=['generar', 'correr'])
+    p.add_argument('--usuarios', type=int, default=10000, help='Usuarios generados, técnicos incluidos')
+    p.add_argument('--tecnicos', type=int, default=50, help='Cuántos de esos usuarios son técnicos')
+    p.add_argument('--casos', type=int, default=1000000, help='Casos a generar (generar)')
+    p.add_argument('--comentarios', type=int, default=5000000, help='Comentarios a generar, aproximado (generar)')
+    p.add_argument('--dias', type=int, default=730, help='Antigüedad máxima de los casos en días (generar)')
+    p.add_argument('--semilla', type=int, default=1, help='Semilla de los datos y de las cargas')
+    p.add_argument('--escenario', default='mixta', choices=['mixta', 'login', 'cola', 'mis_casos', 'dashboard', 'crear_caso', 'transicion'])
+    p.add_argument('--duracion', type=float, default=30, help='Segundos de medición (correr)')
+    p.add_argument('--hilos', type=int, default=8, help='Usuarios simulados simultáneos (correr)')
+    p.add_argument('--url', help='Servidor local a medir, p. ej. http://127.0.0.1:5000 (por defecto, en el mismo proceso)')
+    p.add_argument('--guardar', metavar='NOMBRE', help='Guardar el resultado como línea base en bench/lineas_base')
+    p.add_argument('--comparar', metavar='NOMBRE', help='Comparar con una línea base; termina con 1 si hay regresiones')
+    p.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento admitido frente a la línea base (0.2 = 20%%)')
+    p.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
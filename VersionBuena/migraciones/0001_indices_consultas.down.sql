@@ -0,0 +1,10 @@
+-- Los índices de las claves foráneas se vuelven a crear antes de quitar los compuestos
+ALTER TABLE casos ADD INDEX id_usuario (id_usuario);
+ALTER TABLE comentarios ADD INDEX id_caso (id_caso);
+
+ALTER TABLE casos DROP INDEX idx_casos_estado_prioridad_fecha;
+ALTER TABLE casos DROP INDEX idx_casos_usuario_fecha;
+ALTER TABLE users DROP INDEX uq_users_identity;
+ALTER TABLE comentarios DROP INDEX idx_comentarios_caso_fecha;
+ALTER TABLE datos_personales DROP INDEX idx_datos_nombre;
+ALTER TABLE datos_personales DROP INDEX idx_datos_cedula;
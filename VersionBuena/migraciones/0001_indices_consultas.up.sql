@@ -0,0 +1,19 @@
+-- =====================================
+-- ÍNDICES PARA LAS CONSULTAS DE LOS CONTROLADORES
+-- =====================================
+
+-- Colas del técnico: WHERE estado = ? AND prioridad = ? ORDER BY fecha_creacion DESC, id_caso DESC
+ALTER TABLE casos ADD INDEX idx_casos_estado_prioridad_fecha (estado, prioridad, fecha_creacion, id_caso);
+
+-- Casos de un usuario (formulario y búsqueda del administrador); sustituye al índice de la clave foránea
+ALTER TABLE casos ADD INDEX idx_casos_usuario_fecha (id_usuario, fecha_creacion, id_caso);
+
+-- Inicio de sesión y eliminación de usuarios por identificación
+ALTER TABLE users ADD UNIQUE INDEX uq_users_identity (id_identity);
+
+-- Comentarios de un caso ordenados por fecha; sustituye al índice de la clave foránea
+ALTER TABLE comentarios ADD INDEX idx_comentarios_caso_fecha (id_caso, fecha_comentario);
+
+-- Búsqueda de personas por nombre (prefijo) y por cédula
+ALTER TABLE datos_personales ADD INDEX idx_datos_nombre (nombre_completo);
+ALTER TABLE datos_personales ADD INDEX idx_datos_cedula (cedula);
@@ -0,0 +1,2 @@
+-- Los códigos provisionales no se revierten
+ALTER TABLE casos DROP INDEX uq_casos_codigo;
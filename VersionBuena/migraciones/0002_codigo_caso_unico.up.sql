@@ -0,0 +1,19 @@
+-- =====================================
+-- CÓDIGO DE CASO ÚNICO
+-- Los casos sin código o con un código repetido reciben un código provisional
+-- "SIN-<id_caso>" para poder crear el índice único.
+-- =====================================
+
+UPDATE casos SET codigo_caso = CONCAT('SIN-', id_caso) WHERE codigo_caso = '';
+
+UPDATE casos c
+JOIN (
+    SELECT codigo_caso, MIN(id_caso) AS primero
+    FROM casos
+    GROUP BY codigo_caso
+    HAVING COUNT(*) > 1
+) repetidos ON c.codigo_caso = repetidos.codigo_caso
+SET c.codigo_caso = CONCAT('SIN-', c.id_caso)
+WHERE c.id_caso > repetidos.primero;
+
+ALTER TABLE casos ADD UNIQUE INDEX uq_casos_codigo (codigo_caso);
@@ -0,0 +1,4 @@
+ALTER TABLE datos_personales DROP INDEX ft_datos_nombre;
+ALTER TABLE equipos DROP INDEX ft_equipos;
+ALTER TABLE equipos DROP INDEX idx_equipos_serial;
+ALTER TABLE casos DROP INDEX ft_casos;
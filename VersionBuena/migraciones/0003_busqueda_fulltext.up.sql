@@ -0,0 +1,12 @@
+-- =====================================
+-- ÍNDICES DE BÚSQUEDA
+-- Los nombres, equipos y textos de los casos se buscan con FULLTEXT (modo booleano
+-- con prefijo); los identificadores (cédula, código de caso, serial) con LIKE 'texto%'.
+-- =====================================
+
+ALTER TABLE datos_personales ADD FULLTEXT INDEX ft_datos_nombre (nombre_completo);
+
+ALTER TABLE equipos ADD FULLTEXT INDEX ft_equipos (nombre_equipo, marca, modelo, serial);
+ALTER TABLE equipos ADD INDEX idx_equipos_serial (serial);
+
+ALTER TABLE casos ADD FULLTEXT INDEX ft_casos (asunto, descripcion);
@@ -0,0 +1 @@
+ALTER TABLE users DROP INDEX idx_users_tipo_identity;
@@ -0,0 +1,2 @@
+-- Directorio de usuarios filtrado por rol y ordenado por identificación
+ALTER TABLE users ADD INDEX idx_users_tipo_identity (tipo_usuario, id_identity, id_user);
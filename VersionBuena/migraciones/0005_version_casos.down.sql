@@ -0,0 +1 @@
+ALTER TABLE casos DROP COLUMN version;
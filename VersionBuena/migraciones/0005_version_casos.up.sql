@@ -0,0 +1,7 @@
+-- =====================================
+-- CONTROL DE CONCURRENCIA DE LOS CASOS
+-- Cada cambio de estado o prioridad incrementa `version`; una actualización que
+-- llega con una versión antigua se rechaza en lugar de pisar el cambio de otro técnico.
+-- =====================================
+
+ALTER TABLE casos ADD COLUMN version INT NOT NULL DEFAULT 0;
@@ -0,0 +1,11 @@
+-- Devuelve los casos archivados a las tablas principales antes de borrar el archivo
+INSERT INTO casos (id_caso, codigo_caso, id_usuario, tipo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, version)
+SELECT id_caso, codigo_caso, id_usuario, tipo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, version
+FROM casos_archivo;
+
+INSERT INTO comentarios (id_comentario, id_caso, id_tecnico, texto, fecha_comentario)
+SELECT id_comentario, id_caso, id_tecnico, texto, fecha_comentario
+FROM comentarios_archivo;
+
+DROP TABLE comentarios_archivo;
+DROP TABLE casos_archivo;
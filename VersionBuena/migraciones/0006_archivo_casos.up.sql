@@ -0,0 +1,35 @@
+-- =====================================
+-- ARCHIVO DE CASOS RESUELTOS
+-- Los casos resueltos antiguos y sus comentarios se trasladan a estas tablas
+-- (python manage.py archivar) para que casos y comentarios solo contengan el trabajo
+-- vigente. Conservan el mismo id_caso, id_comentario y codigo_caso, así que el detalle
+-- del caso y las exportaciones los encuentran igual. Los casos archivados son de solo lectura.
+-- Los contadores precalculados siguen incluyéndolos.
+-- =====================================
+
+CREATE TABLE casos_archivo (
+    id_caso INT PRIMARY KEY,
+    codigo_caso VARCHAR(20) NOT NULL,
+    id_usuario INT NOT NULL,
+    tipo_caso ENUM('incidencia', 'solicitud') NOT NULL,
+    estado ENUM('pendiente', 'proceso', 'resuelto') NOT NULL,
+    asunto VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    prioridad ENUM('baja', 'media', 'alta') NOT NULL,
+    fecha_creacion DATETIME NOT NULL,
+    version INT NOT NULL DEFAULT 0,
+    archivado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX uq_casos_archivo_codigo (codigo_caso),
+    INDEX idx_casos_archivo_usuario_fecha (id_usuario, fecha_creacion, id_caso),
+    FOREIGN KEY (id_usuario) REFERENCES users(id_user)
+);
+
+CREATE TABLE comentarios_archivo (
+    id_comentario INT PRIMARY KEY,
+    id_caso INT NOT NULL,
+    id_tecnico INT NOT NULL,
+    texto TEXT,
+    fecha_comentario DATETIME NOT NULL,
+    INDEX idx_comentarios_archivo_caso_fecha (id_caso, fecha_comentario),
+    FOREIGN KEY (id_caso) REFERENCES casos_archivo(id_caso)
+);
@@ -0,0 +1 @@
+DROP TABLE secuencias_codigo;
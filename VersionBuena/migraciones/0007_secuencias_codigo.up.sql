@@ -0,0 +1,14 @@
+-- =====================================
+-- CÓDIGOS DE CASO CORRELATIVOS
+-- Una fila por año con el siguiente número libre. Cada proceso de la aplicación reserva
+-- bloques de números (services/codigos.py), así que esta fila se actualiza una vez por
+-- bloque y no una vez por caso. El índice único uq_casos_codigo (0002) sigue garantizando
+-- que no haya códigos repetidos.
+-- Los casos con código provisional (SIN-...) reciben uno definitivo con:
+--     python manage.py codigos rellenar
+-- =====================================
+
+CREATE TABLE secuencias_codigo (
+    anio SMALLINT PRIMARY KEY,
+    siguiente INT NOT NULL
+);
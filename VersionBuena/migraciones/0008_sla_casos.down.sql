@@ -0,0 +1,7 @@
+DROP TABLE antiguedad_casos;
+DROP TABLE sla_tecnicos;
+DROP TABLE transiciones_caso;
+ALTER TABLE casos
+    DROP INDEX idx_casos_prioridad_vence_sla,
+    DROP COLUMN vence_sla,
+    DROP COLUMN estado_desde;
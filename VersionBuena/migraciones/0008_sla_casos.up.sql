@@ -0,0 +1,54 @@
+-- =====================================
+-- ACUERDOS DE NIVEL DE SERVICIO (SLA)
+-- Cada caso abierto guarda cuándo vence su plazo (vence_sla) y desde cuándo está en su
+-- estado actual (estado_desde). El índice (prioridad, vence_sla) da las colas de casos
+-- vencidos y por vencer en orden de vencimiento sin recorrer la tabla; los casos
+-- resueltos tienen vence_sla NULL y quedan fuera de esos rangos.
+-- Los plazos de services/sla.py (sla_config) por defecto: alta 4 h, media 24 h, baja 72 h.
+-- =====================================
+
+ALTER TABLE casos
+    ADD COLUMN estado_desde DATETIME NULL,
+    ADD COLUMN vence_sla DATETIME NULL,
+    ADD INDEX idx_casos_prioridad_vence_sla (prioridad, vence_sla);
+
+UPDATE casos
+SET estado_desde = fecha_creacion,
+    vence_sla = CASE
+        WHEN estado = 'resuelto' THEN NULL
+        WHEN prioridad = 'alta' THEN DATE_ADD(fecha_creacion, INTERVAL 4 HOUR)
+        WHEN prioridad = 'media' THEN DATE_ADD(fecha_creacion, INTERVAL 24 HOUR)
+        ELSE DATE_ADD(fecha_creacion, INTERVAL 72 HOUR)
+    END;
+
+-- Historial de cambios de estado, con el tiempo que el caso pasó en el estado anterior.
+-- Sin clave foránea: los casos archivados conservan su historial.
+CREATE TABLE transiciones_caso (
+    id_transicion INT AUTO_INCREMENT PRIMARY KEY,
+    id_caso INT NOT NULL,
+    estado_anterior ENUM('pendiente', 'proceso', 'resuelto') NOT NULL,
+    estado_nuevo ENUM('pendiente', 'proceso', 'resuelto') NOT NULL,
+    id_tecnico INT NULL,
+    fecha DATETIME NOT NULL,
+    segundos_en_estado INT NOT NULL,
+    INDEX idx_transiciones_caso_fecha (id_caso, fecha)
+);
+
+-- Resoluciones por técnico (id_datos), acumuladas en cada cambio a 'resuelto'
+CREATE TABLE sla_tecnicos (
+    id_tecnico INT PRIMARY KEY,
+    resueltos INT NOT NULL DEFAULT 0,
+    segundos_resolucion BIGINT NOT NULL DEFAULT 0,
+    incumplidos INT NOT NULL DEFAULT 0
+);
+
+-- Antigüedad de los casos abiertos por tramos, recalculada periódicamente (tarea sla_envejecer)
+CREATE TABLE antiguedad_casos (
+    estado ENUM('pendiente', 'proceso', 'resuelto') NOT NULL,
+    prioridad ENUM('baja', 'media', 'alta') NOT NULL,
+    tramo TINYINT NOT NULL,
+    cantidad INT NOT NULL,
+    vencidos INT NOT NULL,
+    calculado_en DATETIME NOT NULL,
+    PRIMARY KEY (estado, prioridad, tramo)
+);
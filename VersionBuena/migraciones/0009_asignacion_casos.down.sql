@@ -0,0 +1,4 @@
+DROP TABLE afinidad_equipos;
+ALTER TABLE casos
+    DROP INDEX idx_casos_asignado_estado_prioridad,
+    DROP COLUMN id_asignado;
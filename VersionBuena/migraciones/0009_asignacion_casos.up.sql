@@ -0,0 +1,24 @@
+-- =====================================
+-- ASIGNACIÓN DE CASOS A TÉCNICOS
+-- Cada caso nuevo se asigna a un técnico (id_datos, como comentarios.id_tecnico) según
+-- la prioridad, la carga abierta de cada técnico y el equipo del solicitante
+-- (services/asignacion.py). El índice (id_asignado, estado, prioridad, fecha_creacion,
+-- id_caso) sirve la cola personal de cada técnico y el cálculo de su carga.
+-- Los casos abiertos anteriores quedan sin asignar; para repartirlos:
+--     python manage.py asignacion repartir
+-- =====================================
+
+ALTER TABLE casos
+    ADD COLUMN id_asignado INT NULL,
+    ADD INDEX idx_casos_asignado_estado_prioridad (id_asignado, estado, prioridad, fecha_creacion, id_caso);
+
+-- Casos resueltos por cada técnico según la marca y el modelo del equipo del solicitante,
+-- acumulados en cada cambio a 'resuelto'
+CREATE TABLE afinidad_equipos (
+    marca VARCHAR(50) NOT NULL,
+    modelo VARCHAR(50) NOT NULL,
+    id_tecnico INT NOT NULL,
+    resueltos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (marca, modelo, id_tecnico),
+    INDEX idx_afinidad_equipo_resueltos (marca, modelo, resueltos)
+);
@@ -0,0 +1,2 @@
+ALTER TABLE casos_archivo DROP COLUMN actualizado_en;
+ALTER TABLE casos DROP COLUMN actualizado_en;
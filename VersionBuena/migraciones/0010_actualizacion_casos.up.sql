@@ -0,0 +1,17 @@
+-- =====================================
+-- FECHA DE ÚLTIMA MODIFICACIÓN DE LOS CASOS
+-- MySQL actualiza actualizado_en en cada UPDATE que cambia la fila (estado, prioridad,
+-- asignación, plazos...). Junto con el último comentario da el ETag y el Last-Modified
+-- de las páginas de detalle (services/cache_http.py), que responden 304 sin consultar
+-- el resto del caso. Los casos archivados la conservan al trasladarse.
+-- =====================================
+
+ALTER TABLE casos
+    ADD COLUMN actualizado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+-- Asignar la columna en el SET evita que ON UPDATE ponga la fecha de la migración
+UPDATE casos SET actualizado_en = COALESCE(estado_desde, fecha_creacion);
+
+ALTER TABLE casos_archivo ADD COLUMN actualizado_en DATETIME NULL;
+
+UPDATE casos_archivo SET actualizado_en = archivado_en;
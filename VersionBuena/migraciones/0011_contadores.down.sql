@@ -0,0 +1,3 @@
+DROP TABLE IF EXISTS estadisticas_usuarios;
+DROP TABLE IF EXISTS casos_por_dia;
+DROP TABLE IF EXISTS estadisticas_casos;
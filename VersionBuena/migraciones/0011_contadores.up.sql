@@ -0,0 +1,26 @@
+-- =====================================
+-- CONTADORES PRECALCULADOS
+-- Tablas de services/estadisticas.py que leen los dashboards y actualiza cada escritura
+-- (crear_caso, cambios de estado, altas y bajas de usuarios). Las bases creadas con el
+-- script "Creación de Tablas MySQL en XAMPP" ya las tienen; IF NOT EXISTS las deja como están.
+-- Al terminar, el migrador las rellena con estadisticas.reconstruir() (ver
+-- services/migraciones.py, COMPLETAR), la misma lógica de "manage.py estadisticas reconstruir".
+-- =====================================
+
+CREATE TABLE IF NOT EXISTS estadisticas_casos (
+    estado ENUM('pendiente', 'proceso', 'resuelto') NOT NULL,
+    prioridad ENUM('baja', 'media', 'alta') NOT NULL,
+    tipo_caso ENUM('incidencia', 'solicitud') NOT NULL,
+    cantidad INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (estado, prioridad, tipo_caso)
+);
+
+CREATE TABLE IF NOT EXISTS casos_por_dia (
+    fecha DATE PRIMARY KEY,
+    cantidad INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS estadisticas_usuarios (
+    tipo_usuario ENUM('administrador', 'usuario', 'tecnico') PRIMARY KEY,
+    cantidad INT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,43 @@
+import io
+
+import matplotlib
+matplotlib.use('Agg') # Backend sin interfaz gráfica: las figuras se dibujan fuera del hilo principal
+from matplotlib.figure import Figure
+
+# Este módulo solo se importa cuando las gráficas se piden en PNG (ver services/graficas.py):
+# cargar matplotlib cuesta segundos y decenas de MB en cada proceso.
+
+
+def _png(fig):
+    img = io.BytesIO()
+    fig.savefig(img, format='png', bbox_inches='tight') # Guardar la figura en memoria
+    return img.getvalue()
+
+
+def dibujar(datos):
+    """Dibuja las gráficas del dashboard a partir de datos_graficas(); devuelve {nombre: png}."""
+    estados = [fila['estado'] for fila in datos['estados']]
+    cantidades = [fila['cantidad'] for fila in datos['estados']]
+    fechas = [fila['fecha'] for fila in datos['tendencia']]
+    acumulado = [fila['acumulado'] for fila in datos['tendencia']]
+
+    # Se usa Figure directamente (y no pyplot) para no depender del estado global de matplotlib
+    fig1 = Figure()
+    ax1 = fig1.subplots()
+    ax1.pie(cantidades, labels=estados, autopct='%1.1f%%', startangle=140)
+    ax1.set_title("Distribución de Casos")
+
+    fig2 = Figure()
+    ax2 = fig2.subplots()
+    ax2.bar(estados, cantidades, color='skyblue')
+    ax2.set_title("Casos por Estado")
+
+    fig3 = Figure()
+    ax3 = fig3.subplots()
+    ax3.plot(fechas, acumulado, marker='o', linestyle='-', color='green')
+    ax3.set_title("Tendencia de Casos")
+    ax3.set_xlabel("Fecha")
+    fig3.autofmt_xdate()
+    ax3.set_ylabel("Cantidad Acumulada")
+
+    return {'pie': _png(fig1), 'bar': _png(fig2), 'line': _png(fig3)}
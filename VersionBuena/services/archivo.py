@@ -0,0 +1,114 @@
+import time
+from datetime import datetime, timedelta
+
+from db import get_cursor
+from services.dominio import PRIORIDADES
+
+COLUMNAS_CASO = 'id_caso, codigo_caso, id_usuario, tipo_caso, estado, asunto, descripcion, prioridad, fecha_creacion, version, actualizado_en'
+COLUMNAS_COMENTARIO = 'id_comentario, id_caso, id_tecnico, texto, fecha_comentario'
+
+# Tablas que reemplazan {casos} y {comentarios} en las consultas de buscar_caso()
+TABLAS_VIGENTES = {'casos': 'casos', 'comentarios': 'comentarios'}
+TABLAS_ARCHIVADAS = {'casos': 'casos_archivo', 'comentarios': 'comentarios_archivo'}
+
+
+def buscar_caso(cursor, sql, parametros):
+    """
+    Busca un caso primero en las tablas principales y, si no está, en el archivo.
+    `sql` usa {casos} y {comentarios} en lugar de los nombres de las tablas. Devuelve (fila, archivado).
+    """
+    cursor.execute(sql.format(**TABLAS_VIGENTES), parametros)
+    fila = cursor.fetchone()
+    if fila is not None:
+        return fila, False
+    cursor.execute(sql.format(**TABLAS_ARCHIVADAS), parametros)
+    fila = cursor.fetchone()
+    return fila, fila is not None
+
+
+class Archivador:
+    """
+    Traslada los casos resueltos antiguos (por fecha de creación) y sus comentarios a
+    casos_archivo y comentarios_archivo.
+    - Trabaja en lotes pequeños, cada uno en su propia transacción: solo bloquea las filas
+      del lote y durante poco tiempo. Entre lotes hace una pausa para no competir con
+      las peticiones de los usuarios ni retrasar las réplicas.
+    - Cada lote vuelve a comprobar el estado con FOR UPDATE: un caso reabierto mientras
+      tanto se queda en la tabla principal.
+    - Los candidatos se buscan por prioridad con el índice (estado, prioridad, fecha_creacion).
+    """
+    def __init__(self, dias=365, tamano_lote=200, pausa=0.5):
+        self.dias = dias
+        self.tamano_lote = tamano_lote
+        self.pausa = pausa
+
+    def limite(self, dias=None):
+        # Se archivan los casos creados antes de este instante
+        return datetime.now().replace(microsecond=0) - timedelta(days=self.dias if dias is None else dias)
+
+    def consulta_candidatos(self, prioridad, limite, cantidad):
+        return """
+            SELECT id_caso
+            FROM casos
+            WHERE estado = 'resuelto' AND prioridad = %s AND fecha_creacion < %s
+            ORDER BY fecha_creacion, id_caso
+            LIMIT %s
+        """, (prioridad, limite, cantidad)
+
+    def pendientes(self, cursor, limite):
+        # Cantidad de casos que se archivarían
+        cursor.execute("""
+            SELECT COUNT(*) FROM casos
+            WHERE estado = 'resuelto' AND fecha_creacion < %s
+        """, (limite,))
+        return cursor.fetchone()[0]
+
+    def _mover(self, conn, cursor, ids):
+        # Traslada un lote en una transacción; devuelve cuántos casos se archivaron
+        marcadores = ','.join(['%s'] * len(ids))
+        cursor.execute(f"""
+            SELECT id_caso FROM casos
+            WHERE id_caso IN ({marcadores}) AND estado = 'resuelto'
+            FOR UPDATE
+        """, tuple(ids))
+        ids = [fila[0] for fila in cursor.fetchall()]
+        if ids:
+            marcadores = ','.join(['%s'] * len(ids))
+            for sql in (
+                f"INSERT INTO casos_archivo ({COLUMNAS_CASO}) SELECT {COLUMNAS_CASO} FROM casos WHERE id_caso IN ({marcadores})",
+                f"INSERT INTO comentarios_archivo ({COLUMNAS_COMENTARIO}) SELECT {COLUMNAS_COMENTARIO} FROM comentarios WHERE id_caso IN ({marcadores})",
+                f"DELETE FROM comentarios WHERE id_caso IN ({marcadores})",
+                f"DELETE FROM casos WHERE id_caso IN ({marcadores})",
+            ):
+                cursor.execute(sql, tuple(ids))
+        conn.commit()
+        return len(ids)
+
+    def archivar(self, dias=None, maximo=None, progreso=None):
+        """
+        Archiva los casos resueltos creados hace más de `dias` días (por defecto self.dias),
+        como mucho `maximo`. progreso(archivados) se llama después de cada lote.
+        Devuelve la cantidad de casos archivados.
+        """
+        limite = self.limite(dias)
+        archivados = 0
+        with get_cursor() as (conn, cursor):
+            for prioridad in PRIORIDADES:
+                while maximo is None or archivados < maximo:
+                    cantidad = self.tamano_lote if maximo is None else min(self.tamano_lote, maximo - archivados)
+                    cursor.execute(*self.consulta_candidatos(prioridad, limite, cantidad))
+                    ids = [fila[0] for fila in cursor.fetchall()]
+                    conn.rollback()  # No mantener abierta la instantánea de lectura durante la pausa
+                    if not ids:
+                        break
+                    archivados += self._mover(conn, cursor, ids)
+                    if progreso:
+                        progreso(archivados)
+                    if len(ids) < cantidad:
+                        break
+                    time.sleep(self.pausa)
+        return archivados
+
+
+# Instancia compartida por los controladores y manage.py
+archivador = Archivador()
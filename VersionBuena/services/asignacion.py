@@ -0,0 +1,286 @@
+import heapq
+import threading
+import time
+
+from db import get_cursor
+from services.cache import CacheTTL
+from services.eventos import bus_eventos
+
+# Reparto automático de los casos nuevos entre los técnicos
+asignacion_config = {
+    'automatica': True,     # Asignar cada caso nuevo al crearlo
+    'refrescar_cada': 60,   # Segundos entre recálculos de la carga desde la base de datos
+    'afines': 5,            # Técnicos con más casos resueltos del mismo equipo que se consideran
+    # Carga de más que se acepta para dar el caso a un técnico que conoce el equipo:
+    # en alta prioridad solo decide entre técnicos igual de cargados
+    'holgura': {'alta': 0, 'media': 2, 'baja': 4},
+}
+
+# Peso de cada caso abierto en la carga de su técnico
+PESOS = {'alta': 3, 'media': 2, 'baja': 1}
+ABIERTOS = ('pendiente', 'proceso')
+
+
+class IndiceCarga:
+    """
+    Carga de cada técnico en memoria: la suma de PESOS de sus casos pendientes y en proceso.
+    Un montículo de (carga, id_tecnico) da el menos cargado en O(log n); al cambiar una carga
+    se añade otra entrada y las que ya no coinciden se descartan cuando llegan a la cima.
+    Es segura para hilos.
+    """
+    def __init__(self):
+        self._cargas = {}
+        self._monticulo = []
+        self._lock = threading.Lock()
+
+    def reemplazar(self, cargas):
+        # Cargas completas leídas de la base de datos: {id_tecnico: carga}
+        with self._lock:
+            self._cargas = dict(cargas)
+            self._reconstruir()
+
+    def _reconstruir(self):
+        self._monticulo = [(carga, id_tecnico) for id_tecnico, carga in self._cargas.items()]
+        heapq.heapify(self._monticulo)
+
+    def _sumar(self, id_tecnico, delta):
+        carga = max(0, self._cargas[id_tecnico] + delta)
+        self._cargas[id_tecnico] = carga
+        heapq.heappush(self._monticulo, (carga, id_tecnico))
+        # Las entradas descartadas se acumulan; de vez en cuando se rehace el montículo
+        if len(self._monticulo) > 4 * len(self._cargas) + 64:
+            self._reconstruir()
+
+    def sumar(self, id_tecnico, delta):
+        with self._lock:
+            # Un técnico desconocido (dado de alta o de baja después del último recálculo) se ignora
+            if id_tecnico in self._cargas:
+                self._sumar(id_tecnico, delta)
+
+    def _menor(self):
+        while self._monticulo:
+            carga, id_tecnico = self._monticulo[0]
+            if self._cargas.get(id_tecnico) == carga:
+                return carga, id_tecnico
+            heapq.heappop(self._monticulo)
+        return None
+
+    def reservar(self, peso, preferidos=(), holgura=0):
+        """
+        Elige técnico para un caso de `peso` y le suma la carga en la misma operación, para
+        que dos peticiones simultáneas no elijan al mismo por ver la misma carga.
+        Se prefiere, en orden, a un técnico de `preferidos` cuya carga no supere la menor en
+        más de `holgura`; si no, al menos cargado. Devuelve el id o None si no hay técnicos.
+        """
+        with self._lock:
+            menor = self._menor()
+            if menor is None:
+                return None
+            elegido = menor[1]
+            for id_tecnico in preferidos:
+                carga = self._cargas.get(id_tecnico)
+                if carga is not None and carga <= menor[0] + holgura:
+                    elegido = id_tecnico
+                    break
+            self._sumar(elegido, peso)
+            return elegido
+
+    def liberar(self, id_tecnico, peso):
+        # Devuelve una carga reservada que no llegó a confirmarse
+        self.sumar(id_tecnico, -peso)
+
+    def cargas(self):
+        with self._lock:
+            return dict(self._cargas)
+
+
+class AsignadorCasos:
+    """
+    Asigna los casos nuevos a un técnico según la prioridad, la carga abierta de cada técnico
+    y el equipo del solicitante.
+    - La carga vive en un IndiceCarga en memoria. Se ajusta con cada caso publicado en el bus
+      de eventos (después de confirmar la transacción) y se recalcula desde la base de datos
+      cada `refrescar_cada` segundos, dentro de la petición que lo detecta; el recálculo
+      recoge también lo que asignaron otros procesos.
+    - Afinidad: afinidad_equipos acumula, por marca y modelo del equipo del solicitante, los
+      casos que resolvió cada técnico (se actualiza en la transacción de cada resolución).
+    Los métodos que reciben un cursor esperan uno de diccionario.
+    """
+    def __init__(self, config=asignacion_config, tamano_lote=500):
+        self.config = config
+        self.tamano_lote = tamano_lote
+        self.indice = IndiceCarga()
+        self.refrescado_en = None  # time.monotonic() del último recálculo
+        self._refrescando = threading.Lock()
+        self._afinidad = CacheTTL(maximo=1024, ttl=300)  # (marca, modelo) -> [id_tecnico]
+
+    # ---- Carga de los técnicos ----
+
+    def consulta_cargas(self, tecnicos):
+        # Casos abiertos por técnico y prioridad: rangos (id_asignado, estado) del índice, sin leer filas
+        marcadores = ','.join(['%s'] * len(tecnicos))
+        return f"""
+            SELECT id_asignado, prioridad, COUNT(*) AS cantidad
+            FROM casos
+            WHERE id_asignado IN ({marcadores}) AND estado IN (%s, %s)
+            GROUP BY id_asignado, prioridad
+        """, (*tecnicos, *ABIERTOS)
+
+    def refrescar(self, cursor):
+        # Recalcula la carga de todos los técnicos (los técnicos se identifican por id_datos)
+        cursor.execute("SELECT id_datos FROM users WHERE tipo_usuario = 'tecnico' AND id_datos IS NOT NULL")
+        cargas = {fila['id_datos']: 0 for fila in cursor.fetchall()}
+        tecnicos = list(cargas)
+        for inicio in range(0, len(tecnicos), self.tamano_lote):
+            cursor.execute(*self.consulta_cargas(tecnicos[inicio:inicio + self.tamano_lote]))
+            for fila in cursor.fetchall():
+                cargas[fila['id_asignado']] += PESOS[fila['prioridad']] * fila['cantidad']
+        self.indice.reemplazar(cargas)
+        self.refrescado_en = time.monotonic()
+        return cargas
+
+    def _refrescar_si_toca(self, cursor):
+        if self.refrescado_en is not None and time.monotonic() - self.refrescado_en < self.config['refrescar_cada']:
+            return
+        # La primera vez todos esperan al recálculo; después, las demás peticiones usan la carga anterior
+        if not self._refrescando.acquire(blocking=self.refrescado_en is None):
+            return
+        try:
+            if self.refrescado_en is None or time.monotonic() - self.refrescado_en >= self.config['refrescar_cada']:
+                self.refrescar(cursor)
+        finally:
+            self._refrescando.release()
+
+    def al_publicar(self, id_evento, tipo, caso):
+        """
+        Oyente del bus de eventos: ajusta la carga con un cambio ya confirmado. Los casos nuevos
+        (sin estado_anterior) se ignoran porque su carga se reservó al elegir el técnico.
+        """
+        if 'estado_anterior' not in caso:
+            return
+        anterior = caso.get('asignado_anterior', caso.get('id_asignado'))
+        if anterior is not None and caso['estado_anterior'] in ABIERTOS:
+            self.indice.sumar(anterior, -PESOS[caso['prioridad_anterior']])
+        if caso.get('id_asignado') is not None and caso['estado'] in ABIERTOS:
+            self.indice.sumar(caso['id_asignado'], PESOS[caso['prioridad']])
+
+    # ---- Afinidad por equipo ----
+
+    def equipo_de(self, cursor, id_usuario):
+        # (marca, modelo) del equipo del solicitante, o None si no tiene
+        cursor.execute("""
+            SELECT e.marca, e.modelo
+            FROM users u
+            JOIN datos_personales d ON u.id_datos = d.id_datos
+            JOIN equipos e ON d.id_equipo = e.id_equipo
+            WHERE u.id_user = %s
+        """, (id_usuario,))
+        fila = cursor.fetchone()
+        return (fila['marca'], fila['modelo']) if fila else None
+
+    def consulta_afines(self, equipo):
+        return """
+            SELECT id_tecnico
+            FROM afinidad_equipos
+            WHERE marca = %s AND modelo = %s
+            ORDER BY resueltos DESC
+            LIMIT %s
+        """, (*equipo, self.config['afines'])
+
+    def afines(self, cursor, equipo):
+        # Técnicos que más casos de ese equipo han resuelto, del que más al que menos
+        if not equipo:
+            return []
+        afines = self._afinidad.obtener(equipo)
+        if afines is None:
+            cursor.execute(*self.consulta_afines(equipo))
+            afines = [fila['id_tecnico'] for fila in cursor.fetchall()]
+            self._afinidad.guardar(equipo, afines)
+        return afines
+
+    def al_resolver(self, cursor, ids, id_tecnico):
+        # Suma los casos resueltos a la afinidad del técnico con el equipo de cada solicitante
+        marcadores = ','.join(['%s'] * len(ids))
+        cursor.execute(f"""
+            INSERT INTO afinidad_equipos (marca, modelo, id_tecnico, resueltos)
+            SELECT e.marca, e.modelo, %s, COUNT(*)
+            FROM casos c
+            JOIN users u ON c.id_usuario = u.id_user
+            JOIN datos_personales d ON u.id_datos = d.id_datos
+            JOIN equipos e ON d.id_equipo = e.id_equipo
+            WHERE c.id_caso IN ({marcadores})
+            GROUP BY e.marca, e.modelo
+            ON DUPLICATE KEY UPDATE resueltos = resueltos + VALUES(resueltos)
+        """, (id_tecnico, *ids))
+
+    # ---- Asignación ----
+
+    def elegir(self, cursor, id_usuario, prioridad):
+        """
+        Técnico (id_datos) para un caso nuevo de `id_usuario`, o None si la asignación automática
+        está desactivada o no hay técnicos. La carga del caso queda reservada al elegirlo.
+        """
+        if not self.config['automatica']:
+            return None
+        self._refrescar_si_toca(cursor)
+        afines = self.afines(cursor, self.equipo_de(cursor, id_usuario))
+        return self.indice.reservar(PESOS[prioridad], afines, self.config['holgura'][prioridad])
+
+    def liberar(self, id_tecnico, prioridad):
+        # Deshace la reserva de elegir() si la transacción del caso no se confirmó
+        if id_tecnico is not None:
+            self.indice.liberar(id_tecnico, PESOS[prioridad])
+
+    def repartir(self, tamano_lote=None, progreso=None):
+        """
+        Asigna los casos abiertos que no tienen técnico (los anteriores a la asignación
+        automática), de mayor a menor prioridad y del más antiguo al más reciente.
+        Confirma cada lote; devuelve cuántos casos se asignaron. Los demás procesos ven la
+        carga nueva en su siguiente recálculo.
+        """
+        tamano_lote = tamano_lote or self.tamano_lote
+        asignados = 0
+        with get_cursor(dictionary=True) as (conn, cursor):
+            self.refrescar(cursor)
+            for prioridad in PESOS:
+                while True:
+                    cursor.execute("""
+                        SELECT id_caso, id_usuario
+                        FROM casos
+                        WHERE id_asignado IS NULL AND estado IN (%s, %s) AND prioridad = %s
+                        ORDER BY fecha_creacion, id_caso
+                        LIMIT %s
+                    """, (*ABIERTOS, prioridad, tamano_lote))
+                    casos = cursor.fetchall()
+                    if not casos:
+                        break
+                    por_tecnico = {}
+                    for caso in casos:
+                        id_tecnico = self.indice.reservar(
+                            PESOS[prioridad], self.afines(cursor, self.equipo_de(cursor, caso['id_usuario'])),
+                            self.config['holgura'][prioridad])
+                        if id_tecnico is None:
+                            return asignados
+                        por_tecnico.setdefault(id_tecnico, []).append(caso['id_caso'])
+                    actualizados = 0
+                    for id_tecnico, ids in por_tecnico.items():
+                        marcadores = ','.join(['%s'] * len(ids))
+                        cursor.execute(f"""
+                            UPDATE casos SET id_asignado = %s, version = version + 1
+                            WHERE id_caso IN ({marcadores}) AND id_asignado IS NULL
+                        """, (id_tecnico, *ids))
+                        # Los casos que otra petición asignó entre la lectura y el UPDATE no cuentan
+                        # ni cargan al técnico
+                        actualizados += cursor.rowcount
+                        if cursor.rowcount < len(ids):
+                            self.indice.liberar(id_tecnico, PESOS[prioridad] * (len(ids) - cursor.rowcount))
+                    conn.commit()
+                    asignados += actualizados
+                    if progreso:
+                        progreso(asignados)
+            return asignados
+
+
+# Instancia compartida por los controladores y flujo_casos
+asignador_casos = AsignadorCasos()
+bus_eventos.escuchar(asignador_casos.al_publicar, tipos=['caso'])
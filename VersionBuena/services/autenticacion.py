@@ -0,0 +1,170 @@
+import hmac
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from db import get_cursor
+from services.cache import CacheTTL
+from services.sesiones import Principal
+
+# Método y costo del hash de contraseñas (formato de werkzeug). Subir el costo hace cada
+# verificación más lenta; los hashes con otro método se actualizan en el siguiente login.
+METODO_HASH = 'scrypt:32768:8:1'
+
+# Usuario por su identificación (login y caché de usuarios)
+CONSULTA_USUARIO = """
+    SELECT id_user, id_identity, password, tipo_usuario, id_datos
+    FROM users
+    WHERE id_identity = %s
+"""
+
+
+class DemasiadosIntentos(Exception):
+    """Se lanza cuando un cliente o una cuenta superó el límite de intentos fallidos."""
+    def __init__(self, reintentar_en):
+        super().__init__('Demasiados intentos fallidos. Intente de nuevo más tarde.')
+        self.reintentar_en = reintentar_en
+
+
+class ServicioOcupado(Exception):
+    """Se lanza cuando hay demasiadas verificaciones de contraseña en curso."""
+    def __init__(self, reintentar_en=1):
+        super().__init__('El servidor está ocupado. Intente de nuevo en unos segundos.')
+        self.reintentar_en = reintentar_en
+
+
+class LimitadorIntentos:
+    """
+    Cuenta intentos fallidos por clave (IP o cuenta) en una ventana fija de tiempo.
+    Al llegar al máximo, la clave queda bloqueada hasta que termina la ventana.
+    """
+    def __init__(self, maximo=5, ventana=60, claves=10000):
+        self.maximo = maximo
+        self.ventana = ventana
+        self._intentos = CacheTTL(maximo=claves, ttl=ventana)  # clave -> (inicio, cantidad)
+        self._lock = threading.Lock()
+
+    def bloqueado(self, clave):
+        # Segundos que faltan para desbloquear la clave, o 0 si no está bloqueada
+        inicio, cantidad = self._intentos.obtener(clave, (0, 0))
+        if cantidad < self.maximo:
+            return 0
+        return max(1, int(inicio + self.ventana - time.monotonic()) + 1)
+
+    def fallo(self, clave):
+        with self._lock:
+            ahora = time.monotonic()
+            inicio, cantidad = self._intentos.obtener(clave, (ahora, 0))
+            self._intentos.guardar(clave, (inicio, cantidad + 1), ttl=max(0, inicio + self.ventana - ahora))
+
+    def reiniciar(self, clave):
+        self._intentos.eliminar(clave)
+
+
+class Autenticador:
+    """
+    Inicio de sesión con contraseñas encriptadas.
+    - El usuario se busca solo por id_identity (índice único) y la contraseña se verifica
+      en Python con check_password_hash.
+    - Las filas antiguas con la contraseña en texto plano se aceptan una vez y se
+      reemplazan por un hash; lo mismo con hashes de un método o costo distinto a METODO_HASH.
+    - Toda verificación cuesta lo mismo, exista o no el usuario, para no revelar qué
+      cuentas existen por el tiempo de respuesta.
+    - Los registros de usuario se guardan en una caché con TTL, que también usa la
+      comprobación de sesión de cada petición.
+    - Los intentos fallidos se limitan por IP y por cuenta, y un semáforo acota cuántos
+      hashes se calculan a la vez para que un pico de logins no consuma toda la CPU.
+    """
+    def __init__(self, metodo_hash=METODO_HASH, ttl_usuarios=300, maximo_usuarios=4096,
+                 hashes_simultaneos=4, espera_hash=2.0):
+        self.metodo_hash = metodo_hash
+        self._usuarios = CacheTTL(maximo=maximo_usuarios, ttl=ttl_usuarios)  # id_identity -> fila
+        self._hashes = threading.BoundedSemaphore(hashes_simultaneos)
+        self.espera_hash = espera_hash
+        # Por IP el límite es más alto: en una oficina muchos usuarios salen por la misma IP
+        self.limitador_cuenta = LimitadorIntentos(maximo=5, ventana=60)
+        self.limitador_ip = LimitadorIntentos(maximo=50, ventana=60)
+        self._hash_falso = None
+
+    def encriptar(self, password):
+        return generate_password_hash(password, method=self.metodo_hash)
+
+    def usuario(self, id_identity):
+        # Fila de users (con el hash de la contraseña) o None; se lee de la caché si está
+        fila = self._usuarios.obtener(id_identity)
+        if fila is None:
+            with get_cursor(dictionary=True) as (conn, cursor):
+                cursor.execute(CONSULTA_USUARIO, (id_identity,))
+                fila = cursor.fetchone()
+            if fila is None:
+                return None
+            self._usuarios.guardar(id_identity, fila)
+        return fila
+
+    def invalidar(self, id_identity):
+        # Se llama cuando un usuario cambia o se elimina
+        self._usuarios.eliminar(id_identity)
+
+    def _verificar(self, guardado, password):
+        # Devuelve (valida, necesita_actualizar). Siempre calcula un hash completo.
+        if self._hash_falso is None:
+            self._hash_falso = self.encriptar('contraseña de relleno')
+        if guardado is None:
+            check_password_hash(self._hash_falso, password)
+            return False, False
+        if '$' not in guardado:
+            # Texto plano heredado: se compara en tiempo constante y se iguala el costo
+            check_password_hash(self._hash_falso, password)
+            return hmac.compare_digest(guardado.encode('utf-8'), password.encode('utf-8')), True
+        valida = check_password_hash(guardado, password)
+        return valida, valida and guardado.split('$', 1)[0] != self.metodo_hash
+
+    def _actualizar_hash(self, usuario, password):
+        nuevo = self.encriptar(password)
+        with get_cursor() as (conn, cursor):
+            # Solo si nadie cambió la contraseña mientras tanto
+            cursor.execute("UPDATE users SET password = %s WHERE id_user = %s AND password = %s",
+                           (nuevo, usuario['id_user'], usuario['password']))
+            conn.commit()
+        self.invalidar(usuario['id_identity'])
+
+    def autenticar(self, id_identity, password, ip=None):
+        """
+        Devuelve el Principal del usuario para la sesión o None si las credenciales
+        no son válidas. Lanza DemasiadosIntentos o ServicioOcupado.
+        """
+        limites = [(self.limitador_cuenta, id_identity)] + ([(self.limitador_ip, ip)] if ip else [])
+        espera = max(limitador.bloqueado(clave) for limitador, clave in limites)
+        if espera:
+            raise DemasiadosIntentos(espera)
+
+        usuario = self.usuario(id_identity) if id_identity else None
+        if not self._hashes.acquire(timeout=self.espera_hash):
+            raise ServicioOcupado()
+        try:
+            valida, actualizar = self._verificar(usuario['password'] if usuario else None, password or '')
+            if valida and actualizar:
+                self._actualizar_hash(usuario, password)
+        finally:
+            self._hashes.release()
+
+        if not valida:
+            for limitador, clave in limites:
+                limitador.fallo(clave)
+            return None
+        self.limitador_cuenta.reiniciar(id_identity)
+        return Principal(*(usuario[campo] for campo in Principal.__slots__))
+
+    def sesion_vigente(self, datos_sesion):
+        """
+        Comprueba que el usuario de la sesión siga existiendo con el mismo rol.
+        Usa la caché de usuarios, así que normalmente no consulta la base de datos.
+        """
+        usuario = self.usuario(datos_sesion.get('id_identity'))
+        return (usuario is not None and usuario['id_user'] == datos_sesion.get('id_user')
+                and usuario['tipo_usuario'] == datos_sesion.get('tipo_usuario'))
+
+
+# Instancia compartida por la aplicación y los controladores
+autenticador = Autenticador()
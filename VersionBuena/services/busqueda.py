@@ -0,0 +1,154 @@
+import re
+
+from services.cache import CacheTTL
+
+# Caracteres con significado especial en las búsquedas FULLTEXT en modo booleano
+OPERADORES_FULLTEXT = re.compile(r'[+\-<>()~*"@]')
+LARGO_MINIMO_TERMINO = 3  # innodb_ft_min_token_size por defecto
+
+
+def escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class Buscador:
+    """
+    Búsqueda de personas (nombre, identificación, equipo) y de casos (código, asunto, descripción).
+    Los identificadores se buscan por prefijo sobre índices B-tree y los textos con los
+    índices FULLTEXT (ver migración 0003). Cada criterio es una subconsulta que usa su
+    propio índice; se combinan con UNION ALL y se ordenan por relevancia.
+    """
+    def __init__(self, limite=20, limite_sugerencias=8):
+        self.limite = limite
+        self.limite_sugerencias = limite_sugerencias
+        self._sugerencias = CacheTTL(maximo=2048, ttl=30)
+
+    def terminos_fulltext(self, q):
+        # "ana mar" -> "+ana* +mar*"; los términos demasiado cortos se ignoran
+        palabras = OPERADORES_FULLTEXT.sub(' ', q).split()
+        return ' '.join(f'+{p}*' for p in palabras if len(p) >= LARGO_MINIMO_TERMINO)
+
+    def consulta_personas(self, q, limite):
+        # Devuelve (sql, parámetros) de la búsqueda de personas
+        prefijo = escapar_like(q.strip()) + '%'
+        terminos = self.terminos_fulltext(q)
+
+        candidatos = ["SELECT id_user, 100 AS relevancia FROM users WHERE id_identity LIKE %s"]
+        parametros = [prefijo]
+        candidatos.append("""
+            SELECT u.id_user, 50 AS relevancia
+            FROM equipos e
+            JOIN datos_personales d ON d.id_equipo = e.id_equipo
+            JOIN users u ON u.id_datos = d.id_datos
+            WHERE e.serial LIKE %s
+        """)
+        parametros.append(prefijo)
+        if terminos:
+            candidatos.append("""
+                SELECT u.id_user, 10 * MATCH(d.nombre_completo) AGAINST (%s IN BOOLEAN MODE) AS relevancia
+                FROM datos_personales d
+                JOIN users u ON u.id_datos = d.id_datos
+                WHERE MATCH(d.nombre_completo) AGAINST (%s IN BOOLEAN MODE)
+            """)
+            candidatos.append("""
+                SELECT u.id_user, 5 * MATCH(e.nombre_equipo, e.marca, e.modelo, e.serial) AGAINST (%s IN BOOLEAN MODE)
+                FROM equipos e
+                JOIN datos_personales d ON d.id_equipo = e.id_equipo
+                JOIN users u ON u.id_datos = d.id_datos
+                WHERE MATCH(e.nombre_equipo, e.marca, e.modelo, e.serial) AGAINST (%s IN BOOLEAN MODE)
+            """)
+            parametros.extend([terminos] * 4)
+
+        sql = f"""
+            SELECT u.id_user, u.id_identity, u.tipo_usuario,
+                   d.nombre_completo, d.telefono, d.correo,
+                   e.nombre_equipo, e.marca, e.modelo, e.serial,
+                   r.relevancia
+            FROM (
+                SELECT id_user, MAX(relevancia) AS relevancia
+                FROM ({' UNION ALL '.join(candidatos)}) candidatos
+                GROUP BY id_user
+                ORDER BY relevancia DESC
+                LIMIT %s
+            ) r
+            JOIN users u ON u.id_user = r.id_user
+            JOIN datos_personales d ON u.id_datos = d.id_datos
+            LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
+            ORDER BY r.relevancia DESC
+        """
+        parametros.append(limite)
+        return sql, tuple(parametros)
+
+    def consulta_casos(self, q, limite):
+        # Devuelve (sql, parámetros) de la búsqueda de casos
+        prefijo = escapar_like(q.strip()) + '%'
+        terminos = self.terminos_fulltext(q)
+
+        candidatos = ["SELECT id_caso, 100 AS relevancia FROM casos WHERE codigo_caso LIKE %s"]
+        parametros = [prefijo]
+        if terminos:
+            candidatos.append("""
+                SELECT id_caso, 10 * MATCH(asunto, descripcion) AGAINST (%s IN BOOLEAN MODE) AS relevancia
+                FROM casos
+                WHERE MATCH(asunto, descripcion) AGAINST (%s IN BOOLEAN MODE)
+            """)
+            parametros.extend([terminos, terminos])
+
+        sql = f"""
+            SELECT c.id_caso, c.codigo_caso, c.estado, c.asunto, c.prioridad, c.id_usuario, r.relevancia
+            FROM (
+                SELECT id_caso, MAX(relevancia) AS relevancia
+                FROM ({' UNION ALL '.join(candidatos)}) candidatos
+                GROUP BY id_caso
+                ORDER BY relevancia DESC
+                LIMIT %s
+            ) r
+            JOIN casos c ON c.id_caso = r.id_caso
+            ORDER BY r.relevancia DESC
+        """
+        parametros.append(limite)
+        return sql, tuple(parametros)
+
+    def buscar_personas(self, cursor, q, limite=None):
+        if not q or not q.strip():
+            return []
+        cursor.execute(*self.consulta_personas(q, limite or self.limite))
+        return cursor.fetchall()
+
+    def buscar_casos(self, cursor, q, limite=None):
+        if not q or not q.strip():
+            return []
+        cursor.execute(*self.consulta_casos(q, limite or self.limite))
+        return cursor.fetchall()
+
+    def sugerir(self, cursor, q):
+        """
+        Sugerencias para el autocompletado: lista de {'tipo', 'texto', 'valor'}.
+        Las respuestas se guardan unos segundos, porque al escribir se repiten los mismos prefijos.
+        """
+        q = (q or '').strip()
+        if len(q) < 2:
+            return []
+        clave = q.lower()
+        sugerencias = self._sugerencias.obtener(clave)
+        if sugerencias is not None:
+            return sugerencias
+
+        limite = self.limite_sugerencias
+        personas = [
+            {'tipo': 'persona', 'texto': f"{p['nombre_completo']} ({p['id_identity']})", 'valor': p['id_identity']}
+            for p in self.buscar_personas(cursor, q, limite)
+        ]
+        casos = [
+            {'tipo': 'caso', 'texto': f"{c['codigo_caso']} - {c['asunto']}", 'valor': c['codigo_caso']}
+            for c in self.buscar_casos(cursor, q, limite)
+        ]
+        # Se reparte el límite entre personas y casos; si un grupo no lo llena, lo usa el otro
+        cupo_personas = max(limite // 2, limite - len(casos))
+        sugerencias = personas[:cupo_personas] + casos[:limite - min(len(personas), cupo_personas)]
+        self._sugerencias.guardar(clave, sugerencias)
+        return sugerencias
+
+
+# Instancia compartida por los controladores
+buscador = Buscador()
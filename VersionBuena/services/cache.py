@@ -0,0 +1,46 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """
+    Caché en memoria con tamaño máximo (se descarta la entrada menos usada)
+    y tiempo de vida por entrada. Es segura para hilos.
+    """
+    def __init__(self, maximo=1024, ttl=60):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return defecto
+            expira_en, valor = entrada
+            if expira_en < time.monotonic():
+                del self._datos[clave]
+                return defecto
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor, ttl=None):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + (ttl if ttl is not None else self.ttl), valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
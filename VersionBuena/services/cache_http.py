@@ -0,0 +1,173 @@
+import hashlib
+import os
+import time
+from datetime import timezone
+
+from flask import request, Response
+from werkzeug.security import safe_join
+
+from services.archivo import buscar_caso
+
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+cache_http_config = {
+    'estaticos': 365 * 86400,  # max-age de los archivos estáticos pedidos con su huella (?v=...)
+    'revisar_cada': 2,         # Segundos entre comprobaciones de cambios en static/ y templates/
+}
+
+
+def _utc(fecha):
+    # Las columnas DATETIME guardan la hora local del servidor sin zona; HTTP usa UTC
+    return fecha.astimezone(timezone.utc)
+
+
+# Política de caché de cada endpoint; los que no aparecen usan 'privada'.
+# - 'estatica': archivos de static/. Con la huella vigente en ?v= se guardan un año sin
+#   revalidar (la URL cambia cuando cambia el archivo); sin ella, se revalidan con ETag.
+# - 'privada': solo el navegador del usuario la guarda y debe revalidarla antes de mostrarla
+#   (private, no-cache). Al volver con "Atrás" la página se pide otra vez y, si la sesión
+#   ya se cerró, el servidor redirige al login en lugar de mostrarla.
+# - 'sin_guardar': no se guarda en ningún sitio (no-store).
+POLITICAS = {
+    'static': 'estatica',
+    'login_post': 'sin_guardar',
+    'metrics': 'sin_guardar',
+}
+
+# Datos del caso y del solicitante que cambian lo que muestran las páginas de detalle, más la
+# cantidad y la fecha del último comentario (índice id_caso/fecha_comentario)
+CONSULTA_VALIDADOR_CASO = """
+    SELECT c.version, c.actualizado_en,
+           (SELECT COUNT(*) FROM {comentarios} WHERE id_caso = c.id_caso) AS comentarios,
+           (SELECT MAX(fecha_comentario) FROM {comentarios} WHERE id_caso = c.id_caso) AS ultimo_comentario,
+           d.*, u.tipo_usuario, u.id_identity, e.nombre_equipo, e.marca, e.modelo, e.serial
+    FROM {casos} c
+    JOIN users u ON c.id_usuario = u.id_user
+    JOIN datos_personales d ON u.id_datos = d.id_datos
+    LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
+    WHERE c.codigo_caso = %s
+"""
+
+
+class PoliticaCache:
+    """
+    Encabezados de caché HTTP por endpoint (POLITICAS) y GET condicionales.
+    - Las URLs de static/ llevan la huella del archivo (?v=, ver MyApp.set_headers), así que
+      el navegador guarda CSS, JS e imágenes hasta que cambian.
+    - Las páginas de detalle de un caso calculan su ETag con una consulta pequeña
+      (CONSULTA_VALIDADOR_CASO); si coincide con el del navegador responden 304 sin leer el
+      caso completo ni los comentarios, y sin renderizar la plantilla.
+    - El ETag incluye la huella del despliegue (static/ y templates/): una plantilla o un
+      estilo nuevo invalidan las páginas guardadas aunque el caso no haya cambiado.
+    """
+    def __init__(self, config=cache_http_config, directorio=DIRECTORIO_APP):
+        self.config = config
+        self.estaticos = os.path.join(directorio, 'static')
+        self.plantillas = os.path.join(directorio, 'templates')
+        self._huellas = {}          # ruta -> (mtime, huella)
+        self._despliegue = (0, None)  # (time.monotonic() de la revisión, huella)
+
+    # ---- Huellas ----
+
+    def _huella_archivo(self, ruta):
+        try:
+            modificado = os.stat(ruta).st_mtime_ns
+        except OSError:
+            return None
+        guardada = self._huellas.get(ruta)
+        if guardada is not None and guardada[0] == modificado:
+            return guardada[1]
+        with open(ruta, 'rb') as archivo:
+            huella = hashlib.sha256(archivo.read()).hexdigest()[:12]
+        self._huellas[ruta] = (modificado, huella)
+        return huella
+
+    def huella(self, filename):
+        # Huella del contenido de un archivo de static/, o None si no existe
+        ruta = safe_join(self.estaticos, filename)
+        return self._huella_archivo(ruta) if ruta else None
+
+    def huella_despliegue(self):
+        # Cambia cuando se modifica cualquier archivo de static/ o templates/
+        revisado_en, huella = self._despliegue
+        if huella is not None and time.monotonic() - revisado_en < self.config['revisar_cada']:
+            return huella
+        resumen = hashlib.sha256()
+        for carpeta in (self.estaticos, self.plantillas):
+            for raiz, _, archivos in sorted(os.walk(carpeta)):
+                for nombre in sorted(archivos):
+                    ruta = os.path.join(raiz, nombre)
+                    try:
+                        resumen.update(f'{ruta}:{os.stat(ruta).st_mtime_ns};'.encode())
+                    except OSError:
+                        continue
+        huella = resumen.hexdigest()[:12]
+        self._despliegue = (time.monotonic(), huella)
+        return huella
+
+    # ---- Encabezados ----
+
+    def aplicar(self, response):
+        # after_request: Cache-Control según la política del endpoint
+        politica = POLITICAS.get(request.endpoint, 'privada')
+        if politica == 'estatica':
+            filename = (request.view_args or {}).get('filename')
+            version = request.args.get('v')
+            if version and response.status_code in (200, 304) and version == self.huella(filename):
+                response.headers['Cache-Control'] = f"public, max-age={self.config['estaticos']}, immutable"
+            else:
+                response.headers['Cache-Control'] = 'public, no-cache'
+            return response
+
+        # Las respuestas que ya definen su propio Cache-Control (gráficas, eventos) se respetan
+        if 'Cache-Control' in response.headers:
+            return response
+        if politica == 'sin_guardar':
+            response.headers['Cache-Control'] = 'no-store'
+        else:
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+        return response
+
+    # ---- GET condicionales ----
+
+    def etag(self, *partes):
+        datos = repr((self.huella_despliegue(), partes)).encode('utf-8')
+        return hashlib.sha256(datos).hexdigest()[:32]
+
+    def validador_caso(self, cursor, codigo_caso, vista):
+        """
+        (etag, ultima_modificacion) de la página de detalle `vista` de un caso, o None si el
+        caso o su solicitante no existen. Espera un cursor de diccionario.
+        """
+        fila, archivado = buscar_caso(cursor, CONSULTA_VALIDADOR_CASO, (codigo_caso,))
+        if fila is None:
+            return None
+        fechas = [f for f in (fila['actualizado_en'], fila['ultimo_comentario']) if f is not None]
+        modificado = max(fechas) if fechas else None
+        return self.etag(vista, archivado, *sorted(fila.items())), modificado
+
+    def no_modificado(self, etag, modificado):
+        """
+        Respuesta 304 si el navegador ya tiene esta versión (If-None-Match o, sin él,
+        If-Modified-Since); None si hay que generar la página.
+        """
+        if request.if_none_match:
+            vigente = request.if_none_match.contains_weak(etag)
+        else:
+            desde = request.if_modified_since
+            vigente = desde is not None and modificado is not None and \
+                _utc(modificado).replace(microsecond=0) <= _utc(desde)
+        if not vigente:
+            return None
+        return self.marcar(Response(status=304), etag, modificado)
+
+    def marcar(self, response, etag, modificado):
+        response.set_etag(etag)
+        if modificado is not None:
+            response.last_modified = _utc(modificado)
+        return response
+
+
+# Instancia compartida por la aplicación y los controladores
+politica_cache = PoliticaCache()
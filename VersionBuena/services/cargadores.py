@@ -0,0 +1,46 @@
+class CargadorComentarios:
+    """
+    Carga los comentarios de varios casos con una sola consulta (en lugar de una por caso)
+    y los agrupa en memoria por id_caso. Con archivados=True se leen de comentarios_archivo.
+    """
+    CONSULTA = """
+        SELECT c.id_caso, c.texto, c.fecha_comentario, dp.nombre_completo AS tecnico
+        FROM {tabla} c
+        JOIN datos_personales dp ON c.id_tecnico = dp.id_datos
+        WHERE c.id_caso IN ({marcadores})
+        ORDER BY c.id_caso, c.fecha_comentario DESC
+    """
+
+    def __init__(self, tamano_lote=500):
+        self.tamano_lote = tamano_lote  # Máximo de ids por consulta, para no generar IN gigantes
+
+    def consulta(self, ids, archivados=False):
+        marcadores = ','.join(['%s'] * len(ids))
+        tabla = 'comentarios_archivo' if archivados else 'comentarios'
+        return self.CONSULTA.format(tabla=tabla, marcadores=marcadores), tuple(ids)
+
+    def cargar(self, cursor, ids_caso, archivados=False):
+        # Devuelve {id_caso: [comentarios...]} con una lista (posiblemente vacía) por cada id pedido
+        ids = list(dict.fromkeys(ids_caso))
+        resultado = {id_caso: [] for id_caso in ids}
+
+        for inicio in range(0, len(ids), self.tamano_lote):
+            cursor.execute(*self.consulta(ids[inicio:inicio + self.tamano_lote], archivados))
+            for fila in cursor.fetchall():
+                resultado[fila['id_caso']].append(fila)
+
+        return resultado
+
+    def cargar_en(self, cursor, casos, archivados=False):
+        # Añade la clave 'comentarios' a cada caso de la lista
+        comentarios = self.cargar(cursor, [caso['id_caso'] for caso in casos], archivados)
+        for caso in casos:
+            caso['comentarios'] = comentarios[caso['id_caso']]
+        return casos
+
+    def cargar_uno(self, cursor, id_caso, archivados=False):
+        return self.cargar(cursor, [id_caso], archivados)[id_caso]
+
+
+# Instancia compartida por los controladores
+cargador_comentarios = CargadorComentarios()
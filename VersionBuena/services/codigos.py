@@ -0,0 +1,97 @@
+import threading
+from datetime import datetime
+
+from db import get_cursor
+
+
+class AsignadorCodigos:
+    """
+    Genera los códigos de caso: prefijo, año y número correlativo (HD-2026-000123).
+    - El número sale de secuencias_codigo (una fila por año). En lugar de actualizar esa
+      fila en cada caso, cada proceso reserva un bloque de `tamano_bloque` números con una
+      sola sentencia (LAST_INSERT_ID devuelve el final del bloque en la misma conexión) y
+      lo reparte en memoria. La reserva se confirma en su propia transacción, así que la
+      fila de la secuencia no queda bloqueada mientras se inserta el caso.
+    - Los códigos son únicos y crecientes dentro de cada proceso; entre procesos se
+      intercalan por bloques, y los números no usados de un bloque (al reiniciar) se pierden.
+    """
+    def __init__(self, prefijo='HD', tamano_bloque=50, digitos=6):
+        self.prefijo = prefijo
+        self.tamano_bloque = tamano_bloque
+        self.digitos = digitos
+        self._lock = threading.Lock()
+        self._bloque = None  # (año, siguiente número, fin exclusivo)
+
+    def formatear(self, anio, numero):
+        return f'{self.prefijo}-{anio}-{numero:0{self.digitos}d}'
+
+    def reservar(self, cursor, anio, cantidad):
+        # Reserva `cantidad` números del año y devuelve el primero; el que llama confirma
+        cursor.execute("""
+            INSERT INTO secuencias_codigo (anio, siguiente)
+            VALUES (%s, LAST_INSERT_ID(1 + %s))
+            ON DUPLICATE KEY UPDATE siguiente = LAST_INSERT_ID(siguiente + %s)
+        """, (anio, cantidad, cantidad))
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        fin = cursor.fetchone()[0]
+        return fin - cantidad
+
+    def siguiente(self, fecha=None):
+        # Código para un caso nuevo creado en `fecha` (por defecto, ahora)
+        anio = (fecha or datetime.now()).year
+        with self._lock:
+            if self._bloque is None or self._bloque[0] != anio or self._bloque[1] >= self._bloque[2]:
+                with get_cursor() as (conn, cursor):
+                    inicio = self.reservar(cursor, anio, self.tamano_bloque)
+                    conn.commit()
+                self._bloque = (anio, inicio, inicio + self.tamano_bloque)
+            _, numero, fin = self._bloque
+            self._bloque = (anio, numero + 1, fin)
+        return self.formatear(anio, numero)
+
+    def consulta_provisionales(self, tabla, tamano_lote):
+        # El índice único de codigo_caso resuelve el LIKE de prefijo como un rango
+        return f"""
+            SELECT id_caso, YEAR(fecha_creacion)
+            FROM {tabla}
+            WHERE codigo_caso LIKE 'SIN-%%'
+            ORDER BY codigo_caso
+            LIMIT %s
+            FOR UPDATE
+        """, (tamano_lote,)
+
+    def rellenar(self, tamano_lote=500, progreso=None):
+        """
+        Asigna un código definitivo a los casos con código provisional ('SIN-...'), con el
+        año de su fecha de creación, en lotes de una transacción (la fila de la secuencia
+        solo queda bloqueada mientras dura cada lote). Incluye los casos archivados.
+        Devuelve la cantidad de casos actualizados.
+        """
+        actualizados = 0
+        with get_cursor() as (conn, cursor):
+            for tabla in ('casos', 'casos_archivo'):
+                while True:
+                    cursor.execute(*self.consulta_provisionales(tabla, tamano_lote))
+                    filas = sorted(cursor.fetchall())
+                    if not filas:
+                        conn.rollback()
+                        break
+
+                    por_anio = {}
+                    for id_caso, anio in filas:
+                        por_anio.setdefault(anio, []).append(id_caso)
+                    cambios = []
+                    for anio, ids in por_anio.items():
+                        inicio = self.reservar(cursor, anio, len(ids))
+                        cambios.extend((self.formatear(anio, inicio + i), id_caso) for i, id_caso in enumerate(ids))
+                    cursor.executemany(f"UPDATE {tabla} SET codigo_caso = %s WHERE id_caso = %s", cambios)
+                    conn.commit()
+
+                    actualizados += len(cambios)
+                    if progreso:
+                        progreso(actualizados)
+        return actualizados
+
+
+# Instancia compartida por los controladores y manage.py (cada proceso reserva sus bloques)
+asignador_codigos = AsignadorCodigos()
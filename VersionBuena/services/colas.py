@@ -0,0 +1,76 @@
+from services.dominio import ESTADOS, PRIORIDADES
+from services.paginacion import codificar_cursor, condicion_keyset
+
+
+class MotorColas:
+    """
+    Listado paginado de las colas de casos (pendientes, en proceso, resueltos).
+    Usa paginación por cursor sobre (fecha_creacion, id_caso), de modo que cada página
+    cuesta lo mismo sin importar cuántos casos haya antes. Con varias prioridades se hace
+    una búsqueda por prioridad (cada una usa el índice estado/prioridad/fecha) y se
+    combinan con UNION ALL en una sola consulta. La cola personal de un técnico (asignado)
+    usa del mismo modo el índice asignado/estado/prioridad/fecha.
+    """
+    LARGO_RESUMEN = 120  # Caracteres de la descripción que se incluyen como resumen
+
+    def __init__(self, tamano_pagina=50, maximo_pagina=200):
+        self.tamano_pagina = tamano_pagina
+        self.maximo_pagina = maximo_pagina
+
+    def normalizar_prioridades(self, prioridades):
+        # Filtra valores desconocidos; sin prioridades válidas se usa 'alta' como antes
+        validas = [p for p in PRIORIDADES if p in set(prioridades or [])]
+        return validas or ['alta']
+
+    def consulta(self, estado, prioridades, despues=None, limite=None, resumen=False, asignado=None):
+        # Devuelve (sql, parámetros, limite) de una página de la cola
+        if estado not in ESTADOS:
+            raise ValueError(f'Estado de cola desconocido: {estado}')
+        limite = max(1, min(limite or self.tamano_pagina, self.maximo_pagina))  # ?limite= negativo: LIMIT inválido
+        prioridades = self.normalizar_prioridades(prioridades)
+
+        columnas = "id_caso, codigo_caso, estado, asunto, prioridad, fecha_creacion, tipo_caso, version"
+        if resumen:
+            columnas += f", LEFT(descripcion, {self.LARGO_RESUMEN}) AS resumen"
+        filtro, parametros_filtro = condicion_keyset('fecha_creacion', 'id_caso', despues)
+        if asignado is not None:
+            filtro = " AND id_asignado = %s" + filtro
+            parametros_filtro = (asignado, *parametros_filtro)
+
+        subconsultas, parametros = [], []
+        for prioridad in prioridades:
+            subconsultas.append(f"""
+                (SELECT {columnas}
+                 FROM casos
+                 WHERE estado = %s AND prioridad = %s{filtro}
+                 ORDER BY fecha_creacion DESC, id_caso DESC
+                 LIMIT %s)
+            """)
+            parametros.extend([estado, prioridad, *parametros_filtro, limite + 1])
+
+        sql = ' UNION ALL '.join(subconsultas)
+        if len(subconsultas) > 1:
+            sql += " ORDER BY fecha_creacion DESC, id_caso DESC LIMIT %s"
+            parametros.append(limite + 1)
+        return sql, tuple(parametros), limite
+
+    def listar(self, cursor, estado, prioridades, despues=None, limite=None, resumen=False, asignado=None):
+        """
+        Devuelve (casos, siguiente) donde `siguiente` es el token de la próxima página
+        o None si no hay más casos. `despues` es el (fecha, id) decodificado del token.
+        Con resumen=True se añade 'resumen' con el inicio de la descripción; con `asignado`
+        solo se listan los casos asignados a ese técnico.
+        """
+        sql, parametros, limite = self.consulta(estado, prioridades, despues, limite, resumen, asignado)
+        cursor.execute(sql, parametros)
+        casos = cursor.fetchall()
+
+        siguiente = None
+        if len(casos) > limite:
+            casos = casos[:limite]
+            siguiente = codificar_cursor(casos[-1]['fecha_creacion'], casos[-1]['id_caso'])
+        return casos, siguiente
+
+
+# Instancia compartida por los controladores
+motor_colas = MotorColas()
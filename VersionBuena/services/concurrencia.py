@@ -0,0 +1,87 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from db import get_cursor
+
+log = logging.getLogger(__name__)
+
+
+class EjecutorConsultas:
+    """
+    Ejecuta consultas independientes de una misma petición en paralelo, cada una con su
+    propia conexión del pool, y espera los resultados con un presupuesto de tiempo.
+    Las que no terminan a tiempo se cancelan (si aún no empezaron) o se abandonan, y la
+    petición continúa con un valor por defecto para ellas. Para que una consulta
+    abandonada no siga ocupando el servidor, cada conexión recibe un límite de tiempo
+    por sentencia igual al presupuesto (MySQL: max_execution_time, MariaDB: max_statement_time).
+    """
+    def __init__(self, max_hilos=8):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='consultas')
+        self._variable_limite = None  # Se detecta con la primera conexión
+        self._lock = threading.Lock()
+
+    def _limitar(self, conn, cursor, segundos):
+        # Devuelve la sentencia que quita el límite, o None si el servidor no lo admite
+        with self._lock:
+            if self._variable_limite is None:
+                es_mariadb = 'mariadb' in (conn.get_server_info() or '').lower()
+                self._variable_limite = 'max_statement_time' if es_mariadb else 'max_execution_time'
+        variable = self._variable_limite
+        valor = segundos if variable == 'max_statement_time' else int(segundos * 1000)
+        try:
+            cursor.execute(f"SET SESSION {variable} = %s", (valor,))
+        except Exception:
+            return None
+        return f"SET SESSION {variable} = 0"
+
+    def _ejecutar(self, funcion, limite, solo_lectura):
+        with get_cursor(dictionary=True, solo_lectura=solo_lectura) as (conn, cursor):
+            restaurar = self._limitar(conn, cursor, limite) if limite else None
+            try:
+                return funcion(cursor)
+            finally:
+                if restaurar:
+                    # La conexión vuelve al pool: no debe quedar con el límite puesto. Si no se
+                    # puede quitar (p. ej. la consulta dejó la conexión rota), se cierra en lugar
+                    # de devolverla, sin tapar el resultado ni la excepción de `funcion`
+                    try:
+                        cursor.execute(restaurar)
+                    except Exception:
+                        log.exception('No se pudo quitar el límite de tiempo de la conexión; se descarta')
+                        conn.descartar()
+
+    def ejecutar(self, tareas, presupuesto, solo_lectura=False):
+        """
+        tareas: {nombre: (funcion(cursor), valor_por_defecto)}. Con solo_lectura=True las
+        consultas pueden ir a una réplica (ver db.get_cursor).
+        Devuelve (resultados, incompletas): resultados tiene un valor por cada nombre
+        (el por defecto si la tarea falló o no terminó en `presupuesto` segundos) e
+        incompletas es la lista de nombres afectados.
+        """
+        inicio = time.monotonic()
+        # Cada tarea corre en una copia del contexto de la petición (lectura propia de db.py)
+        futuros = {nombre: self._pool.submit(contextvars.copy_context().run, self._ejecutar,
+                                             funcion, presupuesto, solo_lectura)
+                   for nombre, (funcion, _) in tareas.items()}
+        wait(futuros.values(), timeout=max(0, presupuesto - (time.monotonic() - inicio)))
+
+        resultados, incompletas = {}, []
+        for nombre, futuro in futuros.items():
+            if futuro.done() and not futuro.cancelled() and futuro.exception() is None:
+                resultados[nombre] = futuro.result()
+            else:
+                if futuro.done() and not futuro.cancelled():
+                    log.warning('La consulta %s falló: %s', nombre, futuro.exception())
+                else:
+                    log.warning('La consulta %s no terminó en %.1f s', nombre, presupuesto)
+                futuro.cancel()
+                resultados[nombre] = tareas[nombre][1]
+                incompletas.append(nombre)
+        return resultados, incompletas
+
+
+# Instancia compartida por los controladores
+ejecutor_consultas = EjecutorConsultas()
@@ -0,0 +1,122 @@
+import json
+
+from db import get_cursor
+from services.estadisticas import estadisticas
+from services.paginacion import codificar_token
+from services.dominio import TIPOS_USUARIO
+from services.tareas import tarea
+
+# Columnas por las que se puede ordenar el directorio (nombre público -> expresión SQL).
+# La misma expresión ordena y compara con el valor del token. tipo_usuario es un ENUM: ORDER BY
+# lo ordenaría por posición y la comparación con el token, como texto; se usa su texto en ambos.
+ORDENES = {
+    'id_identity': 'u.id_identity',
+    'nombre_completo': 'd.nombre_completo',
+    'tipo_usuario': 'CAST(u.tipo_usuario AS CHAR)',
+}
+
+# Usuario a eliminar, con sus datos personales y su equipo
+CONSULTA_USUARIO_A_ELIMINAR = """
+    SELECT u.id_user, u.id_datos, u.tipo_usuario, d.id_equipo
+    FROM users u
+    JOIN datos_personales d ON u.id_datos = d.id_datos
+    WHERE u.id_identity = %s
+"""
+
+
+class DirectorioUsuarios:
+    """
+    Directorio de usuarios paginado por cursor y ordenable.
+    Las filas se leen con un cursor sin búfer (se traen del servidor a medida que se
+    escriben en la respuesta) y se envían como JSON por partes, de modo que la memoria
+    no depende del tamaño de la página.
+    """
+    def __init__(self, tamano_pagina=100, maximo_pagina=1000):
+        self.tamano_pagina = tamano_pagina
+        self.maximo_pagina = maximo_pagina
+
+    def consulta(self, orden='id_identity', descendente=False, tipo=None, despues=None, limite=None):
+        # Devuelve (sql, parámetros, limite) de una página del directorio
+        columna = ORDENES.get(orden, ORDENES['id_identity'])
+        limite = max(1, min(limite or self.tamano_pagina, self.maximo_pagina))  # ?limite= negativo: LIMIT inválido
+        comparador, sentido = ('<', 'DESC') if descendente else ('>', 'ASC')
+
+        condiciones, parametros = [], []
+        if tipo in TIPOS_USUARIO:
+            condiciones.append("u.tipo_usuario = %s")
+            parametros.append(tipo)
+        if despues is not None:
+            valor, id_user = despues
+            condiciones.append(f"({columna} {comparador} %s OR ({columna} = %s AND u.id_user {comparador} %s))")
+            parametros.extend([valor, valor, id_user])
+
+        where = ('WHERE ' + ' AND '.join(condiciones)) if condiciones else ''
+        sql = f"""
+            SELECT u.id_user, u.id_identity, u.tipo_usuario,
+                   d.nombre_completo, d.correo
+            FROM users u
+            JOIN datos_personales d ON u.id_datos = d.id_datos
+            {where}
+            ORDER BY {columna} {sentido}, u.id_user {sentido}
+            LIMIT %s
+        """
+        # Se pide una fila más para saber si existe una página siguiente
+        parametros.append(limite + 1)
+        return sql, tuple(parametros), limite
+
+    def transmitir(self, orden='id_identity', descendente=False, tipo=None, despues=None, limite=None):
+        """
+        Generador que produce el JSON {"usuarios": [...], "siguiente": token|null} por partes.
+        Debe consumirse dentro de la respuesta (stream_with_context) para que la conexión
+        se libere al terminar.
+        """
+        sql, parametros, limite = self.consulta(orden, descendente, tipo, despues, limite)
+        clave = orden if orden in ORDENES else 'id_identity'
+
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            cursor.execute(sql, parametros)
+            yield '{"usuarios": ['
+            enviados = 0
+            ultimo = None
+            for fila in cursor:
+                if enviados == limite:
+                    # Fila extra: solo indica que hay otra página
+                    siguiente = codificar_token(ultimo[clave], ultimo['id_user'])
+                    break
+                yield (',' if enviados else '') + json.dumps(fila, ensure_ascii=False)
+                enviados += 1
+                ultimo = fila
+            else:
+                siguiente = None
+        yield '], "siguiente": ' + json.dumps(siguiente) + '}'
+
+
+def eliminar_usuario(cursor, id_identity):
+    """
+    Elimina un usuario y su información personal, sin confirmar. Devuelve (encontrado, id_equipo):
+    el equipo no se toca aquí, lo borra después la tarea 'eliminar_equipo' si nadie más lo usa.
+    Espera un cursor de diccionario.
+    """
+    cursor.execute(CONSULTA_USUARIO_A_ELIMINAR, (id_identity,))
+    result = cursor.fetchone()
+    if result is None:
+        return False, None
+
+    cursor.execute("DELETE FROM users WHERE id_user = %s", (result['id_user'],))
+    cursor.execute("DELETE FROM datos_personales WHERE id_datos = %s", (result['id_datos'],))
+    estadisticas.registrar_usuario(cursor, result['tipo_usuario'], -1)
+    return True, result['id_equipo']
+
+
+@tarea('eliminar_equipo')
+def eliminar_equipo(id_equipo):
+    # Borra el equipo de un usuario eliminado si no está asociado a más personas
+    with get_cursor(dictionary=True) as (conn, cursor):
+        cursor.execute("SELECT COUNT(*) AS cantidad FROM datos_personales WHERE id_equipo = %s", (id_equipo,))
+        if cursor.fetchone()['cantidad'] == 0:
+            cursor.execute("DELETE FROM equipos WHERE id_equipo = %s", (id_equipo,))
+        conn.commit()
+
+
+# Instancia compartida por los controladores
+directorio = DirectorioUsuarios()
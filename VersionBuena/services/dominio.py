@@ -0,0 +1,16 @@
+# Valores de las columnas ENUM del esquema, definidos una sola vez para todos los servicios.
+# Este módulo no importa nada del proyecto, así que cualquier servicio puede usarlo sin crear
+# importaciones circulares (flujo.py, con TRANSICIONES, importa estadísticas, SLA y asignación).
+# Un valor nuevo se agrega aquí y en el ENUM de la tabla correspondiente (con una migración).
+
+# casos.estado, en el orden del flujo (ver TRANSICIONES en services/flujo.py)
+ESTADOS = ('pendiente', 'proceso', 'resuelto')
+
+# casos.prioridad, de la más urgente a la menos
+PRIORIDADES = ('alta', 'media', 'baja')
+
+# casos.tipo_caso
+TIPOS_CASO = ('incidencia', 'solicitud')
+
+# users.tipo_usuario
+TIPOS_USUARIO = ('administrador', 'usuario', 'tecnico')
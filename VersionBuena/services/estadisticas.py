@@ -0,0 +1,154 @@
+from db import get_cursor
+from services.dominio import ESTADOS, TIPOS_USUARIO
+
+
+class EstadisticasCasos:
+    """
+    Contadores precalculados de casos y usuarios.
+    Las tablas `estadisticas_casos` (estado x prioridad x tipo_caso), `casos_por_dia`
+    y `estadisticas_usuarios` se actualizan dentro de la misma transacción que la
+    escritura que las modifica, de modo que los dashboards leen un puñado de filas
+    en lugar de recorrer todo el historial.
+    """
+
+    # ---- Actualización (recibe el cursor de la transacción en curso) ----
+
+    def registrar_creacion(self, cursor, estado, prioridad, tipo_caso, fecha):
+        cursor.execute("""
+            INSERT INTO estadisticas_casos (estado, prioridad, tipo_caso, cantidad)
+            VALUES (%s, %s, %s, 1)
+            ON DUPLICATE KEY UPDATE cantidad = cantidad + 1
+        """, (estado, prioridad, tipo_caso))
+        cursor.execute("""
+            INSERT INTO casos_por_dia (fecha, cantidad)
+            VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE cantidad = cantidad + 1
+        """, (fecha.date(),))
+
+    def registrar_movimientos(self, cursor, movimientos):
+        # movimientos: {(estado, prioridad, tipo_caso): diferencia}; una sola sentencia para todo el lote
+        filas = [(*clave, cantidad) for clave, cantidad in movimientos.items() if cantidad]
+        if not filas:
+            return
+        cursor.executemany("""
+            INSERT INTO estadisticas_casos (estado, prioridad, tipo_caso, cantidad)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)
+        """, filas)
+
+    def registrar_usuario(self, cursor, tipo_usuario, cantidad=1):
+        # cantidad negativa al eliminar usuarios
+        cursor.execute("""
+            INSERT INTO estadisticas_usuarios (tipo_usuario, cantidad)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)
+        """, (tipo_usuario, cantidad))
+
+    # ---- Lectura ----
+
+    def casos_por_estado(self, cursor):
+        cursor.execute("""
+            SELECT estado, SUM(cantidad) AS cantidad
+            FROM estadisticas_casos
+            GROUP BY estado
+        """)
+        conteo = {estado: 0 for estado in ESTADOS}
+        for fila in cursor.fetchall():
+            conteo[fila['estado']] = int(fila['cantidad'])
+        return conteo
+
+    def usuarios_por_tipo(self, cursor):
+        cursor.execute("SELECT tipo_usuario, cantidad FROM estadisticas_usuarios")
+        conteo = {tipo: 0 for tipo in TIPOS_USUARIO}
+        for fila in cursor.fetchall():
+            conteo[fila['tipo_usuario']] = int(fila['cantidad'])
+        return conteo
+
+    def tendencia(self, cursor):
+        # Lista de (fecha, casos creados ese día) en orden cronológico
+        cursor.execute("SELECT fecha, cantidad FROM casos_por_dia ORDER BY fecha")
+        return [(fila['fecha'], int(fila['cantidad'])) for fila in cursor.fetchall()]
+
+    # ---- Reconstrucción y conciliación ----
+
+    # Los contadores incluyen los casos archivados (ver services/archivo.py)
+    TODOS_LOS_CASOS = """(
+        SELECT estado, prioridad, tipo_caso, fecha_creacion FROM casos
+        UNION ALL
+        SELECT estado, prioridad, tipo_caso, fecha_creacion FROM casos_archivo
+    ) c"""
+
+    def _conteos_reales(self, cursor):
+        cursor.execute(f"""
+            SELECT estado, prioridad, tipo_caso, COUNT(*) AS cantidad
+            FROM {self.TODOS_LOS_CASOS}
+            GROUP BY estado, prioridad, tipo_caso
+        """)
+        casos = {(f['estado'], f['prioridad'], f['tipo_caso']): f['cantidad'] for f in cursor.fetchall()}
+
+        cursor.execute(f"""
+            SELECT DATE(fecha_creacion) AS fecha, COUNT(*) AS cantidad
+            FROM {self.TODOS_LOS_CASOS}
+            GROUP BY DATE(fecha_creacion)
+        """)
+        dias = {f['fecha']: f['cantidad'] for f in cursor.fetchall()}
+
+        cursor.execute("SELECT tipo_usuario, COUNT(*) AS cantidad FROM users GROUP BY tipo_usuario")
+        usuarios = {f['tipo_usuario']: f['cantidad'] for f in cursor.fetchall()}
+        return casos, dias, usuarios
+
+    def _conteos_guardados(self, cursor):
+        cursor.execute("SELECT estado, prioridad, tipo_caso, cantidad FROM estadisticas_casos")
+        casos = {(f['estado'], f['prioridad'], f['tipo_caso']): f['cantidad'] for f in cursor.fetchall()}
+        cursor.execute("SELECT fecha, cantidad FROM casos_por_dia")
+        dias = {f['fecha']: f['cantidad'] for f in cursor.fetchall()}
+        cursor.execute("SELECT tipo_usuario, cantidad FROM estadisticas_usuarios")
+        usuarios = {f['tipo_usuario']: f['cantidad'] for f in cursor.fetchall()}
+        return casos, dias, usuarios
+
+    def verificar(self):
+        """
+        Compara los contadores con las tablas de origen.
+        Devuelve una lista de (tabla, clave, guardado, real) con las diferencias encontradas.
+        """
+        with get_cursor(dictionary=True) as (conn, cursor):
+            reales = self._conteos_reales(cursor)
+            guardados = self._conteos_guardados(cursor)
+
+        tablas = ('estadisticas_casos', 'casos_por_dia', 'estadisticas_usuarios')
+        diferencias = []
+        for tabla, real, guardado in zip(tablas, reales, guardados):
+            for clave in sorted(set(real) | set(guardado), key=str):
+                if real.get(clave, 0) != guardado.get(clave, 0):
+                    diferencias.append((tabla, clave, guardado.get(clave, 0), real.get(clave, 0)))
+        return diferencias
+
+    def reconstruir(self):
+        # Recalcula todos los contadores desde cero en una sola transacción
+        with get_cursor(dictionary=True) as (conn, cursor):
+            cursor.execute("DELETE FROM estadisticas_casos")
+            cursor.execute(f"""
+                INSERT INTO estadisticas_casos (estado, prioridad, tipo_caso, cantidad)
+                SELECT estado, prioridad, tipo_caso, COUNT(*)
+                FROM {self.TODOS_LOS_CASOS}
+                GROUP BY estado, prioridad, tipo_caso
+            """)
+            cursor.execute("DELETE FROM casos_por_dia")
+            cursor.execute(f"""
+                INSERT INTO casos_por_dia (fecha, cantidad)
+                SELECT DATE(fecha_creacion), COUNT(*)
+                FROM {self.TODOS_LOS_CASOS}
+                GROUP BY DATE(fecha_creacion)
+            """)
+            cursor.execute("DELETE FROM estadisticas_usuarios")
+            cursor.execute("""
+                INSERT INTO estadisticas_usuarios (tipo_usuario, cantidad)
+                SELECT tipo_usuario, COUNT(*)
+                FROM users
+                GROUP BY tipo_usuario
+            """)
+            conn.commit()
+
+
+# Instancia compartida por los controladores
+estadisticas = EstadisticasCasos()
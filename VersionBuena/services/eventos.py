@@ -0,0 +1,112 @@
+import itertools
+import queue
+import threading
+from collections import deque
+
+
+class Suscripcion:
+    """Cola de eventos de un cliente. Si se llena (cliente lento), queda marcada como desbordada."""
+    def __init__(self, bus, maximo):
+        self._bus = bus
+        self._cola = queue.Queue(maxsize=maximo)
+        self.desbordada = False
+
+    def _entregar(self, evento):
+        try:
+            self._cola.put_nowait(evento)
+        except queue.Full:
+            self.desbordada = True
+
+    def esperar(self, timeout):
+        # Devuelve el siguiente evento o None si no llegó ninguno en `timeout` segundos
+        try:
+            return self._cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cerrar(self):
+        self._bus._retirar(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class BusEventos:
+    """
+    Bus de eventos en memoria del proceso.
+    Cada evento es (id, tipo, datos) con id creciente. Se guardan los últimos `historial`
+    eventos para que un cliente que se reconecta (Last-Event-ID) reciba lo que se perdió.
+    Los oyentes registrados con escuchar() se llaman de forma síncrona al publicar;
+    las suscripciones (conexiones SSE) reciben los eventos en su propia cola.
+    Solo conecta peticiones del mismo proceso: con varios procesos cada uno tiene su bus.
+    """
+    def __init__(self, historial=1000, maximo_por_suscripcion=500):
+        self.maximo_por_suscripcion = maximo_por_suscripcion
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._historial = deque(maxlen=historial)
+        self._suscripciones = set()
+        self._oyentes = []
+
+    def publicar(self, tipo, datos):
+        with self._lock:
+            evento = (next(self._ids), tipo, datos)
+            self._historial.append(evento)
+            suscripciones = list(self._suscripciones)
+            oyentes = list(self._oyentes)
+        for suscripcion in suscripciones:
+            suscripcion._entregar(evento)
+        for tipos, funcion in oyentes:
+            if tipos is None or tipo in tipos:
+                funcion(*evento)
+        return evento[0]
+
+    def escuchar(self, funcion, tipos=None):
+        # Registra funcion(id, tipo, datos) para los eventos de los tipos indicados (None: todos)
+        with self._lock:
+            self._oyentes.append((set(tipos) if tipos else None, funcion))
+
+    def suscribir(self, desde=None):
+        """
+        Crea una suscripción. Con `desde` (último id recibido) se reenvían primero los
+        eventos posteriores que sigan en el historial; si ya no están todos, la
+        suscripción empieza desbordada para que el cliente recargue.
+        """
+        suscripcion = Suscripcion(self, self.maximo_por_suscripcion)
+        with self._lock:
+            if desde is not None:
+                pendientes = [e for e in self._historial if e[0] > desde]
+                ultimo = self._historial[-1][0] if self._historial else 0
+                # Faltan eventos si el historial ya no los tiene o si el proceso se reinició
+                if desde > ultimo or (pendientes and pendientes[0][0] > desde + 1):
+                    suscripcion.desbordada = True
+                for evento in pendientes:
+                    suscripcion._entregar(evento)
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def _retirar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def suscriptores(self):
+        with self._lock:
+            return len(self._suscripciones)
+
+
+# Instancia compartida por los controladores y servicios
+bus_eventos = BusEventos()
+
+
+def publicar_casos(cambios):
+    """
+    Publica un evento 'caso' por cada caso creado o modificado. Cada cambio es un dict con
+    id_caso, codigo_caso, estado, prioridad, asunto, fecha_creacion, tipo_caso, version y,
+    si el caso ya existía, estado_anterior y prioridad_anterior.
+    Debe llamarse después de confirmar la transacción.
+    """
+    for cambio in cambios:
+        bus_eventos.publicar('caso', cambio)
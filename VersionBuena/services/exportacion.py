@@ -0,0 +1,219 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from db import get_cursor
+from services.cargadores import cargador_comentarios
+from services.dominio import ESTADOS, PRIORIDADES
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Columnas de cada caso exportado (la misma unión que el detalle del caso del administrador)
+COLUMNAS = (
+    'id_caso', 'codigo_caso', 'estado', 'prioridad', 'tipo_caso', 'asunto', 'descripcion',
+    'fecha_creacion', 'id_usuario', 'nombre_completo', 'telefono', 'correo',
+    'nombre_equipo', 'marca', 'modelo', 'serial',
+)
+
+
+class ErrorExportacion(Exception):
+    """Se lanza cuando los filtros o el formato pedido no son válidos."""
+
+
+def leer_fecha(texto):
+    # 'AAAA-MM-DD' -> date; None o vacío -> None
+    if not texto:
+        return None
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').date()
+    except ValueError:
+        raise ErrorExportacion(f'Fecha inválida: {texto} (se espera AAAA-MM-DD)')
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f'Tipo no serializable: {type(valor).__name__}')
+
+
+class _SalidaIncremental(io.RawIOBase):
+    """
+    Destino de escritura para pyarrow que se vacía después de cada grupo de filas.
+    Lleva la cuenta de los bytes escritos para que los desplazamientos del pie
+    del archivo Parquet sigan siendo correctos aunque el contenido ya se haya enviado.
+    """
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def extraer(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+class Exportador:
+    """
+    Exportación masiva de casos con los datos del solicitante y sus comentarios.
+    Los casos se leen en lotes de tamaño fijo, cada uno a partir del último id_caso del
+    anterior, y los comentarios de cada lote por la misma conexión. Cada lote se escribe y
+    se entrega antes de leer el siguiente, así que la memoria no depende de la cantidad de
+    filas. Todo se lee en una transacción de solo lectura con instantánea consistente: en
+    InnoDB no bloquea las tablas y los comentarios corresponden al mismo momento que los casos.
+    Se exportan primero los casos archivados y después los vigentes.
+    """
+    def __init__(self, tamano_lote=1000):
+        self.tamano_lote = tamano_lote
+
+    def consulta(self, desde=None, hasta=None, estados=None, prioridades=None, archivados=False, despues=None):
+        # Devuelve (sql, parámetros) de un lote; `hasta` es inclusive. archivados=True lee de
+        # casos_archivo; `despues` es el último id_caso del lote anterior
+        condiciones, parametros = [], []
+        if despues is not None:
+            condiciones.append("c.id_caso > %s")
+            parametros.append(despues)
+        if desde:
+            condiciones.append("c.fecha_creacion >= %s")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("c.fecha_creacion < %s")
+            parametros.append(hasta + timedelta(days=1))
+        for columna, valores, permitidos in (('c.estado', estados, ESTADOS),
+                                             ('c.prioridad', prioridades, PRIORIDADES)):
+            valores = [v for v in valores or [] if v]  # Las opciones vacías del formulario significan "todos"
+            if valores:
+                desconocidos = set(valores) - set(permitidos)
+                if desconocidos:
+                    raise ErrorExportacion(f'Valores no válidos para {columna[2:]}: {", ".join(sorted(desconocidos))}')
+                condiciones.append(f"{columna} IN ({','.join(['%s'] * len(valores))})")
+                parametros.extend(valores)
+
+        where = ('WHERE ' + ' AND '.join(condiciones)) if condiciones else ''
+        sql = f"""
+            SELECT c.id_caso, c.codigo_caso, c.estado, c.prioridad, c.tipo_caso, c.asunto, c.descripcion,
+                   c.fecha_creacion, c.id_usuario, d.nombre_completo, d.telefono, d.correo,
+                   e.nombre_equipo, e.marca, e.modelo, e.serial
+            FROM {'casos_archivo' if archivados else 'casos'} c
+            JOIN users u ON c.id_usuario = u.id_user
+            JOIN datos_personales d ON u.id_datos = d.id_datos
+            LEFT JOIN equipos e ON d.id_equipo = e.id_equipo
+            {where}
+            ORDER BY c.id_caso
+            LIMIT %s
+        """
+        return sql, (*parametros, self.tamano_lote)
+
+    def lotes(self, desde=None, hasta=None, estados=None, prioridades=None):
+        # Generador de listas de casos (cada uno con su clave 'comentarios')
+        # Lectura larga: va a una réplica si hay alguna al día. Casos y comentarios usan la misma
+        # conexión, así que salen del mismo servidor (dos réplicas pueden tener retrasos distintos)
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            conn.start_transaction(consistent_snapshot=True, readonly=True)
+            for archivados in (True, False):
+                despues = None
+                while True:
+                    cursor.execute(*self.consulta(desde, hasta, estados, prioridades, archivados, despues))
+                    casos = cursor.fetchall()
+                    if not casos:
+                        break
+                    despues = casos[-1]['id_caso']
+                    yield cargador_comentarios.cargar_en(cursor, casos, archivados)
+
+    def transmitir(self, formato, desde=None, hasta=None, estados=None, prioridades=None):
+        """
+        Generador de bytes con la exportación en el formato pedido (csv, ndjson o parquet).
+        Los filtros se validan antes de producir el primer byte.
+        """
+        if formato not in FORMATOS:
+            raise ErrorExportacion(f'Formato desconocido: {formato}')
+        escribir = getattr(self, '_' + formato)
+        # Validar ahora y no al empezar a consumir el generador
+        self.consulta(desde, hasta, estados, prioridades)
+        if formato == 'parquet':
+            self._esquema_parquet()
+        return escribir(self.lotes(desde, hasta, estados, prioridades))
+
+    def _csv(self, lotes):
+        # Un caso por fila; los comentarios se unen en una sola celda, del más reciente al más antiguo
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(COLUMNAS + ('cantidad_comentarios', 'comentarios'))
+        yield ('\ufeff' + buffer.getvalue()).encode('utf-8')  # BOM para que Excel reconozca UTF-8
+        for casos in lotes:
+            buffer.seek(0)
+            buffer.truncate()
+            for caso in casos:
+                comentarios = '\n'.join(f"[{c['fecha_comentario']}] {c['tecnico']}: {c['texto']}"
+                                        for c in caso['comentarios'])
+                escritor.writerow([caso[col] for col in COLUMNAS] + [len(caso['comentarios']), comentarios])
+            yield buffer.getvalue().encode('utf-8')
+
+    def _ndjson(self, lotes):
+        # Un objeto JSON por línea, con los comentarios anidados
+        for casos in lotes:
+            lineas = []
+            for caso in casos:
+                caso['comentarios'] = [{k: c[k] for k in ('fecha_comentario', 'tecnico', 'texto')}
+                                       for c in caso['comentarios']]
+                lineas.append(json.dumps(caso, ensure_ascii=False, default=_valor_json))
+            yield ('\n'.join(lineas) + '\n').encode('utf-8')
+
+    def _esquema_parquet(self):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ErrorExportacion('La exportación a Parquet necesita el paquete pyarrow (pip install pyarrow)')
+
+        texto = pa.string()
+        return pa.schema([
+            ('id_caso', pa.int64()), ('codigo_caso', texto), ('estado', texto), ('prioridad', texto),
+            ('tipo_caso', texto), ('asunto', texto), ('descripcion', texto),
+            ('fecha_creacion', pa.timestamp('s')), ('id_usuario', pa.int64()),
+            ('nombre_completo', texto), ('telefono', texto), ('correo', texto),
+            ('nombre_equipo', texto), ('marca', texto), ('modelo', texto), ('serial', texto),
+            ('comentarios', pa.list_(pa.struct([
+                ('fecha_comentario', pa.timestamp('s')), ('tecnico', texto), ('texto', texto),
+            ]))),
+        ])
+
+    def _parquet(self, lotes):
+        # Un grupo de filas por lote; el pie del archivo se escribe al cerrar
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        esquema = self._esquema_parquet()
+        salida = _SalidaIncremental()
+        escritor = pq.ParquetWriter(salida, esquema, compression='snappy')
+        try:
+            for casos in lotes:
+                filas = [dict({col: caso[col] for col in COLUMNAS},
+                              comentarios=[{k: c[k] for k in ('fecha_comentario', 'tecnico', 'texto')}
+                                           for c in caso['comentarios']])
+                         for caso in casos]
+                escritor.write_table(pa.Table.from_pylist(filas, schema=esquema))
+                yield salida.extraer()
+        finally:
+            escritor.close()
+        yield salida.extraer()
+
+
+# Instancia compartida por los controladores y manage.py
+exportador = Exportador()
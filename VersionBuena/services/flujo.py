@@ -0,0 +1,171 @@
+from collections import Counter
+
+from services.dominio import ESTADOS, PRIORIDADES
+from services.estadisticas import estadisticas
+from services.sla import motor_sla
+from services.asignacion import asignador_casos
+
+# Máquina de estados de los casos: estado actual -> estados a los que puede pasar.
+# Un caso avanza pendiente -> proceso -> resuelto; solo un caso resuelto vuelve atrás (reapertura)
+TRANSICIONES = {
+    'pendiente': ('proceso',),
+    'proceso': ('resuelto',),
+    'resuelto': ('pendiente', 'proceso'),
+}
+
+# Reabrir un caso resuelto exige un comentario que explique el motivo
+REAPERTURAS = {('resuelto', 'pendiente'), ('resuelto', 'proceso')}
+
+
+class ErrorTransicion(Exception):
+    """Se lanza cuando un cambio de estado no está permitido."""
+
+
+class FlujoCasos:
+    """
+    Cambios de estado y de prioridad de los casos, de uno en uno o por lotes.
+    - Solo se permiten las transiciones de TRANSICIONES.
+    - Concurrencia optimista: cada caso tiene una columna `version` que se incrementa en
+      cada cambio. Cada pedido lleva la versión que vio el técnico; si ya no coincide (o
+      falta), el caso se informa como conflicto y no se modifica.
+    - Un lote se resuelve con pocas sentencias de varias filas (SELECT ... FOR UPDATE,
+      un UPDATE, un INSERT de comentarios y la actualización de contadores) dentro de la
+      transacción del que llama, que es quien confirma con conn.commit().
+    - Cada lote actualiza también los plazos y el historial de SLA (services/sla.py) y, al
+      resolver, la afinidad de los técnicos con los equipos (services/asignacion.py).
+    """
+    def __init__(self, tamano_lote=500):
+        self.tamano_lote = tamano_lote
+
+    def transiciones(self, estado):
+        return TRANSICIONES.get(estado, ())
+
+    def validar(self, estado_actual, estado_nuevo, comentario=None):
+        if estado_nuevo not in self.transiciones(estado_actual):
+            raise ErrorTransicion(f'No se puede pasar de {estado_actual} a {estado_nuevo}')
+        if (estado_actual, estado_nuevo) in REAPERTURAS and not comentario:
+            raise ErrorTransicion('Para reabrir un caso resuelto hace falta un comentario')
+
+    def consulta_bloqueo(self, ids):
+        marcadores = ','.join(['%s'] * len(ids))
+        return f"""
+            SELECT id_caso, codigo_caso, estado, prioridad, tipo_caso, version, asunto, fecha_creacion, id_asignado
+            FROM casos
+            WHERE id_caso IN ({marcadores})
+            FOR UPDATE
+        """, tuple(ids)
+
+    def _bloquear(self, cursor, ids):
+        # Lee y bloquea los casos hasta el fin de la transacción
+        casos = {}
+        for inicio in range(0, len(ids), self.tamano_lote):
+            cursor.execute(*self.consulta_bloqueo(ids[inicio:inicio + self.tamano_lote]))
+            for fila in cursor.fetchall():
+                casos[fila['id_caso']] = fila
+        return casos
+
+    def _aplicar(self, cursor, pedidos, validar, asignacion, id_tecnico, comentario, antes_de_actualizar=None):
+        """
+        pedidos: {id_caso: version vista}. validar(caso) lanza ErrorTransicion si el
+        caso no admite el cambio. asignacion: (columna, valor) que se escribe en los válidos.
+        antes_de_actualizar(cursor, ids) se llama con cada lote antes de su UPDATE.
+        """
+        resultado = {'actualizados': [], 'conflictos': [], 'invalidos': [], 'no_encontrados': [], 'cambios': []}
+        casos = self._bloquear(cursor, list(pedidos))
+
+        validos = []
+        for id_caso, version in pedidos.items():
+            caso = casos.get(id_caso)
+            if caso is None:
+                resultado['no_encontrados'].append(id_caso)
+            elif version != caso['version']:
+                resultado['conflictos'].append(caso['codigo_caso'])
+            else:
+                try:
+                    validar(caso)
+                except ErrorTransicion as e:
+                    resultado['invalidos'].append({'codigo_caso': caso['codigo_caso'], 'motivo': str(e)})
+                else:
+                    validos.append(caso)
+
+        columna, valor = asignacion
+        movimientos = Counter()
+        for inicio in range(0, len(validos), self.tamano_lote):
+            lote = validos[inicio:inicio + self.tamano_lote]
+            marcadores = ','.join(['%s'] * len(lote))
+            if antes_de_actualizar:
+                antes_de_actualizar(cursor, [c['id_caso'] for c in lote])
+            # Las filas están bloqueadas, así que la versión leída sigue siendo la vigente
+            cursor.execute(f"""
+                UPDATE casos SET {columna} = %s, version = version + 1
+                WHERE id_caso IN ({marcadores})
+            """, (valor, *[c['id_caso'] for c in lote]))
+
+            if comentario:
+                cursor.executemany("""
+                    INSERT INTO comentarios (id_caso, id_tecnico, texto, fecha_comentario)
+                    VALUES (%s, %s, %s, NOW())
+                """, [(c['id_caso'], id_tecnico, comentario) for c in lote])
+
+        for caso in validos:
+            anterior = (caso['estado'], caso['prioridad'], caso['tipo_caso'])
+            nuevo = dict(caso, **{columna: valor})
+            movimientos[anterior] -= 1
+            movimientos[(nuevo['estado'], nuevo['prioridad'], nuevo['tipo_caso'])] += 1
+            resultado['actualizados'].append(caso['codigo_caso'])
+            # Para publicar en el bus de eventos una vez confirmada la transacción
+            resultado['cambios'].append(dict(nuevo, version=caso['version'] + 1,
+                                             estado_anterior=caso['estado'], prioridad_anterior=caso['prioridad'],
+                                             asignado_anterior=caso['id_asignado']))
+        estadisticas.registrar_movimientos(cursor, movimientos)
+        return resultado
+
+    def cambiar_estado(self, cursor, pedidos, estado_nuevo, id_tecnico, comentario=None):
+        """
+        Cambia el estado de uno o varios casos. `pedidos` es {id_caso: version}, con la versión
+        que vio el técnico. Devuelve {'actualizados', 'conflictos', 'invalidos', 'no_encontrados',
+        'cambios'}; 'cambios' son los casos modificados, para services.eventos.publicar_casos().
+        El comentario, si lo hay, se añade a cada caso actualizado.
+        """
+        if estado_nuevo not in ESTADOS:
+            raise ErrorTransicion(f'Estado desconocido: {estado_nuevo}')
+        validar = lambda caso: self.validar(caso['estado'], estado_nuevo, comentario)
+
+        def antes_de_actualizar(cursor, ids):
+            motor_sla.al_cambiar_estado(cursor, ids, estado_nuevo, id_tecnico)
+            if estado_nuevo == 'resuelto':
+                asignador_casos.al_resolver(cursor, ids, id_tecnico)
+        return self._aplicar(cursor, pedidos, validar, ('estado', estado_nuevo), id_tecnico, comentario,
+                             antes_de_actualizar)
+
+    def cambiar_prioridad(self, cursor, pedidos, prioridad, id_tecnico, comentario=None):
+        # Reclasifica casos no resueltos en otra cola de prioridad
+        if prioridad not in PRIORIDADES:
+            raise ErrorTransicion(f'Prioridad desconocida: {prioridad}')
+
+        def validar(caso):
+            if caso['estado'] == 'resuelto':
+                raise ErrorTransicion('Un caso resuelto no cambia de prioridad')
+            if caso['prioridad'] == prioridad:
+                raise ErrorTransicion(f'El caso ya tiene prioridad {prioridad}')
+        sla = lambda cursor, ids: motor_sla.al_cambiar_prioridad(cursor, ids, prioridad)
+        return self._aplicar(cursor, pedidos, validar, ('prioridad', prioridad), id_tecnico, comentario, sla)
+
+    def asignar(self, cursor, pedidos, id_asignado, id_tecnico, comentario=None):
+        # Pasa casos no resueltos a la cola personal de otro técnico (id_asignado None: sin asignar)
+        def validar(caso):
+            if caso['estado'] == 'resuelto':
+                raise ErrorTransicion('Un caso resuelto no se reasigna')
+            if caso['id_asignado'] == id_asignado:
+                raise ErrorTransicion('El caso ya está asignado a ese técnico')
+        return self._aplicar(cursor, pedidos, validar, ('id_asignado', id_asignado), id_tecnico, comentario)
+
+    def comentar(self, cursor, id_caso, id_tecnico, comentario):
+        cursor.execute("""
+            INSERT INTO comentarios (id_caso, id_tecnico, texto, fecha_comentario)
+            VALUES (%s, %s, %s, NOW())
+        """, (id_caso, id_tecnico, comentario))
+
+
+# Instancia compartida por los controladores
+flujo_casos = FlujoCasos()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from db import get_cursor
+from services import svg
+from services.estadisticas import estadisticas
+from services.eventos import bus_eventos
+from services.metricas import instrumentacion
+
+log = logging.getLogger(__name__)
+
+# Formato de las gráficas del dashboard:
+# - 'svg': se dibujan sin dependencias (services/svg.py);
+# - 'png': con matplotlib (services/analitica.py), que solo se importa al generar la primera.
+graficas_config = {
+    'formato': 'svg',
+}
+
+TIPOS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+
+def datos_graficas(conteo_estado, tendencia):
+    # Datos de las tres gráficas; también se sirven como JSON para dibujarlas en el navegador
+    acumulado = 0
+    serie = []
+    for fecha, cantidad in tendencia:
+        acumulado += cantidad
+        serie.append({'fecha': fecha, 'cantidad': cantidad, 'acumulado': acumulado})
+    return {
+        'estados': [{'estado': estado, 'cantidad': cantidad} for estado, cantidad in conteo_estado.items() if cantidad > 0],
+        'tendencia': serie,
+    }
+
+
+def dibujar_svg(datos):
+    estados = [fila['estado'] for fila in datos['estados']]
+    cantidades = [fila['cantidad'] for fila in datos['estados']]
+    return {
+        'pie': svg.torta("Distribución de Casos", estados, cantidades),
+        'bar': svg.barras("Casos por Estado", estados, cantidades),
+        'line': svg.linea("Tendencia de Casos", [str(fila['fecha']) for fila in datos['tendencia']],
+                          [fila['acumulado'] for fila in datos['tendencia']], "Fecha", "Cantidad Acumulada"),
+    }
+
+
+class CacheGraficas:
+    """
+    Mantiene en memoria las gráficas del dashboard del técnico (SVG o PNG según
+    graficas_config) y sus datos en JSON.
+    Las gráficas se dibujan en un hilo de fondo, como máximo una vez por cada cambio
+    en la tabla `casos` (se invalidan con cada evento 'caso' del bus de eventos). Para recoger cambios hechos por otros
+    procesos, una versión con más de `max_edad` segundos también se considera vencida.
+    """
+    NOMBRES = ('pie', 'bar', 'line')
+
+    def __init__(self, max_edad=300, espera=10, config=graficas_config):
+        self.max_edad = max_edad  # Segundos que una versión se considera vigente
+        self.espera = espera      # Segundos que una petición espera la primera generación
+        self.config = config
+
+        self._cond = threading.Condition()
+        self._version = 0            # Se incrementa con cada escritura en casos
+        self._version_generada = -1  # Versión de los datos con la que se dibujaron las gráficas
+        self._generada_en = 0.0      # time.monotonic() de la última generación
+        self._ultima_modificacion = None  # time.time() de la última generación, para Last-Modified
+        self._graficas = {}          # nombre -> (contenido, tipo, etag); 'datos' es el JSON
+        self._solicitada = False
+        self._hilo = None
+
+    def invalidar(self):
+        # Se llama después de cada escritura que cambia los datos de las gráficas
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+
+    def solicitar(self):
+        # Pide al hilo de fondo que regenere las gráficas si están vencidas, sin esperar
+        self._iniciar_hilo()
+        with self._cond:
+            if self._vencida():
+                self._solicitada = True
+                self._cond.notify_all()
+
+    @property
+    def extension(self):
+        return self.config['formato']
+
+    def obtener(self, nombre):
+        """
+        Devuelve (contenido, tipo, etag, ultima_modificacion) de una gráfica o de 'datos'.
+        Si nunca se ha generado, espera como máximo `espera` segundos; si solo está
+        vencida, entrega la versión anterior mientras el hilo de fondo la actualiza.
+        """
+        self.solicitar()
+        with self._cond:
+            if not self._graficas:
+                self._cond.wait_for(lambda: self._graficas, timeout=self.espera)
+            if nombre not in self._graficas:
+                return None
+            contenido, tipo, etag = self._graficas[nombre]
+            return contenido, tipo, etag, self._ultima_modificacion
+
+    def _vencida(self):
+        return (self._version_generada != self._version
+                or time.monotonic() - self._generada_en > self.max_edad)
+
+    def _iniciar_hilo(self):
+        if self._hilo is not None:
+            return
+        with self._cond:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._trabajar, name='graficas', daemon=True)
+                self._hilo.start()
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._solicitada and self._vencida())
+                self._solicitada = False
+                version = self._version
+
+            try:
+                graficas = self._generar()
+            except Exception:
+                # Se reintentará en la siguiente solicitud; se conservan las gráficas anteriores
+                log.exception('No se pudieron generar las gráficas del dashboard')
+                continue
+
+            with self._cond:
+                self._graficas = graficas
+                self._version_generada = version
+                self._generada_en = time.monotonic()
+                self._ultima_modificacion = time.time()
+                self._cond.notify_all()
+
+    def _generar(self):
+        # Consultar datos para las gráficas (desde los contadores precalculados)
+        inicio = time.perf_counter()
+        with get_cursor(dictionary=True, solo_lectura=True) as (conn, cursor):
+            conteo_estado = estadisticas.casos_por_estado(cursor)
+            tendencia = estadisticas.tendencia(cursor)
+        instrumentacion.medir_grafica('consulta', time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+
+        datos = datos_graficas(conteo_estado, tendencia)
+        formato = self.config['formato']
+        if formato == 'png':
+            from services import analitica # matplotlib se carga solo si hace falta
+            dibujos = analitica.dibujar(datos)
+        else:
+            dibujos = dibujar_svg(datos)
+
+        graficas = {nombre: self._entrada(contenido, TIPOS[formato]) for nombre, contenido in dibujos.items()}
+        graficas['datos'] = self._entrada(json.dumps(datos, default=str).encode('utf-8'), 'application/json')
+        instrumentacion.medir_grafica('dibujo', time.perf_counter() - inicio)
+        return graficas
+
+    def _entrada(self, contenido, tipo):
+        # El ETag depende del contenido, así es igual en todos los procesos que tengan los mismos datos
+        return contenido, tipo, hashlib.sha1(contenido).hexdigest()
+
+
+# Instancia compartida por los controladores
+cache_graficas = CacheGraficas()
+bus_eventos.escuchar(lambda *evento: cache_graficas.invalidar(), tipos=['caso'])
@@ -0,0 +1,256 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from werkzeug.security import generate_password_hash
+
+from db import get_cursor
+from services.autenticacion import METODO_HASH
+from services.dominio import TIPOS_USUARIO
+from services.estadisticas import estadisticas
+from services.tareas import tarea, PRIORIDAD_ALTA
+
+# Columnas del archivo de importación (CSV con encabezado o lista JSON de objetos)
+OBLIGATORIOS = ('id_identity', 'nombre_completo', 'password', 'tipo_usuario')
+CAMPOS_EQUIPO = ('nombre_equipo', 'marca', 'modelo', 'serial')
+OPCIONALES = ('telefono', 'correo') + CAMPOS_EQUIPO
+
+# Largo máximo de cada columna, según las tablas
+LARGOS = {
+    'id_identity': 20,  # También se guarda como cédula en datos_personales (VARCHAR(20))
+    'nombre_completo': 100, 'telefono': 20, 'correo': 100,
+    'nombre_equipo': 100, 'marca': 50, 'modelo': 50, 'serial': 50,
+}
+
+
+class ErrorImportacion(Exception):
+    """Se lanza cuando el archivo de importación no se puede leer."""
+
+
+def leer_registros(contenido, formato):
+    # Convierte el contenido de un archivo CSV o JSON en una lista de diccionarios
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8-sig')
+    if formato == 'csv':
+        return [dict(fila) for fila in csv.DictReader(io.StringIO(contenido))]
+    if formato == 'json':
+        try:
+            registros = json.loads(contenido)
+        except ValueError as e:
+            raise ErrorImportacion(f'JSON inválido: {e}')
+        if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+            raise ErrorImportacion('El JSON debe ser una lista de objetos')
+        return registros
+    raise ErrorImportacion(f'Formato desconocido: {formato}')
+
+
+def insertar_usuario(cursor, datos, password_hash):
+    """
+    Inserta un usuario con sus datos personales y, si los trae, su equipo.
+    Es el camino de una sola fila (formulario del administrador y reintentos de la importación).
+    """
+    id_equipo = None
+    if datos.get('serial'):
+        cursor.execute("""
+            INSERT INTO equipos (nombre_equipo, marca, modelo, serial)
+            VALUES (%s, %s, %s, %s)
+        """, (datos['nombre_equipo'], datos['marca'], datos['modelo'], datos['serial']))
+        id_equipo = cursor.lastrowid
+
+    cursor.execute("""
+        INSERT INTO datos_personales (cedula, nombre_completo, telefono, correo, id_equipo)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (datos['id_identity'], datos['nombre_completo'], datos.get('telefono'), datos.get('correo'), id_equipo))
+    id_datos = cursor.lastrowid
+
+    cursor.execute("""
+        INSERT INTO users (id_identity, password, tipo_usuario, id_datos)
+        VALUES (%s, %s, %s, %s)
+    """, (datos['id_identity'], password_hash, datos['tipo_usuario'], id_datos))
+    estadisticas.registrar_usuario(cursor, datos['tipo_usuario'])
+
+
+@tarea('crear_usuario', prioridad=PRIORIDAD_ALTA)
+def crear_usuario(datos, password_hash):
+    # Alta desde el formulario del administrador; la contraseña llega ya encriptada
+    with get_cursor() as (conn, cursor):
+        cursor.execute("SELECT 1 FROM users WHERE id_identity = %s", (datos['id_identity'],))
+        if cursor.fetchone() is not None:
+            return  # Ya creado en un intento anterior
+        insertar_usuario(cursor, datos, password_hash)
+        conn.commit()
+
+
+class ImportadorUsuarios:
+    """
+    Alta masiva de usuarios con sus datos personales y equipos.
+    1. Se valida todo el archivo antes de escribir (errores por fila).
+    2. Se omiten los usuarios que ya existen (por id_identity o cédula), así que
+       volver a ejecutar la misma importación no duplica nada.
+    3. Las contraseñas se encriptan en un pool de procesos, ya que el hash es costoso
+       a propósito y en un solo proceso dominaría el tiempo total. Mientras tanto no se
+       retiene ninguna conexión del pool de base de datos.
+    4. Se inserta por bloques con INSERT de varias filas (executemany), una transacción
+       por bloque. Si un bloque falla, se repite fila por fila para aislar el error.
+    """
+    def __init__(self, tamano_bloque=500, procesos=None, minimo_para_procesos=50):
+        self.tamano_bloque = tamano_bloque
+        self.procesos = procesos or os.cpu_count() or 1
+        self.minimo_para_procesos = minimo_para_procesos  # Con pocas filas no compensa iniciar procesos
+
+    def validar(self, registros):
+        # Devuelve (validos, errores); cada error es {'fila', 'id_identity', 'errores'}
+        validos, errores = [], []
+        vistos = set()
+        for numero, registro in enumerate(registros, start=1):
+            datos = {campo: str(registro.get(campo) or '').strip() for campo in OBLIGATORIOS + OPCIONALES}
+            problemas = [f'Falta {campo}' for campo in OBLIGATORIOS if not datos[campo]]
+            if datos['tipo_usuario'] and datos['tipo_usuario'] not in TIPOS_USUARIO:
+                problemas.append(f"tipo_usuario inválido: {datos['tipo_usuario']}")
+            problemas += [f'{campo} supera {largo} caracteres'
+                          for campo, largo in LARGOS.items() if len(datos[campo]) > largo]
+            equipo = [datos[campo] for campo in CAMPOS_EQUIPO]
+            if any(equipo) and not all(equipo):
+                problemas.append('El equipo necesita ' + ', '.join(CAMPOS_EQUIPO))
+            if datos['id_identity'] in vistos:
+                problemas.append('id_identity repetido en el archivo')
+            vistos.add(datos['id_identity'])
+
+            if problemas:
+                errores.append({'fila': numero, 'id_identity': datos['id_identity'], 'errores': problemas})
+            else:
+                # Los opcionales vacíos se guardan como NULL
+                validos.append(dict({campo: (valor or None) for campo, valor in datos.items()}, fila=numero))
+        return validos, errores
+
+    def existentes(self, cursor, identidades):
+        # Identificaciones que ya están registradas como usuario o como cédula
+        encontrados = set()
+        identidades = list(identidades)
+        for inicio in range(0, len(identidades), self.tamano_bloque):
+            lote = identidades[inicio:inicio + self.tamano_bloque]
+            marcadores = ','.join(['%s'] * len(lote))
+            cursor.execute(f"SELECT id_identity FROM users WHERE id_identity IN ({marcadores})", tuple(lote))
+            encontrados.update(fila[0] for fila in cursor.fetchall())
+            cursor.execute(f"SELECT cedula FROM datos_personales WHERE cedula IN ({marcadores})", tuple(lote))
+            encontrados.update(fila[0] for fila in cursor.fetchall())
+        return encontrados
+
+    def encriptar(self, passwords):
+        encriptar = partial(generate_password_hash, method=METODO_HASH)
+        if len(passwords) < self.minimo_para_procesos or self.procesos == 1:
+            return [encriptar(p) for p in passwords]
+        # Procesos nuevos (spawn) y no copias del actual: un fork desde un hilo de petición
+        # hereda candados tomados por otros hilos (pool de conexiones, logging) y sus sockets
+        with ProcessPoolExecutor(max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn')) as pool:
+            return list(pool.map(encriptar, passwords, chunksize=32))
+
+    def _ids_consecutivos(self, cursor, tabla, columna_id, columna_clave, primero, claves):
+        # Un INSERT de varias filas reserva ids consecutivos a partir de LAST_INSERT_ID();
+        # se comprueba por si el servidor usa otro modo de autoincremento
+        ultimo = primero + len(claves) - 1
+        cursor.execute(f"SELECT {columna_clave} FROM {tabla} WHERE {columna_id} BETWEEN %s AND %s ORDER BY {columna_id}",
+                       (primero, ultimo))
+        return [fila[0] for fila in cursor.fetchall()] == list(claves)
+
+    def insertar_bloque(self, cursor, bloque):
+        """
+        Inserta un bloque de usuarios ya validados, con INSERT de varias filas; confirma el que llama.
+        Cada dict trae todas las columnas (OBLIGATORIOS sin 'password', OPCIONALES en None si
+        faltan) y 'password_hash'. `cursor` debe ser un cursor de tuplas.
+        """
+        con_equipo = [d for d in bloque if d['serial']]
+        if con_equipo:
+            cursor.executemany("""
+                INSERT INTO equipos (nombre_equipo, marca, modelo, serial)
+                VALUES (%s, %s, %s, %s)
+            """, [(d['nombre_equipo'], d['marca'], d['modelo'], d['serial']) for d in con_equipo])
+            primero = cursor.lastrowid
+            if not self._ids_consecutivos(cursor, 'equipos', 'id_equipo', 'serial', primero,
+                                          [d['serial'] for d in con_equipo]):
+                raise ErrorImportacion('Los ids de equipos no son consecutivos')
+            for desplazamiento, d in enumerate(con_equipo):
+                d['id_equipo'] = primero + desplazamiento
+
+        cursor.executemany("""
+            INSERT INTO datos_personales (cedula, nombre_completo, telefono, correo, id_equipo)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(d['id_identity'], d['nombre_completo'], d['telefono'], d['correo'], d.get('id_equipo'))
+              for d in bloque])
+        primero = cursor.lastrowid
+        if not self._ids_consecutivos(cursor, 'datos_personales', 'id_datos', 'cedula', primero,
+                                      [d['id_identity'] for d in bloque]):
+            raise ErrorImportacion('Los ids de datos personales no son consecutivos')
+
+        cursor.executemany("""
+            INSERT INTO users (id_identity, password, tipo_usuario, id_datos)
+            VALUES (%s, %s, %s, %s)
+        """, [(d['id_identity'], d['password_hash'], d['tipo_usuario'], primero + desplazamiento)
+              for desplazamiento, d in enumerate(bloque)])
+
+        for tipo in TIPOS_USUARIO:
+            cantidad = sum(1 for d in bloque if d['tipo_usuario'] == tipo)
+            if cantidad:
+                estadisticas.registrar_usuario(cursor, tipo, cantidad)
+
+    def importar(self, registros, parcial=False, simular=False):
+        """
+        Importa los registros y devuelve el resumen
+        {'creados', 'omitidos': [id_identity...], 'errores': [{'fila', 'id_identity', 'errores'}]}.
+        Si hay errores de validación no se escribe nada, salvo con parcial=True.
+        Con simular=True solo se valida y se informa qué se crearía.
+        Toma sus propias conexiones y las suelta mientras encripta las contraseñas; un usuario
+        creado por otro entre la comprobación y el alta aparece como error de su fila.
+        """
+        validos, errores = self.validar(registros)
+        resultado = {'creados': 0, 'omitidos': [], 'errores': errores}
+        if errores and not parcial:
+            return resultado
+
+        with get_cursor() as (conn, cursor):
+            ya_existen = self.existentes(cursor, [d['id_identity'] for d in validos])
+        resultado['omitidos'] = [d['id_identity'] for d in validos if d['id_identity'] in ya_existen]
+        nuevos = [d for d in validos if d['id_identity'] not in ya_existen]
+        if simular:
+            resultado['creados'] = len(nuevos)
+            return resultado
+
+        for d, password_hash in zip(nuevos, self.encriptar([d['password'] for d in nuevos])):
+            d['password_hash'] = password_hash
+            del d['password']
+
+        with get_cursor() as (conn, cursor):
+            self._insertar(conn, cursor, nuevos, resultado)
+        return resultado
+
+    def _insertar(self, conn, cursor, nuevos, resultado):
+        # Bloques de `tamano_bloque` filas, una transacción por bloque
+        errores = resultado['errores']
+        for inicio in range(0, len(nuevos), self.tamano_bloque):
+            bloque = nuevos[inicio:inicio + self.tamano_bloque]
+            try:
+                self.insertar_bloque(cursor, bloque)
+                conn.commit()
+                resultado['creados'] += len(bloque)
+                continue
+            except Exception:
+                conn.rollback()
+
+            # Fila por fila, para informar exactamente cuál falla
+            for d in bloque:
+                try:
+                    insertar_usuario(cursor, d, d['password_hash'])
+                    conn.commit()
+                    resultado['creados'] += 1
+                except Exception as e:
+                    conn.rollback()
+                    errores.append({'fila': d['fila'], 'id_identity': d['id_identity'],
+                                    'errores': [str(e)]})
+
+
+# Instancia compartida por los controladores y manage.py
+importador = ImportadorUsuarios()
@@ -0,0 +1,273 @@
+import bisect
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+import db
+from services.eventos import bus_eventos
+from services.tareas import cola_tareas
+
+log = logging.getLogger(__name__)
+
+# Configuración de la instrumentación
+metricas_config = {
+    'umbral_lento': 1.0,                     # Segundos a partir de los cuales una petición se registra como lenta
+    'consultas_en_log': 5,                   # Consultas más lentas que se incluyen en el registro
+    'ips_permitidas': ('127.0.0.1', '::1'),  # Quién puede leer /metrics sin sesión de administrador
+}
+
+LIMITES_PETICION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LIMITES_CANTIDAD = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=''):
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """Histograma con etiquetas en el formato de Prometheus (cubetas acumuladas, suma y cantidad)."""
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_PETICION):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}  # valores de etiquetas -> [conteos por cubeta, suma, cantidad]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in sorted(self._series.items())]
+        for etiquetas, cubetas, suma, cantidad in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (float('inf'),), cubetas):
+                acumulado += conteo
+                le = 'le="+Inf"' if limite == float('inf') else f'le="{_numero(float(limite))}"'
+                yield f'{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}'
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(suma)}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {cantidad}'
+
+
+class Contador:
+    """Contador creciente con etiquetas."""
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = Counter()
+        self._lock = threading.Lock()
+
+    def incrementar(self, *etiquetas, cantidad=1):
+        with self._lock:
+            self._series[etiquetas] += cantidad
+
+    def exponer(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        for etiquetas, valor in series:
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}'
+
+
+class Indicador:
+    """Valores instantáneos que se leen al exponer: funcion() -> {(valores de etiquetas): valor}."""
+    tipo = 'gauge'
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+
+    def exponer(self):
+        try:
+            valores = self.funcion()
+        except Exception as e:
+            log.warning('No se pudo leer la métrica %s: %s', self.nombre, e)
+            return
+        for etiquetas, valor in sorted(valores.items()):
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}'
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self):
+        # Texto en el formato de exposición de Prometheus (text/plain; version=0.0.4)
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.exponer())
+        return '\n'.join(lineas) + '\n'
+
+
+class MedicionPeticion:
+    """Consultas hechas durante una petición (también desde los hilos de services/concurrencia.py)."""
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.inicio = time.perf_counter()
+        self.consultas = []  # (sql, segundos)
+        self._lock = threading.Lock()
+
+    def agregar(self, sql, segundos):
+        with self._lock:
+            self.consultas.append((sql, segundos))
+
+    def tiempo_db(self):
+        with self._lock:
+            return sum(segundos for _, segundos in self.consultas)
+
+
+_ESPACIOS = re.compile(r'\s+')
+
+
+def normalizar_sql(sql):
+    # Una línea, para el registro y para agrupar consultas repetidas
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+class Instrumentacion:
+    """
+    Métricas de la aplicación:
+    - latencia de cada endpoint, y cantidad y tiempo de consultas por petición;
+    - duración de cada consulta (todas, también las de hilos de fondo);
+    - duración del renderizado de plantillas y del dibujo de las gráficas;
+    - estado del pool de conexiones, del reparto entre réplicas, de las conexiones SSE
+      y de la cola de tareas.
+    Las peticiones más lentas que `umbral_lento` se registran con sus consultas más
+    lentas y las repetidas, que delatan los patrones N+1.
+    """
+    def __init__(self, config=metricas_config):
+        self.config = config
+        self.registro = RegistroMetricas()
+        self._actual = contextvars.ContextVar('medicion_peticion', default=None)
+
+        self.peticiones = self.registro.registrar(Histograma(
+            'helpdesk_peticion_segundos', 'Duración de las peticiones HTTP por endpoint',
+            ('endpoint', 'metodo', 'estado')))
+        self.consultas_peticion = self.registro.registrar(Histograma(
+            'helpdesk_peticion_consultas', 'Consultas SQL por petición',
+            ('endpoint',), LIMITES_CANTIDAD))
+        self.db_peticion = self.registro.registrar(Histograma(
+            'helpdesk_peticion_db_segundos', 'Tiempo total de base de datos por petición',
+            ('endpoint',)))
+        self.consultas = self.registro.registrar(Histograma(
+            'helpdesk_consulta_segundos', 'Duración de cada consulta SQL por tipo de sentencia',
+            ('sentencia',), LIMITES_CONSULTA))
+        self.plantillas = self.registro.registrar(Histograma(
+            'helpdesk_plantilla_segundos', 'Duración del renderizado de plantillas',
+            ('plantilla',)))
+        self.graficas = self.registro.registrar(Histograma(
+            'helpdesk_grafica_segundos', 'Generación de las gráficas del dashboard por fase',
+            ('fase',)))
+        self.lentas = self.registro.registrar(Contador(
+            'helpdesk_peticiones_lentas_total', 'Peticiones más lentas que el umbral configurado',
+            ('endpoint',)))
+        self.registro.registrar(Indicador(
+            'helpdesk_pool_conexiones', 'Estado del pool de conexiones del primario',
+            lambda: {(clave,): valor for clave, valor in db.pool_stats().items()}, ('dato',)))
+        self.registro.registrar(Indicador(
+            'helpdesk_lecturas', 'Lecturas de solo lectura según dónde se atendieron (acumulado)',
+            lambda: {(clave,): valor for clave, valor in db.enrutamiento_stats().items() if clave != 'replicas'},
+            ('destino',)))
+        self.registro.registrar(Indicador(
+            'helpdesk_replica_retraso_segundos', 'Retraso de replicación medido en cada réplica',
+            lambda: {(r['nombre'],): r['retraso'] for r in db.enrutamiento_stats()['replicas'] if r['retraso'] is not None},
+            ('replica',)))
+        self.registro.registrar(Indicador(
+            'helpdesk_sse_conexiones', 'Conexiones SSE abiertas de las colas del técnico',
+            lambda: {(): bus_eventos.suscriptores()}))
+        self.registro.registrar(Indicador(
+            'helpdesk_tareas', 'Tareas en segundo plano por estado',
+            lambda: {(estado,): cantidad for estado, cantidad in cola_tareas.contar().items()}, ('estado',)))
+
+        db.observadores_consultas.append(self.observar_consulta)
+
+    # ---- Consultas ----
+
+    def observar_consulta(self, sql, segundos):
+        texto = normalizar_sql(sql)
+        self.consultas.observar(segundos, texto.lstrip('(').split(' ', 1)[0].upper() or '?')
+        medicion = self._actual.get()
+        if medicion is not None:
+            medicion.agregar(texto, segundos)
+
+    # ---- Peticiones ----
+
+    def iniciar(self, endpoint):
+        self._actual.set(MedicionPeticion(endpoint))
+
+    def terminar(self, metodo, estado):
+        medicion = self._actual.get()
+        if medicion is None:
+            return
+        self._actual.set(None)
+        duracion = time.perf_counter() - medicion.inicio
+        endpoint = medicion.endpoint
+        self.peticiones.observar(duracion, endpoint, metodo, str(estado))
+        self.consultas_peticion.observar(len(medicion.consultas), endpoint)
+        self.db_peticion.observar(medicion.tiempo_db(), endpoint)
+        if duracion >= self.config['umbral_lento']:
+            self.lentas.incrementar(endpoint)
+            self._registrar_lenta(medicion, metodo, duracion)
+
+    def _registrar_lenta(self, medicion, metodo, duracion):
+        consultas = list(medicion.consultas)
+        lineas = [f'Petición lenta: {metodo} {medicion.endpoint} {duracion:.3f} s, '
+                  f'{len(consultas)} consultas, {medicion.tiempo_db():.3f} s en base de datos']
+        for sql, segundos in sorted(consultas, key=lambda c: c[1], reverse=True)[:self.config['consultas_en_log']]:
+            lineas.append(f'  {segundos:.3f} s  {sql[:500]}')
+        repetidas = [(sql, n) for sql, n in Counter(sql for sql, _ in consultas).most_common() if n > 1]
+        for sql, n in repetidas[:self.config['consultas_en_log']]:
+            lineas.append(f'  repetida {n} veces (¿N+1?)  {sql[:500]}')
+        log.warning('\n'.join(lineas))
+
+    # ---- Plantillas y gráficas ----
+
+    def medir_plantilla(self, nombre, segundos):
+        self.plantillas.observar(segundos, nombre or '?')
+
+    def medir_grafica(self, fase, segundos):
+        self.graficas.observar(segundos, fase)
+
+    def exponer(self):
+        return self.registro.exponer()
+
+
+# Instancia compartida por la aplicación y los servicios
+instrumentacion = Instrumentacion()
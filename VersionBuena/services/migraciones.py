@@ -0,0 +1,219 @@
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from db import get_cursor
+from controllers.admin_routes import AdminController
+from controllers.tecnico_routes import TecnicoController
+from controllers.usuario_routes import usuario_controller
+from services.autenticacion import CONSULTA_USUARIO
+from services.archivo import TABLAS_VIGENTES, TABLAS_ARCHIVADAS
+from services.busqueda import buscador
+from services.cache_http import CONSULTA_VALIDADOR_CASO
+from services.cargadores import cargador_comentarios
+from services.codigos import asignador_codigos
+from services.colas import motor_colas
+from services.dominio import PRIORIDADES
+from services.flujo import flujo_casos
+from services.directorio import directorio, CONSULTA_USUARIO_A_ELIMINAR
+from services.exportacion import exportador
+from services.archivo import archivador
+from services.sla import motor_sla
+from services.asignacion import asignador_casos
+from services.estadisticas import estadisticas
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migraciones')
+
+# Nombre de archivo esperado: 0001_descripcion.up.sql / 0001_descripcion.down.sql
+PATRON_ARCHIVO = re.compile(r'^(\d{4})_(\w+)\.(up|down)\.sql$')
+
+Migracion = namedtuple('Migracion', 'version nombre subir bajar')
+
+# Pasos en Python que completan una migración después de su script .up.sql, para rellenar
+# tablas nuevas con la misma lógica que usa la aplicación (versión -> función sin argumentos)
+COMPLETAR = {
+    11: estadisticas.reconstruir,  # Contadores de los dashboards
+}
+
+
+class ErrorMigracion(Exception):
+    """Se lanza cuando los scripts de migración están incompletos o no se pueden aplicar."""
+
+
+def dividir_sentencias(script):
+    # Separa un script en sentencias terminadas en ';' ignorando las líneas de comentario
+    lineas = [l for l in script.splitlines() if not l.strip().startswith('--')]
+    return [s.strip() for s in '\n'.join(lineas).split(';') if s.strip()]
+
+
+class Migrador:
+    """
+    Aplica y revierte migraciones versionadas del esquema.
+    Cada migración es un par de scripts (.up.sql / .down.sql) en la carpeta `migraciones`;
+    las versiones aplicadas se registran en la tabla `schema_version`.
+    En MySQL cada sentencia DDL confirma la transacción, por lo que la versión se
+    registra al terminar cada migración y una migración fallida debe corregirse a mano.
+    Si la migración tiene un paso en COMPLETAR, se ejecuta después del script y antes
+    de registrar la versión.
+    """
+    def __init__(self, directorio=DIRECTORIO, completar=COMPLETAR):
+        self.directorio = directorio
+        self.completar = completar
+
+    def disponibles(self):
+        archivos = {}
+        for nombre in os.listdir(self.directorio):
+            m = PATRON_ARCHIVO.match(nombre)
+            if m:
+                version, descripcion, sentido = int(m.group(1)), m.group(2), m.group(3)
+                archivos.setdefault((version, descripcion), {})[sentido] = os.path.join(self.directorio, nombre)
+
+        migraciones = []
+        for (version, descripcion), rutas in sorted(archivos.items()):
+            if 'up' not in rutas or 'down' not in rutas:
+                raise ErrorMigracion(f'La migración {version:04d}_{descripcion} necesita los scripts up y down')
+            migraciones.append(Migracion(version, descripcion, rutas['up'], rutas['down']))
+
+        versiones = [m.version for m in migraciones]
+        if len(versiones) != len(set(versiones)):
+            raise ErrorMigracion('Hay dos migraciones con el mismo número de versión')
+        return migraciones
+
+    def _asegurar_tabla(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                nombre VARCHAR(100) NOT NULL,
+                aplicada_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    def aplicadas(self, cursor):
+        self._asegurar_tabla(cursor)
+        cursor.execute("SELECT version, aplicada_en FROM schema_version")
+        return {version: aplicada_en for version, aplicada_en in cursor.fetchall()}
+
+    def estado(self):
+        # Lista de (version, nombre, fecha de aplicación o None)
+        with get_cursor() as (conn, cursor):
+            aplicadas = self.aplicadas(cursor)
+        return [(m.version, m.nombre, aplicadas.get(m.version)) for m in self.disponibles()]
+
+    def _ejecutar(self, cursor, ruta):
+        with open(ruta, encoding='utf-8') as archivo:
+            for sentencia in dividir_sentencias(archivo.read()):
+                cursor.execute(sentencia)
+
+    def subir(self, hasta=None):
+        # Aplica en orden las migraciones pendientes (hasta la versión indicada, inclusive)
+        aplicadas_ahora = []
+        with get_cursor() as (conn, cursor):
+            aplicadas = self.aplicadas(cursor)
+            for migracion in self.disponibles():
+                if migracion.version in aplicadas:
+                    continue
+                if hasta is not None and migracion.version > hasta:
+                    break
+                self._ejecutar(cursor, migracion.subir)
+                if migracion.version in self.completar:
+                    self.completar[migracion.version]()
+                cursor.execute("INSERT INTO schema_version (version, nombre) VALUES (%s, %s)",
+                               (migracion.version, migracion.nombre))
+                conn.commit()
+                aplicadas_ahora.append(migracion)
+        return aplicadas_ahora
+
+    def bajar(self, pasos=1):
+        # Revierte las últimas `pasos` migraciones aplicadas, de la más reciente a la más antigua
+        revertidas = []
+        with get_cursor() as (conn, cursor):
+            aplicadas = self.aplicadas(cursor)
+            candidatas = [m for m in reversed(self.disponibles()) if m.version in aplicadas]
+            for migracion in candidatas[:pasos]:
+                self._ejecutar(cursor, migracion.bajar)
+                cursor.execute("DELETE FROM schema_version WHERE version = %s", (migracion.version,))
+                conn.commit()
+                revertidas.append(migracion)
+        return revertidas
+
+
+def con_archivo(nombre, sql, parametros):
+    # Una consulta de buscar_caso() se ejecuta sobre las tablas vigentes y, si no encuentra el caso, sobre el archivo
+    return [(nombre, sql.format(**TABLAS_VIGENTES), parametros),
+            (f'{nombre} (archivo)', sql.format(**TABLAS_ARCHIVADAS), parametros)]
+
+
+# Consultas de los controladores y servicios, con parámetros de ejemplo. El texto SQL se
+# toma de los módulos que las ejecutan, así que el catálogo no se desactualiza; al agregar
+# una consulta nueva hay que sumarla aquí.
+PAGINA = (datetime(2030, 1, 1), 0)  # Cursor de ejemplo para las variantes de página siguiente
+
+CONSULTAS_CONTROLADORES = [
+    ('login', CONSULTA_USUARIO, ('admin',)),
+    ('formulario: casos del usuario', *usuario_controller.consulta_casos(1)),
+    ('formulario: casos del usuario, página siguiente', *usuario_controller.consulta_casos(1, PAGINA)),
+    ('comentarios por lote', *cargador_comentarios.consulta([1, 2])),
+    ('comentarios archivados por lote', *cargador_comentarios.consulta([1, 2], archivados=True)),
+    ('cola del técnico', *motor_colas.consulta('pendiente', ['alta'])[:2]),
+    ('cola del técnico, página siguiente', *motor_colas.consulta('pendiente', ['alta'], despues=PAGINA)[:2]),
+    ('cola del técnico, varias prioridades', *motor_colas.consulta('pendiente', PRIORIDADES, despues=PAGINA, resumen=True)[:2]),
+    ('cola personal del técnico', *motor_colas.consulta('pendiente', ['alta'], despues=PAGINA, asignado=1)[:2]),
+    *con_archivo('detalle del caso (técnico)', TecnicoController.CONSULTA_CASO, ('X',)),
+    ('solicitante del caso', TecnicoController.CONSULTA_SOLICITANTE, (1,)),
+    *con_archivo('validador de la página del caso', CONSULTA_VALIDADOR_CASO, ('X',)),
+    ('cambio de estado por lote', *flujo_casos.consulta_bloqueo([1, 2])),
+    *con_archivo('detalle del caso (administrador)', AdminController.CONSULTA_CASO, ('X',)),
+    ('casos de los usuarios encontrados', AdminController.CONSULTA_CASOS_USUARIOS.format(marcadores='%s, %s'), (1, 2)),
+    ('eliminar usuario', CONSULTA_USUARIO_A_ELIMINAR, ('admin',)),
+    ('búsqueda de personas', *buscador.consulta_personas('ana', 20)),
+    ('búsqueda de casos', *buscador.consulta_casos('impresora', 20)),
+    ('directorio de usuarios', *directorio.consulta(orden='id_identity', despues=('a', 1))[:2]),
+    ('directorio por rol', *directorio.consulta(orden='id_identity', tipo='tecnico')[:2]),
+    ('exportación de casos', *exportador.consulta()),
+    ('exportación de casos, lote siguiente', *exportador.consulta(despues=1)),
+    ('exportación de casos archivados', *exportador.consulta(archivados=True)),
+    ('archivo: candidatos', *archivador.consulta_candidatos('baja', '2000-01-01', 200)),
+    ('códigos provisionales pendientes', *asignador_codigos.consulta_provisionales('casos', 500)),
+    ('códigos provisionales pendientes (archivo)', *asignador_codigos.consulta_provisionales('casos_archivo', 500)),
+    ('SLA: casos vencidos', *motor_sla.consulta_cola('vencidos')),
+    ('SLA: casos por vencer', *motor_sla.consulta_cola('por_vencer')),
+    ('SLA: antigüedad de los casos abiertos', *motor_sla.consulta_antiguedad()),
+    ('asignación: carga de los técnicos', *asignador_casos.consulta_cargas([1, 2, 3])),
+    ('asignación: técnicos afines al equipo', *asignador_casos.consulta_afines(('HP', 'ProBook'))),
+]
+
+# Consultas que todavía recorren la tabla completa por diseño, con el motivo
+RECORRIDOS_PERMITIDOS = {
+    'exportación de casos': 'sin filtros se exportan todos los casos, en orden de clave primaria',
+    'exportación de casos archivados': 'sin filtros se exportan todos los casos, en orden de clave primaria',
+}
+
+# Tablas de pocas filas en las que un recorrido completo es lo más eficiente
+TABLAS_PEQUENAS = {'estadisticas_casos', 'casos_por_dia', 'estadisticas_usuarios', 'schema_version',
+                   'sla_tecnicos', 'antiguedad_casos'}
+
+
+def verificar_planes(consultas=CONSULTAS_CONTROLADORES):
+    """
+    Ejecuta EXPLAIN sobre cada consulta y devuelve una lista de
+    (nombre, tabla, motivo_permitido_o_None) por cada recorrido completo (type = ALL).
+    Conviene ejecutarlo con un volumen de datos representativo: con tablas casi vacías
+    el optimizador puede preferir un recorrido completo aunque exista el índice.
+    """
+    recorridos = []
+    with get_cursor(dictionary=True) as (conn, cursor):
+        for nombre, sql, parametros in consultas:
+            cursor.execute('EXPLAIN ' + sql, parametros)
+            for fila in cursor.fetchall():
+                tabla = fila.get('table') or ''
+                # Las tablas derivadas (<derived2>, <union2,3>) son resultados intermedios ya acotados
+                if tabla.startswith('<') or tabla in TABLAS_PEQUENAS:
+                    continue
+                if fila.get('type') == 'ALL':
+                    recorridos.append((nombre, tabla, RECORRIDOS_PERMITIDOS.get(nombre)))
+    return recorridos
+
+
+# Instancia compartida
+migrador = Migrador()
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+
+# Formato del cursor de paginación: "<fecha ISO>_<id>", por ejemplo "2025-03-01T10:15:00_482"
+FORMATO_FECHA = '%Y-%m-%dT%H:%M:%S'
+
+
+def codificar_cursor(fecha, id_registro):
+    # Genera el token opaco que apunta a la última fila de una página
+    return f"{fecha.strftime(FORMATO_FECHA)}_{id_registro}"
+
+
+def decodificar_cursor(token):
+    """
+    Convierte un token de paginación en (fecha, id).
+    Devuelve None si el token no existe o está mal formado, para empezar desde la primera página.
+    """
+    if not token:
+        return None
+    try:
+        fecha, id_registro = token.rsplit('_', 1)
+        return datetime.strptime(fecha, FORMATO_FECHA), int(id_registro)
+    except ValueError:
+        return None
+
+
+def condicion_keyset(columna_fecha, columna_id, cursor_pagina):
+    """
+    Devuelve (sql, parámetros) para continuar una lista ordenada por (fecha DESC, id DESC)
+    a partir de la última fila vista. Se expande la comparación de tuplas para que MySQL
+    pueda usar el índice compuesto como un rango.
+    """
+    if cursor_pagina is None:
+        return '', ()
+    fecha, id_registro = cursor_pagina
+    sql = f" AND ({columna_fecha} < %s OR ({columna_fecha} = %s AND {columna_id} < %s))"
+    return sql, (fecha, fecha, id_registro)
+
+
+def codificar_token(valor, id_registro):
+    # Token opaco para listas ordenadas por una columna cualquiera más el id como desempate
+    crudo = json.dumps([valor, id_registro], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    # Devuelve (valor, id) o None si el token no existe o está mal formado
+    if not token:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        valor, id_registro = json.loads(crudo)
+        return valor, int(id_registro)
+    except (ValueError, TypeError):
+        return None
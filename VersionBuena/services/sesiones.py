@@ -0,0 +1,204 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from services.cache import CacheTTL
+
+# Configuración del almacén de sesiones.
+# 'memoria' sirve para un solo proceso; con varios procesos (gunicorn, waitress con
+# varios workers) se usa 'sqlite', un archivo compartido por todos los procesos del servidor.
+sesiones_config = {
+    'almacen': 'memoria',
+    'ruta_sqlite': os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sesiones.sqlite3'),
+    'duracion': 8 * 3600,  # Segundos que dura una sesión (una jornada)
+    'maximo': 10000,       # Sesiones en memoria; al superarlo se descarta la menos usada
+}
+
+
+class Principal:
+    """
+    Usuario autenticado de la sesión. Solo guarda lo necesario para los controles de rol.
+    Admite el acceso por clave (session['user']['tipo_usuario']) como el diccionario de antes.
+    """
+    __slots__ = ('id_user', 'id_identity', 'tipo_usuario', 'id_datos')
+
+    def __init__(self, id_user, id_identity, tipo_usuario, id_datos=None):
+        self.id_user = id_user
+        self.id_identity = id_identity
+        self.tipo_usuario = tipo_usuario
+        self.id_datos = id_datos
+
+    def __getitem__(self, clave):
+        if clave not in self.__slots__:
+            raise KeyError(clave)
+        return getattr(self, clave)
+
+    def get(self, clave, defecto=None):
+        return getattr(self, clave) if clave in self.__slots__ else defecto
+
+    def a_lista(self):
+        return [getattr(self, campo) for campo in self.__slots__]
+
+
+class TagPrincipal(JSONTag):
+    # Serializa Principal como una lista corta dentro del JSON de la sesión
+    __slots__ = ()
+    key = ' pr'
+
+    def check(self, value):
+        return isinstance(value, Principal)
+
+    def to_json(self, value):
+        return value.a_lista()
+
+    def to_python(self, value):
+        return Principal(*value)
+
+
+serializador = TaggedJSONSerializer()
+serializador.register(TagPrincipal, index=0)
+
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Sesión cuyos datos viven en el servidor; la cookie solo lleva el id."""
+    def __init__(self, datos=None, sid=None, nueva=False):
+        def al_modificar(sesion):
+            sesion.modified = True
+        super().__init__(datos, al_modificar)
+        self.sid = sid
+        self.new = nueva
+        self.modified = False
+        self.anterior = None  # id a borrar cuando se rota
+
+    def rotar(self):
+        # Nuevo id para la misma sesión (al iniciar sesión), para evitar la fijación de sesión
+        if self.anterior is None and not self.new:
+            self.anterior = self.sid
+        self.sid = nuevo_id()
+        self.modified = True
+
+
+def nuevo_id():
+    return secrets.token_urlsafe(32)
+
+
+class AlmacenMemoria:
+    """Sesiones en memoria del proceso, con expiración y descarte de la menos usada."""
+    def __init__(self, duracion, maximo):
+        self._datos = CacheTTL(maximo=maximo, ttl=duracion)
+
+    def cargar(self, sid):
+        datos = self._datos.obtener(sid)
+        return None if datos is None else serializador.loads(datos)
+
+    def guardar(self, sid, datos):
+        self._datos.guardar(sid, serializador.dumps(datos))
+
+    def eliminar(self, sid):
+        self._datos.eliminar(sid)
+
+
+class AlmacenSQLite:
+    """
+    Sesiones en un archivo SQLite compartido por los procesos del servidor.
+    Usa modo WAL para que las lecturas no esperen a las escrituras y una conexión por hilo.
+    Las sesiones vencidas se borran de vez en cuando al guardar.
+    """
+    def __init__(self, ruta, duracion, limpiar_cada=500):
+        self.ruta = ruta
+        self.duracion = duracion
+        self.limpiar_cada = limpiar_cada
+        self._local = threading.local()
+        self._escrituras = 0
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sesiones (
+                    sid TEXT PRIMARY KEY,
+                    datos TEXT NOT NULL,
+                    expira REAL NOT NULL
+                )
+            """)
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def cargar(self, sid):
+        fila = self._conexion().execute("SELECT datos FROM sesiones WHERE sid = ? AND expira > ?",
+                                        (sid, time.time())).fetchone()
+        return None if fila is None else serializador.loads(fila[0])
+
+    def guardar(self, sid, datos):
+        with self._conexion() as conn:
+            conn.execute("INSERT OR REPLACE INTO sesiones (sid, datos, expira) VALUES (?, ?, ?)",
+                         (sid, serializador.dumps(datos), time.time() + self.duracion))
+            self._escrituras += 1
+            if self._escrituras % self.limpiar_cada == 0:
+                conn.execute("DELETE FROM sesiones WHERE expira <= ?", (time.time(),))
+
+    def eliminar(self, sid):
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM sesiones WHERE sid = ?", (sid,))
+
+
+def crear_almacen(config=sesiones_config):
+    if config['almacen'] == 'sqlite':
+        return AlmacenSQLite(config['ruta_sqlite'], config['duracion'])
+    if config['almacen'] == 'memoria':
+        return AlmacenMemoria(config['duracion'], config['maximo'])
+    raise ValueError(f"Almacén de sesiones desconocido: {config['almacen']}")
+
+
+class SesionesServidor(SessionInterface):
+    """
+    Sesiones guardadas en el servidor. La cookie solo contiene un id aleatorio, así que
+    cada petición envía unos pocos bytes y no hay que verificar una firma sobre los datos.
+    Al vaciar la sesión (logout) se borra también del almacén, y el id deja de servir.
+    """
+    def __init__(self, almacen=None):
+        self.almacen = almacen or crear_almacen()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            datos = self.almacen.cargar(sid)
+            if datos is not None:
+                return SesionServidor(datos, sid=sid)
+        return SesionServidor(sid=nuevo_id(), nueva=True)
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if session.anterior:
+            self.almacen.eliminar(session.anterior)
+
+        if not session:
+            # Sesión vacía: si existía se elimina en el servidor y en el navegador
+            if session.modified:
+                self.almacen.eliminar(session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta)
+            return
+
+        response.vary.add('Cookie')
+        if session.modified:
+            self.almacen.guardar(session.sid, dict(session))
+        if session.new or session.anterior:
+            response.set_cookie(nombre, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=dominio, path=ruta,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
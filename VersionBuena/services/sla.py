@@ -0,0 +1,194 @@
+from datetime import timedelta
+
+from db import get_cursor
+from services.dominio import ESTADOS, PRIORIDADES
+from services.tareas import tarea, PRIORIDAD_BAJA
+
+# Plazos de resolución por prioridad (segundos desde la creación o la reapertura del caso)
+sla_config = {
+    'objetivos': {'alta': 4 * 3600, 'media': 24 * 3600, 'baja': 72 * 3600},
+    'aviso': 2 * 3600,        # Un caso está "por vencer" si le quedan menos de estos segundos
+    'envejecer_cada': 300,    # Segundos entre recálculos de la antigüedad de los casos abiertos
+}
+
+# Tramos de antigüedad en el estado actual: (desde segundos, nombre)
+TRAMOS = ((0, 'menos de 4 h'), (4 * 3600, '4 a 24 h'), (24 * 3600, '1 a 3 días'),
+          (72 * 3600, '3 a 7 días'), (7 * 86400, 'más de 7 días'))
+
+COLAS_SLA = ('vencidos', 'por_vencer')
+
+
+class MotorSLA:
+    """
+    Plazos de resolución (SLA) de los casos.
+    - Cada caso abierto tiene vence_sla; el índice (prioridad, vence_sla) sirve las colas de
+      vencidos y por vencer en orden de vencimiento, una búsqueda por prioridad.
+    - Los cambios de estado se anotan en transiciones_caso con el tiempo pasado en el estado
+      anterior, y cada resolución suma al técnico en sla_tecnicos: las estadísticas por
+      técnico se leen de ahí, sin recorrer el historial.
+    - Todo se escribe en la transacción del cambio (services/flujo.py), antes del UPDATE de
+      los casos, cuando las filas ya están bloqueadas.
+    - La antigüedad por tramos se recalcula en bloque con una tarea periódica, no por petición.
+    """
+    def __init__(self, config=sla_config):
+        self.config = config
+
+    def _plazo_sql(self, columna='prioridad'):
+        # Expresión SQL con el plazo en segundos según la prioridad y sus parámetros
+        objetivos = self.config['objetivos']
+        return f"CASE {columna} WHEN 'alta' THEN %s WHEN 'media' THEN %s ELSE %s END", \
+            (objetivos['alta'], objetivos['media'], objetivos['baja'])
+
+    def vencimiento(self, prioridad, desde):
+        # Vencimiento de un caso nuevo creado en `desde`
+        return desde + timedelta(seconds=self.config['objetivos'][prioridad])
+
+    def al_cambiar_estado(self, cursor, ids, estado_nuevo, id_tecnico):
+        marcadores = ','.join(['%s'] * len(ids))
+        cursor.execute(f"""
+            INSERT INTO transiciones_caso (id_caso, estado_anterior, estado_nuevo, id_tecnico, fecha, segundos_en_estado)
+            SELECT id_caso, estado, %s, %s, NOW(), TIMESTAMPDIFF(SECOND, COALESCE(estado_desde, fecha_creacion), NOW())
+            FROM casos
+            WHERE id_caso IN ({marcadores})
+        """, (estado_nuevo, id_tecnico, *ids))
+
+        if estado_nuevo == 'resuelto':
+            cursor.execute(f"""
+                INSERT INTO sla_tecnicos (id_tecnico, resueltos, segundos_resolucion, incumplidos)
+                SELECT %s, COUNT(*), COALESCE(SUM(TIMESTAMPDIFF(SECOND, fecha_creacion, NOW())), 0),
+                       COALESCE(SUM(vence_sla < NOW()), 0)
+                FROM casos
+                WHERE id_caso IN ({marcadores})
+                ON DUPLICATE KEY UPDATE resueltos = resueltos + VALUES(resueltos),
+                                        segundos_resolucion = segundos_resolucion + VALUES(segundos_resolucion),
+                                        incumplidos = incumplidos + VALUES(incumplidos)
+            """, (id_tecnico, *ids))
+            cursor.execute(f"UPDATE casos SET estado_desde = NOW(), vence_sla = NULL WHERE id_caso IN ({marcadores})",
+                           tuple(ids))
+            return
+
+        # Entre pendiente y proceso el plazo sigue corriendo; al reabrir empieza uno nuevo
+        plazo, parametros = self._plazo_sql()
+        cursor.execute(f"""
+            UPDATE casos
+            SET estado_desde = NOW(),
+                vence_sla = COALESCE(vence_sla, DATE_ADD(NOW(), INTERVAL {plazo} SECOND))
+            WHERE id_caso IN ({marcadores})
+        """, (*parametros, *ids))
+
+    def al_cambiar_prioridad(self, cursor, ids, prioridad):
+        # El vencimiento se corre en la diferencia entre el plazo nuevo y el anterior
+        marcadores = ','.join(['%s'] * len(ids))
+        plazo, parametros = self._plazo_sql()
+        cursor.execute(f"""
+            UPDATE casos
+            SET vence_sla = DATE_ADD(vence_sla, INTERVAL (%s - {plazo}) SECOND)
+            WHERE id_caso IN ({marcadores}) AND vence_sla IS NOT NULL
+        """, (self.config['objetivos'][prioridad], *parametros, *ids))
+
+    # ---- Colas ----
+
+    def consulta_cola(self, tipo, prioridades=PRIORIDADES, limite=50):
+        """
+        (sql, parámetros) de la cola 'vencidos' (los que vencieron antes, primero) o
+        'por_vencer' (los que vencen antes, primero). Una búsqueda por prioridad con el índice.
+        """
+        if tipo not in COLAS_SLA:
+            raise ValueError(f'Cola de SLA desconocida: {tipo}')
+        if tipo == 'vencidos':
+            rango, parametros_rango = "vence_sla < NOW()", ()
+        else:
+            rango, parametros_rango = "vence_sla >= NOW() AND vence_sla < DATE_ADD(NOW(), INTERVAL %s SECOND)", \
+                (self.config['aviso'],)
+
+        subconsultas, parametros = [], []
+        for prioridad in prioridades:
+            subconsultas.append(f"""
+                (SELECT id_caso, codigo_caso, estado, asunto, prioridad, fecha_creacion, estado_desde, vence_sla, version
+                 FROM casos
+                 WHERE prioridad = %s AND {rango}
+                 ORDER BY vence_sla
+                 LIMIT %s)
+            """)
+            parametros.extend([prioridad, *parametros_rango, limite])
+        sql = ' UNION ALL '.join(subconsultas)
+        if len(subconsultas) > 1:
+            sql += " ORDER BY vence_sla LIMIT %s"
+            parametros.append(limite)
+        return sql, tuple(parametros)
+
+    def cola(self, cursor, tipo, prioridades=PRIORIDADES, limite=50):
+        cursor.execute(*self.consulta_cola(tipo, prioridades, limite))
+        return cursor.fetchall()
+
+    # ---- Estadísticas ----
+
+    def por_tecnico(self, cursor):
+        # Resueltos, tiempo medio de resolución (horas) y porcentaje fuera de plazo por técnico
+        cursor.execute("""
+            SELECT s.id_tecnico, d.nombre_completo, s.resueltos, s.segundos_resolucion, s.incumplidos
+            FROM sla_tecnicos s
+            LEFT JOIN datos_personales d ON d.id_datos = s.id_tecnico
+            ORDER BY s.resueltos DESC
+        """)
+        tecnicos = []
+        for fila in cursor.fetchall():
+            resueltos = fila['resueltos'] or 0
+            tecnicos.append(dict(fila,
+                                 horas_promedio=round(fila['segundos_resolucion'] / resueltos / 3600, 1) if resueltos else None,
+                                 porcentaje_incumplidos=round(100 * fila['incumplidos'] / resueltos, 1) if resueltos else None))
+        return tecnicos
+
+    def antiguedad(self, cursor):
+        # Última antigüedad calculada: {(estado, prioridad): [(tramo, cantidad, vencidos)]} y la fecha del cálculo
+        cursor.execute("SELECT estado, prioridad, tramo, cantidad, vencidos, calculado_en FROM antiguedad_casos ORDER BY estado, prioridad, tramo")
+        tabla, calculado_en = {}, None
+        for fila in cursor.fetchall():
+            tabla.setdefault((fila['estado'], fila['prioridad']), []).append(
+                (TRAMOS[fila['tramo']][1], fila['cantidad'], fila['vencidos']))
+            calculado_en = fila['calculado_en']
+        return tabla, calculado_en
+
+    def consulta_antiguedad(self):
+        # Casos abiertos por estado, prioridad y tramo de tiempo en su estado actual (índice estado/prioridad)
+        tramos = ' '.join(f'WHEN segundos >= {desde} THEN {i}' for i, (desde, _) in reversed(list(enumerate(TRAMOS))))
+        abiertos = [estado for estado in ESTADOS if estado != 'resuelto']
+        marcadores = ','.join(['%s'] * len(abiertos))
+        return f"""
+            SELECT estado, prioridad, CASE {tramos} ELSE 0 END AS tramo, COUNT(*), SUM(vencido)
+            FROM (
+                SELECT estado, prioridad,
+                       TIMESTAMPDIFF(SECOND, COALESCE(estado_desde, fecha_creacion), NOW()) AS segundos,
+                       vence_sla < NOW() AS vencido
+                FROM casos
+                WHERE estado IN ({marcadores})
+            ) abiertos
+            GROUP BY estado, prioridad, tramo
+        """, tuple(abiertos)
+
+    def envejecer(self):
+        """
+        Recalcula antiguedad_casos con cuántos casos abiertos hay en cada tramo y cuántos
+        están vencidos: una sola consulta agrupada y el reemplazo en una transacción.
+        """
+        with get_cursor() as (conn, cursor):
+            cursor.execute(*self.consulta_antiguedad())
+            filas = cursor.fetchall()
+            cursor.execute("DELETE FROM antiguedad_casos")
+            if filas:
+                cursor.executemany("""
+                    INSERT INTO antiguedad_casos (estado, prioridad, tramo, cantidad, vencidos, calculado_en)
+                    VALUES (%s, %s, %s, %s, %s, NOW())
+                """, [(estado, prioridad, tramo, cantidad, int(vencidos or 0))
+                      for estado, prioridad, tramo, cantidad, vencidos in filas])
+            conn.commit()
+        return len(filas)
+
+
+# Instancia compartida por los controladores, flujo_casos y los trabajadores de tareas
+motor_sla = MotorSLA()
+
+
+@tarea('sla_envejecer', prioridad=PRIORIDAD_BAJA, cada=sla_config['envejecer_cada'])
+def envejecer():
+    motor_sla.envejecer()
@@ -0,0 +1,92 @@
+import math
+from html import escape
+
+# Gráficas SVG sin dependencias, con los mismos colores que las de matplotlib
+COLORES = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b')
+ANCHO, ALTO = 480, 360
+MARGEN = 50
+
+
+def _numero(valor):
+    return f'{valor:.2f}'.rstrip('0').rstrip('.')
+
+
+def _texto(x, y, contenido, tamano=12, ancla='middle', extra=''):
+    return (f'<text x="{_numero(x)}" y="{_numero(y)}" font-size="{tamano}" text-anchor="{ancla}"{extra}>'
+            f'{escape(str(contenido))}</text>')
+
+
+def _documento(titulo, elementos):
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {ANCHO} {ALTO}" '
+            f'font-family="sans-serif" role="img" aria-label="{escape(titulo)}">'
+            + _texto(ANCHO / 2, 24, titulo, 16) + ''.join(elementos) + '</svg>').encode('utf-8')
+
+
+def _ejes(maximo, marcas=5):
+    # Líneas y valores del eje Y; devuelve (elementos, función valor -> y)
+    maximo = maximo or 1
+    alto = ALTO - 2 * MARGEN
+    escala = lambda valor: ALTO - MARGEN - valor / maximo * alto
+    elementos = [f'<line x1="{MARGEN}" y1="{MARGEN}" x2="{MARGEN}" y2="{ALTO - MARGEN}" stroke="#333"/>',
+                 f'<line x1="{MARGEN}" y1="{ALTO - MARGEN}" x2="{ANCHO - 20}" y2="{ALTO - MARGEN}" stroke="#333"/>']
+    for i in range(marcas + 1):
+        valor = maximo * i / marcas
+        y = escala(valor)
+        elementos.append(f'<line x1="{MARGEN - 4}" y1="{_numero(y)}" x2="{MARGEN}" y2="{_numero(y)}" stroke="#333"/>')
+        elementos.append(_texto(MARGEN - 6, y + 4, _numero(valor), 10, 'end'))
+    return elementos, escala
+
+
+def torta(titulo, etiquetas, valores):
+    total = sum(valores)
+    cx, cy, r = ANCHO / 2, ALTO / 2 + 15, 120
+    elementos = []
+    angulo = math.radians(140)  # Mismo ángulo inicial que la versión de matplotlib
+    for i, (etiqueta, valor) in enumerate(zip(etiquetas, valores)):
+        if not valor:
+            continue
+        barrido = 2 * math.pi * valor / total
+        color = COLORES[i % len(COLORES)]
+        if barrido >= 2 * math.pi - 1e-9:
+            elementos.append(f'<circle cx="{cx}" cy="{cy}" r="{r}" fill="{color}"/>')
+        else:
+            x1, y1 = cx + r * math.cos(angulo), cy - r * math.sin(angulo)
+            x2, y2 = cx + r * math.cos(angulo + barrido), cy - r * math.sin(angulo + barrido)
+            elementos.append(f'<path d="M{_numero(cx)},{_numero(cy)} L{_numero(x1)},{_numero(y1)} '
+                             f'A{r},{r} 0 {1 if barrido > math.pi else 0},0 {_numero(x2)},{_numero(y2)} Z" fill="{color}"/>')
+        medio = angulo + barrido / 2
+        elementos.append(_texto(cx + 0.6 * r * math.cos(medio), cy - 0.6 * r * math.sin(medio) + 4,
+                                f'{100 * valor / total:.1f}%', 11))
+        elementos.append(_texto(cx + 1.15 * r * math.cos(medio), cy - 1.15 * r * math.sin(medio) + 4, etiqueta,
+                                12, 'start' if math.cos(medio) >= 0 else 'end'))
+        angulo += barrido
+    return _documento(titulo, elementos)
+
+
+def barras(titulo, etiquetas, valores, color='skyblue'):
+    elementos, escala = _ejes(max(valores, default=0))
+    ancho = (ANCHO - MARGEN - 20) / max(len(valores), 1)
+    for i, (etiqueta, valor) in enumerate(zip(etiquetas, valores)):
+        x = MARGEN + i * ancho + ancho * 0.1
+        y = escala(valor)
+        elementos.append(f'<rect x="{_numero(x)}" y="{_numero(y)}" width="{_numero(ancho * 0.8)}" '
+                         f'height="{_numero(ALTO - MARGEN - y)}" fill="{color}"/>')
+        elementos.append(_texto(x + ancho * 0.4, ALTO - MARGEN + 16, etiqueta, 11))
+    return _documento(titulo, elementos)
+
+
+def linea(titulo, etiquetas, valores, eje_x='', eje_y='', color='green'):
+    elementos, escala = _ejes(max(valores, default=0))
+    paso = (ANCHO - MARGEN - 30) / max(len(valores) - 1, 1)
+    puntos = [(MARGEN + 5 + i * paso, escala(valor)) for i, valor in enumerate(valores)]
+    if puntos:
+        elementos.append(f'<polyline fill="none" stroke="{color}" stroke-width="2" points="'
+                         + ' '.join(f'{_numero(x)},{_numero(y)}' for x, y in puntos) + '"/>')
+        # Con muchos puntos se omiten los marcadores, como haría un gráfico denso
+        if len(puntos) <= 60:
+            elementos.extend(f'<circle cx="{_numero(x)}" cy="{_numero(y)}" r="3" fill="{color}"/>' for x, y in puntos)
+        for i in sorted({0, len(puntos) // 2, len(puntos) - 1}):
+            elementos.append(_texto(puntos[i][0], ALTO - MARGEN + 16, etiquetas[i], 10))
+    elementos.append(_texto(ANCHO / 2, ALTO - 12, eje_x, 12))
+    elementos.append(_texto(14, ALTO / 2, eje_y, 12, extra=f' transform="rotate(-90 14 {ALTO / 2})"'))
+    return _documento(titulo, elementos)
@@ -0,0 +1,320 @@
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# Configuración de la cola de tareas en segundo plano
+tareas_config = {
+    'ruta_sqlite': os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tareas.sqlite3'),
+    'hilos': 2,              # Trabajadores dentro del proceso web (0: solo con "manage.py tareas trabajar")
+    'intentos': 3,           # Intentos por tarea, salvo que la tarea indique otro valor
+    'espera_reintento': 5,   # Segundos antes del primer reintento; se duplica en cada uno
+    'visibilidad': 300,      # Segundos tras los que una tarea tomada por un trabajador caído vuelve a la cola
+    'conservar': 86400,      # Segundos que se guardan las tareas terminadas
+}
+
+# Módulos que definen tareas; los trabajadores los importan para conocerlas todas
+MODULOS_TAREAS = ('services.importacion', 'services.directorio', 'services.sla')
+
+PRIORIDAD_ALTA = 10
+PRIORIDAD_NORMAL = 0
+PRIORIDAD_BAJA = -10
+
+# Estados de una tarea de la cola (no de un caso; esos están en services/dominio.py)
+ESTADOS_TAREA = ('pendiente', 'ejecutando', 'hecha', 'fallida')
+
+
+class Definicion:
+    __slots__ = ('funcion', 'intentos', 'prioridad', 'proceso', 'cada')
+
+    def __init__(self, funcion, intentos, prioridad, proceso, cada):
+        self.funcion = funcion
+        self.intentos = intentos
+        self.prioridad = prioridad
+        self.proceso = proceso
+        self.cada = cada
+
+
+_registro = {}  # nombre -> Definicion
+
+
+def tarea(nombre, intentos=None, prioridad=PRIORIDAD_NORMAL, proceso=False, cada=None):
+    """
+    Registra una función como tarea. Recibe los argumentos de encolar() como palabras clave.
+    proceso=True la ejecuta en el pool de procesos del trabajador (trabajo de CPU que no
+    libera el GIL); la función debe estar definida a nivel de módulo.
+    cada=N la programa cada N segundos (sin argumentos) mientras haya trabajadores.
+    """
+    def registrar(funcion):
+        _registro[nombre] = Definicion(funcion, intentos, prioridad, proceso, cada)
+        return funcion
+    return registrar
+
+
+def cargar_tareas():
+    for modulo in MODULOS_TAREAS:
+        importlib.import_module(modulo)
+
+
+class ColaTareas:
+    """
+    Cola de tareas persistente en un archivo SQLite compartido por los procesos del servidor
+    y los trabajadores de manage.py (modo WAL y una conexión por hilo, como las sesiones).
+    - Las tareas se toman por prioridad y orden de llegada. Una tarea tomada queda reservada
+      `visibilidad` segundos: si el trabajador cae, otro la retoma.
+    - Si falla, se reintenta con espera creciente hasta agotar sus intentos; entonces
+      queda 'fallida' con el error, para revisarla con "manage.py tareas estado".
+    - Con `clave` no se encola una tarea igual a otra que todavía está pendiente o en curso.
+    Los argumentos se guardan en el archivo como JSON, así que cualquier trabajador puede
+    ejecutar cualquier tarea; no deben incluir contraseñas ni otros datos reservados.
+    """
+    def __init__(self, config=tareas_config):
+        self.config = config
+        self._local = threading.local()
+        self._hay_tareas = threading.Condition()
+        self._lock = threading.Lock()
+        self._trabajador = None
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.config['ruta_sqlite'], timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tareas (
+                    id INTEGER PRIMARY KEY,
+                    nombre TEXT NOT NULL,
+                    argumentos TEXT NOT NULL,
+                    prioridad INTEGER NOT NULL,
+                    clave TEXT,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    max_intentos INTEGER NOT NULL,
+                    disponible_en REAL NOT NULL,
+                    tomada_hasta REAL,
+                    error TEXT,
+                    creada_en REAL NOT NULL,
+                    terminada_en REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS tareas_cola ON tareas (estado, prioridad, disponible_en)")
+            # Deduplicación: una sola tarea viva por clave
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS tareas_clave ON tareas (clave)
+                WHERE estado IN ('pendiente', 'ejecutando')
+            """)
+            self._local.conn = conn
+        return conn
+
+    def encolar(self, nombre, argumentos=None, prioridad=None, clave=None, retraso=0):
+        """
+        Agrega una tarea y devuelve su id, o None si ya hay una viva con la misma clave.
+        Si este proceso tiene trabajadores (tareas_config['hilos']), se despiertan enseguida.
+        """
+        definicion = _registro.get(nombre)
+        if definicion is None:
+            raise LookupError(f'Tarea desconocida: {nombre}')
+        ahora = time.time()
+        cursor = self._conexion().execute("""
+            INSERT OR IGNORE INTO tareas (nombre, argumentos, prioridad, clave, max_intentos, disponible_en, creada_en)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (nombre, json.dumps(argumentos or {}, default=str),
+              definicion.prioridad if prioridad is None else prioridad, clave,
+              definicion.intentos or self.config['intentos'], ahora + retraso, ahora))
+        if not cursor.rowcount:
+            return None
+
+        self.iniciar_trabajadores()
+        with self._hay_tareas:
+            self._hay_tareas.notify()
+        return cursor.lastrowid
+
+    def programar(self, nombre):
+        # Próxima ejecución de una tarea periódica; la clave por turno evita duplicados entre procesos
+        cada = _registro[nombre].cada
+        turno = int(time.time() // cada) + 1
+        return self.encolar(nombre, clave=f'{nombre}:{turno}', retraso=max(0, turno * cada - time.time()))
+
+    def tomar(self):
+        # Reserva la siguiente tarea disponible; devuelve (id, nombre, argumentos, intentos, max_intentos) o None
+        ahora = time.time()
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')  # Un solo trabajador a la vez elige y marca la tarea
+        try:
+            fila = conn.execute("""
+                SELECT id, nombre, argumentos, intentos, max_intentos
+                FROM tareas
+                WHERE (estado = 'pendiente' AND disponible_en <= ?) OR (estado = 'ejecutando' AND tomada_hasta < ?)
+                ORDER BY prioridad DESC, disponible_en, id
+                LIMIT 1
+            """, (ahora, ahora)).fetchone()
+            if fila is not None:
+                conn.execute("""
+                    UPDATE tareas SET estado = 'ejecutando', intentos = intentos + 1, tomada_hasta = ?
+                    WHERE id = ?
+                """, (ahora + self.config['visibilidad'], fila[0]))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if fila is None:
+            return None
+        id_tarea, nombre, argumentos, intentos, max_intentos = fila
+        return id_tarea, nombre, json.loads(argumentos), intentos + 1, max_intentos
+
+    def terminar(self, id_tarea):
+        self._conexion().execute("""
+            UPDATE tareas SET estado = 'hecha', tomada_hasta = NULL, error = NULL, terminada_en = ?
+            WHERE id = ?
+        """, (time.time(), id_tarea))
+
+    def fallar(self, id_tarea, intentos, max_intentos, error):
+        # Vuelve a la cola con espera creciente, o queda 'fallida' si no le quedan intentos
+        ahora = time.time()
+        if intentos < max_intentos:
+            espera = self.config['espera_reintento'] * 2 ** (intentos - 1)
+            self._conexion().execute("""
+                UPDATE tareas SET estado = 'pendiente', tomada_hasta = NULL, error = ?, disponible_en = ?
+                WHERE id = ?
+            """, (error, ahora + espera, id_tarea))
+            return
+        self._conexion().execute("""
+            UPDATE tareas SET estado = 'fallida', tomada_hasta = NULL, error = ?, terminada_en = ?
+            WHERE id = ?
+        """, (error, ahora, id_tarea))
+
+    def esperar(self, segundos):
+        # Espera a que este proceso encole algo (las de otros procesos se ven al volver a consultar)
+        with self._hay_tareas:
+            self._hay_tareas.wait(segundos)
+
+    def contar(self):
+        conteo = {estado: 0 for estado in ESTADOS_TAREA}
+        for estado, cantidad in self._conexion().execute("SELECT estado, COUNT(*) FROM tareas GROUP BY estado"):
+            conteo[estado] = cantidad
+        return conteo
+
+    def fallidas(self, limite=20):
+        return self._conexion().execute("""
+            SELECT id, nombre, intentos, error, terminada_en FROM tareas
+            WHERE estado = 'fallida'
+            ORDER BY terminada_en DESC
+            LIMIT ?
+        """, (limite,)).fetchall()
+
+    def reintentar_fallidas(self):
+        # Devuelve a la cola las tareas fallidas
+        cursor = self._conexion().execute("""
+            UPDATE OR IGNORE tareas
+            SET estado = 'pendiente', intentos = 0, disponible_en = ?, terminada_en = NULL
+            WHERE estado = 'fallida'
+        """, (time.time(),))
+        return cursor.rowcount
+
+    def limpiar(self):
+        # Borra las tareas terminadas más antiguas que `conservar`; devuelve cuántas
+        cursor = self._conexion().execute("DELETE FROM tareas WHERE estado IN ('hecha', 'fallida') AND terminada_en < ?",
+                                          (time.time() - self.config['conservar'],))
+        return cursor.rowcount
+
+    def iniciar_trabajadores(self):
+        # Trabajadores del proceso web, iniciados por MyApp.run() o con la primera tarea encolada
+        if self._trabajador is not None or not self.config['hilos']:
+            return
+        with self._lock:
+            if self._trabajador is None:
+                self._trabajador = TrabajadorTareas(self, hilos=self.config['hilos'])
+                self._trabajador.iniciar()
+
+
+class TrabajadorTareas:
+    """
+    Ejecuta tareas de la cola con `hilos` hilos. Las tareas registradas con proceso=True
+    se envían a un pool de `procesos` procesos, si lo hay.
+    """
+    def __init__(self, cola, hilos=2, procesos=0, espera=1.0, limpiar_cada=600):
+        self.cola = cola
+        self.hilos = hilos
+        self.procesos = procesos
+        self.espera = espera              # Segundos entre consultas cuando la cola está vacía
+        self.limpiar_cada = limpiar_cada  # Segundos entre limpiezas de tareas terminadas
+        self._limpiada_en = 0.0
+        self.detener = threading.Event()
+        self._pool_procesos = None
+        self._hilos = []
+
+    def iniciar(self):
+        cargar_tareas()
+        if self.cola._trabajador is None:
+            self.cola._trabajador = self  # Así encolar() no inicia otros trabajadores en este proceso
+        for nombre, definicion in list(_registro.items()):
+            if definicion.cada:
+                self.cola.programar(nombre)
+        if self.procesos:
+            self._pool_procesos = ProcessPoolExecutor(max_workers=self.procesos)
+        for numero in range(self.hilos):
+            hilo = threading.Thread(target=self._trabajar, name=f'tareas-{numero}', daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def esperar(self):
+        # Espera a que terminen los hilos (después de detener.set()) y cierra el pool de procesos
+        for hilo in self._hilos:
+            hilo.join()
+        if self._pool_procesos is not None:
+            self._pool_procesos.shutdown()
+
+    def _trabajar(self):
+        while not self.detener.is_set():
+            try:
+                tomada = self.cola.tomar()
+            except sqlite3.Error as e:
+                log.warning('No se pudo leer la cola de tareas: %s', e)
+                tomada = None
+            if tomada is None:
+                self._limpiar()
+                self.cola.esperar(self.espera)
+                continue
+            self.ejecutar(*tomada)
+
+    def _limpiar(self):
+        # Con la cola vacía, de vez en cuando (si dos hilos coinciden no pasa nada)
+        if time.monotonic() - self._limpiada_en < self.limpiar_cada:
+            return
+        self._limpiada_en = time.monotonic()
+        try:
+            self.cola.limpiar()
+        except sqlite3.Error as e:
+            log.warning('No se pudo limpiar la cola de tareas: %s', e)
+
+    def ejecutar(self, id_tarea, nombre, argumentos, intentos, max_intentos):
+        if intentos > max_intentos:
+            # La retomó otro trabajador después de agotar sus intentos sin terminar
+            self.cola.fallar(id_tarea, intentos, max_intentos, 'Se agotó el tiempo de la tarea')
+            return
+        definicion = _registro.get(nombre)
+        try:
+            if definicion is None:
+                raise LookupError(f'Tarea desconocida: {nombre}')
+            if definicion.proceso and self._pool_procesos is not None:
+                self._pool_procesos.submit(definicion.funcion, **argumentos).result()
+            else:
+                definicion.funcion(**argumentos)
+        except Exception as e:
+            log.exception('La tarea %s (%s) falló en el intento %s de %s', id_tarea, nombre, intentos, max_intentos)
+            self.cola.fallar(id_tarea, intentos, max_intentos, f'{type(e).__name__}: {e}')
+        else:
+            self.cola.terminar(id_tarea)
+        if definicion is not None and definicion.cada:
+            self.cola.programar(nombre)
+
+
+# Instancia compartida por los controladores, los servicios y manage.py
+cola_tareas = ColaTareas()
@@ -0,0 +1,118 @@
+// Colas del técnico: desplazamiento infinito y actualización en tiempo real.
+// Sin JavaScript, el enlace "Siguiente página" sigue funcionando como paginación normal.
+document.addEventListener('DOMContentLoaded', () => {
+    const seccion = document.querySelector('main.seccion');
+    const enlace = document.getElementById('cola-siguiente');
+    const cuerpo = document.getElementById('cola-casos');
+
+    const celda = (texto) => {
+        const td = document.createElement('td');
+        td.textContent = texto;
+        return td;
+    };
+
+    const crearFila = (caso) => {
+        const tr = document.createElement('tr');
+        tr.className = 'fila-' + caso.prioridad;
+        tr.dataset.id = caso.id_caso;
+
+        const seleccion = document.createElement('td');
+        const casilla = document.createElement('input');
+        casilla.type = 'checkbox';
+        casilla.name = 'caso';
+        casilla.value = caso.id_caso + ':' + caso.version;
+        casilla.setAttribute('form', 'cola-lote');
+        seleccion.appendChild(casilla);
+        tr.appendChild(seleccion);
+
+        tr.appendChild(celda(caso.codigo_caso || 'N/A'));
+        tr.appendChild(celda(caso.asunto));
+        tr.appendChild(celda(caso.prioridad.charAt(0).toUpperCase() + caso.prioridad.slice(1)));
+        tr.appendChild(celda(caso.fecha_creacion));
+        tr.appendChild(celda(caso.estado));
+
+        const ver = document.createElement('td');
+        const a = document.createElement('a');
+        a.className = 'btn-ver';
+        a.href = caso.url;
+        a.textContent = '👁️ Ver';
+        ver.appendChild(a);
+        tr.appendChild(ver);
+        return tr;
+    };
+
+    // --- Desplazamiento infinito ---
+    if (enlace && cuerpo && 'IntersectionObserver' in window) {
+        let siguiente = enlace.dataset.siguiente;
+        let cargando = false;
+
+        const cargarMas = () => {
+            if (cargando || !siguiente) return;
+            cargando = true;
+
+            fetch(enlace.dataset.api + '&despues=' + encodeURIComponent(siguiente), { credentials: 'include' })
+                .then(response => {
+                    if (!response.ok) throw new Error('Error ' + response.status);
+                    return response.json();
+                })
+                .then(data => {
+                    data.casos.forEach(caso => {
+                        // Un caso que ya llegó por eventos no se repite
+                        if (!cuerpo.querySelector('tr[data-id="' + caso.id_caso + '"]')) {
+                            cuerpo.appendChild(crearFila(caso));
+                        }
+                    });
+                    siguiente = data.siguiente;
+                    if (siguiente) {
+                        const url = new URL(enlace.href);
+                        url.searchParams.set('despues', siguiente);
+                        enlace.href = url;
+                    } else {
+                        observador.disconnect();
+                        enlace.remove();
+                    }
+                })
+                .catch(() => observador.disconnect()) // Se deja el enlace para paginar manualmente
+                .finally(() => { cargando = false; });
+        };
+
+        const observador = new IntersectionObserver(entradas => {
+            if (entradas.some(e => e.isIntersecting)) cargarMas();
+        });
+        observador.observe(enlace);
+    }
+
+    // --- Tiempo real (Server-Sent Events) ---
+    if (!seccion || !seccion.dataset.eventos || !('EventSource' in window)) return;
+    const primeraPagina = seccion.dataset.primeraPagina === 'si';
+    const fuente = new EventSource(seccion.dataset.eventos);
+
+    fuente.addEventListener('caso', (evento) => {
+        const datos = JSON.parse(evento.data);
+        const caso = datos.caso;
+
+        if (!cuerpo) {
+            // La cola estaba vacía y no hay tabla: basta con recargar cuando llega un caso
+            if (datos.accion === 'agregar' && primeraPagina) window.location.reload();
+            return;
+        }
+
+        const existente = cuerpo.querySelector('tr[data-id="' + caso.id_caso + '"]');
+        if (datos.accion === 'quitar') {
+            if (existente) existente.remove();
+        } else if (existente) {
+            existente.replaceWith(crearFila(caso));
+        } else if (primeraPagina) {
+            // La cola se ordena del más reciente al más antiguo
+            const fila = crearFila(caso);
+            fila.classList.add('fila-nueva');
+            const posterior = Array.from(cuerpo.rows).find(tr => tr.cells[4].textContent < caso.fecha_creacion);
+            cuerpo.insertBefore(fila, posterior || null);
+        }
+    });
+
+    fuente.addEventListener('recargar', () => {
+        fuente.close();
+        window.location.reload();
+    });
+});
@@ -0,0 +1,77 @@
+// Directorio de usuarios del administrador: se carga por páginas solo cuando se pide.
+document.addEventListener('DOMContentLoaded', () => {
+    const contenedor = document.getElementById('directorio');
+    if (!contenedor) return;
+
+    const tabla = contenedor.querySelector('table');
+    const cuerpo = tabla.querySelector('tbody');
+    const tipo = document.getElementById('directorio-tipo');
+    const botonCargar = document.getElementById('directorio-cargar');
+    const botonMas = document.getElementById('directorio-mas');
+
+    let orden = 'id_identity';
+    let sentido = 'asc';
+    let siguiente = null;
+
+    const celda = (texto) => {
+        const td = document.createElement('td');
+        td.textContent = texto || '';
+        return td;
+    };
+
+    const formularioEliminar = (idIdentity) => {
+        const form = document.createElement('form');
+        form.action = contenedor.dataset.eliminar;
+        form.method = 'POST';
+        form.style.display = 'inline';
+
+        const oculto = document.createElement('input');
+        oculto.type = 'hidden';
+        oculto.name = 'id_identity';
+        oculto.value = idIdentity;
+
+        const boton = document.createElement('button');
+        boton.type = 'submit';
+        boton.textContent = '🗑️ Eliminar';
+
+        form.append(oculto, boton);
+        return form;
+    };
+
+    const cargar = (reiniciar) => {
+        const params = new URLSearchParams({ orden, sentido });
+        if (tipo.value) params.set('tipo', tipo.value);
+        if (!reiniciar && siguiente) params.set('despues', siguiente);
+
+        fetch(contenedor.dataset.api + '?' + params, { credentials: 'include' })
+            .then(response => response.json())
+            .then(data => {
+                if (reiniciar) cuerpo.replaceChildren();
+                data.usuarios.forEach(u => {
+                    const tr = document.createElement('tr');
+                    tr.append(celda(u.id_identity), celda(u.nombre_completo), celda(u.tipo_usuario), celda(u.correo));
+                    const acciones = document.createElement('td');
+                    acciones.appendChild(formularioEliminar(u.id_identity));
+                    tr.appendChild(acciones);
+                    cuerpo.appendChild(tr);
+                });
+                siguiente = data.siguiente;
+                tabla.hidden = false;
+                botonMas.hidden = !siguiente;
+            });
+    };
+
+    botonCargar.addEventListener('click', () => cargar(true));
+    botonMas.addEventListener('click', () => cargar(false));
+    tipo.addEventListener('change', () => { if (!tabla.hidden) cargar(true); });
+
+    // Al pulsar una cabecera se ordena por esa columna; un segundo clic invierte el sentido
+    tabla.querySelectorAll('th a[data-orden]').forEach(enlace => {
+        enlace.addEventListener('click', (event) => {
+            event.preventDefault();
+            sentido = (orden === enlace.dataset.orden && sentido === 'asc') ? 'desc' : 'asc';
+            orden = enlace.dataset.orden;
+            cargar(true);
+        });
+    });
+});
@@ -0,0 +1,36 @@
+// Autocompletado de los buscadores: consulta el endpoint indicado en data-sugerir
+// mientras se escribe y muestra los resultados en un <datalist>.
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('input[data-sugerir]').forEach((input, i) => {
+        const lista = document.createElement('datalist');
+        lista.id = 'sugerencias-' + i;
+        input.setAttribute('list', lista.id);
+        input.after(lista);
+
+        let temporizador = null;
+        let ultimaConsulta = '';
+
+        input.addEventListener('input', () => {
+            clearTimeout(temporizador);
+            const q = input.value.trim();
+            if (q.length < 2 || q === ultimaConsulta) return;
+
+            // Se espera a que el usuario deje de escribir para no lanzar una petición por tecla
+            temporizador = setTimeout(() => {
+                ultimaConsulta = q;
+                fetch(input.dataset.sugerir + '?q=' + encodeURIComponent(q), { credentials: 'include' })
+                    .then(response => response.ok ? response.json() : [])
+                    .then(sugerencias => {
+                        if (input.value.trim() !== q) return; // Respuesta de una consulta anterior
+                        lista.replaceChildren(...sugerencias.map(s => {
+                            const opcion = document.createElement('option');
+                            opcion.value = s.valor;
+                            opcion.label = s.texto;
+                            return opcion;
+                        }));
+                    })
+                    .catch(() => {});
+            }, 150);
+        });
+    });
+});